@@ -1,20 +1,33 @@
 # auctio/asgi.py
 import os
 from django.core.asgi import get_asgi_application
+from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.urls import path
-from auctions.consumers import AuctionConsumer
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auctio.settings")
 django_asgi_app = get_asgi_application()
 
+from django.conf import settings  # noqa: E402
+from auctions.closer import with_auction_closer  # noqa: E402
+from auctions.consumers import AuctionConsumer, NotificationConsumer  # noqa: E402
+
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
         "websocket": URLRouter(
             [
-                path("ws/auction/<int:auction_id>/", AuctionConsumer.as_asgi()),
+                # Users are identified by the session cookie, never by anything the client sends
+                path("ws/auction/<int:auction_id>/", AuthMiddlewareStack(AuctionConsumer.as_asgi())),
+                path("ws/notifications/", AuthMiddlewareStack(NotificationConsumer.as_asgi())),
             ]
         ),
     }
 )
+
+if settings.AUCTION_CLOSER_IN_PROCESS:
+    application = with_auction_closer(
+        application,
+        batch_size=settings.AUCTION_CLOSER_BATCH_SIZE,
+        refresh_interval=settings.AUCTION_CLOSER_REFRESH_SECONDS,
+    )
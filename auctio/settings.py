@@ -1,6 +1,7 @@
 # auctio/settings.py
 from pathlib import Path
 import os
+import tempfile
 from django.core.management.utils import get_random_secret_key
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +35,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "auctions.replicas.PinWritesMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -52,6 +54,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "auctions.context_processors.unread_notifications",
             ],
         },
     }
@@ -59,13 +62,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "auctio.wsgi.application"
 
+# SQLite connection profiles (auctions/sqlite). "default" is stock SQLite.
+# DB_PROFILE=production runs the pragmas below on every connection, takes the
+# write lock at the start of each transaction (BEGIN IMMEDIATE) and keeps
+# connections open between requests; writes that still find the database
+# locked are retried DB_BUSY_RETRIES times, backing off from DB_BUSY_BACKOFF_MS.
+DB_PROFILE = os.environ.get("DB_PROFILE", "default")
+DB_PROFILES = {
+    "default": {"OPTIONS": {}, "CONN_MAX_AGE": 0},
+    "production": {
+        "OPTIONS": {
+            "init_pragmas": {
+                # Readers no longer block behind a writer, nor it behind them
+                "journal_mode": "WAL",
+                # Safe with WAL: a power cut can lose the last commits, not corrupt the file
+                "synchronous": "NORMAL",
+                "busy_timeout": 5000,
+                "mmap_size": 256 * 1024 * 1024,
+                # In KiB when negative: 64 MiB of page cache per connection
+                "cache_size": -64000,
+                "temp_store": "MEMORY",
+            },
+            "transaction_mode": "IMMEDIATE",
+        },
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+    },
+}
+DB_BUSY_RETRIES = 4
+DB_BUSY_BACKOFF_MS = 20
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "auctions.sqlite",
         "NAME": BASE_DIR / "db.sqlite3",
+        # File-backed test database so concurrent tests see real SQLite locking
+        # (busy timeout) instead of the shared-cache in-memory table locks.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        **DB_PROFILES[DB_PROFILE],
     }
 }
 
+# Read replica (auctions/replicas.py). With DB_REPLICA=True the listing, search,
+# bid history and alerts pages and the auction admin list read from "replica",
+# a copy of the primary kept fresh by `manage.py sync_replica --every N`. A user
+# who has just written reads from the primary for REPLICA_PIN_SECONDS.
+DB_REPLICA = os.environ.get("DB_REPLICA", "False") == "True"
+if DB_REPLICA:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / "db_replica.sqlite3",
+        # No test database of its own. Run the tests with DB_REPLICA off: a
+        # mirror is a second connection, blind to a TestCase's open transaction.
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["auctions.replicas.ReplicaRouter"]
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_CACHE = "default"
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -87,18 +141,148 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploaded auction images and avatars are stored once per content hash and
+# resized to WebP and JPEG renditions (auctions/images.py) on IMAGE_WORKERS
+# background threads after the upload commits; 0 builds them inline.
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_QUALITY = 80
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "auctions.UserProfile"
 
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
-# Channels (In-memory for dev; use Redis in prod)
+# Channels (In-memory for dev; use Redis in prod). CHANNEL_LAYER=sqlite shares
+# groups between several worker processes on one host through a SQLite file
+# (auctions/layers.py), without running Redis.
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer"
     }
 }
+if os.environ.get("CHANNEL_LAYER") == "sqlite":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "auctions.layers.SQLiteChannelLayer",
+            "CONFIG": {"path": BASE_DIR / "channels.sqlite3"},
+        }
+    }
+
+# WebSocket fan-out (auctions/broadcast.py). With a non-zero window, bids accepted
+# on an auction within that many milliseconds go out as one "price_update" frame
+# carrying the last BID_TRAIL_LENGTH bids. Each socket queues at most
+# SOCKET_SEND_QUEUE_SIZE price updates and drops older ones when it lags.
+BID_COALESCE_WINDOW_MS = int(os.environ.get("BID_COALESCE_WINDOW_MS", "0"))
+BID_TRAIL_LENGTH = 5
+SOCKET_SEND_QUEUE_SIZE = 16
+
+# Bids placed over WebSockets run on BID_DB_THREADS database threads, each
+# auction pinned to one of them (auctions/executors.py), so bids on different
+# auctions do not wait for each other. On SQLite every bid still queues for the
+# one write lock, so the gain there is small. 0 sends every bid of the process
+# through sync_to_async's single thread instead.
+BID_DB_THREADS = int(os.environ.get("BID_DB_THREADS", "4"))
+
+# Bid admission (auctions/throttle.py), checked on both bid paths before any
+# query: a token bucket per bidder and per auction (tokens per second, bucket
+# size; a rate of 0 turns that limit off), and idempotency keys remembered for
+# BID_IDEMPOTENCY_SECONDS. Per process unless BID_RATE_CACHE names a cache alias
+# shared by the workers. /_perf/ shows how many bids each check turned away.
+BID_RATE_PER_USER = 2.0
+BID_BURST_PER_USER = 5
+BID_RATE_PER_AUCTION = 50.0
+BID_BURST_PER_AUCTION = 100
+BID_RATE_CACHE = None
+BID_IDEMPOTENCY_SECONDS = 60
+
+# Reconnecting sockets (auctions/resume.py): the last RESUME_BUFFER_SIZE bid
+# frames of each of the RESUME_BUFFER_AUCTIONS most recently bid-on auctions are
+# kept for replay; a client that missed more than RESUME_MAX_BIDS reloads.
+RESUME_BUFFER_SIZE = 100
+RESUME_BUFFER_AUCTIONS = 1000
+RESUME_MAX_BIDS = 500
+
+# Live book (auctions/livebook.py): decide bids against in-memory auction state
+# and write them behind, at the latest LIVE_BOOK_FLUSH_MS after acceptance or
+# once LIVE_BOOK_FLUSH_BIDS are waiting. Only for deployments where one process
+# takes all the bids of an auction.
+LIVE_BOOK = os.environ.get("LIVE_BOOK", "False") == "True"
+LIVE_BOOK_FLUSH_BIDS = 50
+LIVE_BOOK_FLUSH_MS = 100
+LIVE_BOOK_TRAIL = 20
+
+# Append-only event log of auctions created, bids placed and auctions closed
+# (auctions/eventlog.py), in segment files of EVENT_LOG_SEGMENT_BYTES under
+# EVENT_LOG_DIR. `manage.py replay_events` rebuilds counters from it; run it
+# once with --bootstrap when switching the log on for an existing database.
+EVENT_LOG = os.environ.get("EVENT_LOG", "False") == "True"
+EVENT_LOG_DIR = BASE_DIR / "eventlog"
+EVENT_LOG_SEGMENT_BYTES = 16 * 1024 * 1024
+EVENT_LOG_FSYNC = False
+# Most events sent to a socket asking for the events since an offset, and most
+# log records read to find them; the reply's next_offset carries on from there
+EVENT_LOG_REPLAY_LIMIT = 500
+EVENT_LOG_SCAN_LIMIT = 20_000
+
+# Auction closer: closes expired auctions off the request path. Runs on a thread
+# inside each web process unless disabled here, in which case run
+# `manage.py run_auction_closer` as a separate worker. Note that "closed" events
+# only reach sockets of other processes with a cross-process channel layer.
+AUCTION_CLOSER_IN_PROCESS = os.environ.get("AUCTION_CLOSER_IN_PROCESS", "True") == "True"
+AUCTION_CLOSER_BATCH_SIZE = 100
+AUCTION_CLOSER_REFRESH_SECONDS = 30
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Rendered auction cards and detail headers (auctions/cache.py). Point the alias
+# at a shared backend (e.g. Redis or Memcached) to share fragments between workers.
+AUCTION_FRAGMENT_CACHE = "default"
+AUCTION_FRAGMENT_TIMEOUT = 300
+
+# Request profiling (auctions/perf.py), off unless PERF_INSTRUMENTATION=True.
+# Keeps the last PERF_WINDOW samples per URL name; /_perf/ shows them for the
+# serving process and `manage.py perf_report` merges the snapshots every process
+# writes to PERF_SNAPSHOT_DIR.
+PERF_INSTRUMENTATION = os.environ.get("PERF_INSTRUMENTATION", "False") == "True"
+PERF_WINDOW = 1000
+PERF_SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(), "auctio-perf")
+PERF_SNAPSHOT_SECONDS = 10
+if PERF_INSTRUMENTATION:
+    # Outermost, so the middleware stack is part of the measured time
+    MIDDLEWARE.insert(0, "auctions.perf.PerfMiddleware")
+
+# Users' activity counters (auctions/counters.py). With COUNTER_DELTAS=True bids,
+# wins and new auctions append increments to a delta table instead of updating
+# the user's row; the auction closer folds them into UserProfile on each refresh
+# (or run `manage.py fold_counters --every N` next to a separate closer), up to
+# COUNTER_FOLD_BATCH_SIZE per transaction. The account page adds pending ones.
+COUNTER_DELTAS = os.environ.get("COUNTER_DELTAS", "False") == "True"
+COUNTER_FOLD_BATCH_SIZE = 5000
+
+# Read alerts older than this many days are removed by `manage.py prune_notifications`
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Keyset pagination for the listing, bids and alerts pages
+KEYSET_PAGE_SIZE = 24
+KEYSET_MAX_PAGE_SIZE = 100
+# Read-only JSON API (auctions/api.py) for signed-in users, paged like the HTML pages
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+}
+
+# Search results (auctions/search.py) are ranked, so paged by offset; no further than this
+SEARCH_MAX_RESULTS = 1000
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auctio.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AUCTION_CLOSER_IN_PROCESS:
+    from auctions.closer import start_closer_thread
+
+    start_closer_thread(
+        batch_size=settings.AUCTION_CLOSER_BATCH_SIZE,
+        refresh_interval=settings.AUCTION_CLOSER_REFRESH_SECONDS,
+    )
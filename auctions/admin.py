@@ -1,7 +1,11 @@
 # auctions/admin.py
 from django.contrib import admin
 from .models import UserProfile, Auction, Bid, Notification
+from . import images, notifications
+from .replicas import replica_reads
+from .search import matching
 from django.contrib.auth.admin import UserAdmin
+from django.utils.decorators import method_decorator
 
 @admin.register(UserProfile)
 class CustomUserAdmin(UserAdmin):
@@ -10,17 +14,58 @@ class CustomUserAdmin(UserAdmin):
         ("Extra", {"fields": ("avatar", "vendues_created", "tenders_placed", "auctions_won")}),
     )
 
+    def save_model(self, request, obj, form, change):
+        if change and "avatar" in form.changed_data:
+            # The renditions are the old avatar's; the original shows until the new ones are built
+            obj.avatar_digest = ""
+        super().save_model(request, obj, form, change)
+        if change and "avatar" in form.changed_data and obj.avatar:
+            images.build_later(obj)
+
 @admin.register(Auction)
 class AuctionAdmin(admin.ModelAdmin):
-    list_display = ("title", "owner", "base_price", "ends_at", "is_active")
+    list_display = ("title", "owner", "base_price", "current_price", "bid_count", "ends_at", "is_active")
     list_filter = ("category", "is_active")
     search_fields = ("title", "description")
+    readonly_fields = ("current_price", "bid_count", "leading_bidder")
+
+    def save_model(self, request, obj, form, change):
+        if change and "image" in form.changed_data:
+            obj.image_digest = ""
+        super().save_model(request, obj, form, change)
+        # New auctions are scheduled by the post_save signal
+        if change and "image" in form.changed_data and obj.image:
+            images.build_later(obj)
+
+    @method_decorator(replica_reads)
+    def changelist_view(self, request, extra_context=None):
+        # GETs only: replica_reads leaves the POSTs of bulk actions on the primary
+        return super().changelist_view(request, extra_context)
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of LIKE '%term%' over both columns
+        if not search_term.strip():
+            return queryset, False
+        return matching(queryset, search_term), False
 
 @admin.register(Bid)
 class BidAdmin(admin.ModelAdmin):
     list_display = ("auction", "bidder", "amount", "created_at")
     list_filter = ("auction",)
+    list_select_related = ("auction", "bidder")
+    # Skips a COUNT(*) over the whole table on every page; use export_data for full dumps
+    show_full_result_count = False
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ("user", "created_at", "read")
+
+    # Unread rows deleted here would otherwise stay in their users' counters
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        notifications.recount([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list("user_id", flat=True))
+        super().delete_queryset(request, queryset)
+        notifications.recount(user_ids)
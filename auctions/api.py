@@ -0,0 +1,183 @@
+# auctions/api.py
+"""
+Read-only JSON API.
+
+Lists are paged with the same keyset cursors as the HTML pages
+(pagination.keyset_paginate), so a page is one indexed range query however far
+a client scrolls. Auction responses carry a strong ETag built from the auction
+``version`` column, which every bid, close and edit bumps: a client polling
+with If-None-Match gets a 304 after one single-column lookup (detail, bid
+history) or one narrow page query (list), before anything is serialized.
+"""
+import hashlib
+
+from django.http import Http404
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Auction, Bid
+from .pagination import keyset_paginate
+from .serializers import (
+    AuctionSerializer,
+    BidSerializer,
+    CompactAuctionSerializer,
+    MyBidSerializer,
+    NotificationSerializer,
+)
+from .views import listing_queryset
+
+# Columns each auction representation reads, for only()
+AUCTION_COLUMNS = [
+    "title", "description", "category", "owner__username", "image", "base_price", "current_price",
+    "bid_count", "leading_bidder__username", "ends_at", "is_active", "version",
+]
+COMPACT_AUCTION_COLUMNS = ["title", "current_price", "bid_count", "ends_at", "version"]
+
+
+def strong_etag(*parts):
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(request, etag):
+    """A 304 for the request if it already holds `etag`, else None."""
+    held = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in held or "*" in held:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+def tagged(response, etag):
+    response["ETag"] = etag
+    # Cacheable by the client only, and always revalidated
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+class KeysetPagination(BasePagination):
+    """keyset_paginate for DRF views; the view names its ordering in `keys`."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = keyset_paginate(queryset, view.keys, request.query_params)
+        return self.page.items
+
+    def _link(self, query):
+        return self.request.build_absolute_uri(self.request.path + query) if query else None
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self._link(self.page.next_url),
+            "previous": self._link(self.page.previous_url),
+            "results": data,
+        })
+
+
+class KeysetListView(APIView):
+    """A keyset-paged list of `queryset`, or of get_queryset() for lists that depend on the request."""
+
+    pagination_class = KeysetPagination
+    serializer_class = None
+    queryset = None
+    keys = ("-created_at", "-id")
+
+    def get_queryset(self):
+        # A fresh copy per request, as in DRF's GenericAPIView, so no results are cached between requests
+        return self.queryset.all()
+
+    def get(self, request, **kwargs):
+        paginator = self.pagination_class()
+        items = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        return paginator.get_paginated_response(self.serializer_class(items, many=True).data)
+
+
+class AuctionList(KeysetListView):
+    """Active auctions, ending soonest first, with the listing's filters; ?compact=1 for the short form."""
+
+    keys = ("ends_at", "id")
+
+    def compact(self):
+        return self.request.query_params.get("compact") in ("1", "true")
+
+    def get_queryset(self):
+        qs = listing_queryset(self.request.query_params)
+        if self.compact():
+            return qs.only(*COMPACT_AUCTION_COLUMNS)
+        return qs.select_related("owner", "leading_bidder").only(*AUCTION_COLUMNS)
+
+    def get(self, request):
+        paginator = self.pagination_class()
+        items = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        page = paginator.page
+        etag = strong_etag(
+            [(a.pk, a.version) for a in items], page.next_cursor, page.prev_cursor, self.compact()
+        )
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        serializer = CompactAuctionSerializer if self.compact() else AuctionSerializer
+        data = serializer(items, many=True, context={"request": request}).data
+        return tagged(paginator.get_paginated_response(data), etag)
+
+
+def auction_version(pk):
+    version = Auction.objects.filter(pk=pk).values_list("version", flat=True).first()
+    if version is None:
+        raise Http404("No Auction matches the given query.")
+    return version
+
+
+class AuctionDetail(APIView):
+    def get(self, request, pk):
+        cached = not_modified(request, strong_etag("auction", pk, auction_version(pk)))
+        if cached is not None:
+            return cached
+        auction = (
+            Auction.objects.select_related("owner", "leading_bidder").only(*AUCTION_COLUMNS).filter(pk=pk).first()
+        )
+        if auction is None:
+            raise Http404("No Auction matches the given query.")
+        data = AuctionSerializer(auction, context={"request": request}).data
+        # Tagged with the version actually served, which may be newer than the one checked
+        return tagged(Response(data), strong_etag("auction", pk, auction.version))
+
+
+class AuctionBids(KeysetListView):
+    """An auction's bids, highest (latest) first. Every bid bumps the version, so it tags the list too."""
+
+    serializer_class = BidSerializer
+    keys = ("-amount", "-id")
+
+    def get_queryset(self):
+        return (
+            Bid.objects.filter(auction_id=self.kwargs["pk"])
+            .select_related("bidder")
+            .only("amount", "created_at", "bidder__username")
+        )
+
+    def get(self, request, pk):
+        params = request.query_params
+        etag = strong_etag("bids", pk, auction_version(pk), params.get("cursor"), params.get("page_size"))
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        return tagged(super().get(request, pk=pk), etag)
+
+
+class MyBids(KeysetListView):
+    serializer_class = MyBidSerializer
+
+    def get_queryset(self):
+        return (
+            self.request.user.bids.select_related("auction")
+            .only("amount", "created_at", "bidder_id", "auction__title", "auction__leading_bidder_id")
+        )
+
+
+class MyNotifications(KeysetListView):
+    serializer_class = NotificationSerializer
+
+    def get_queryset(self):
+        return self.request.user.notifications.only("message", "created_at", "read")
@@ -0,0 +1,152 @@
+# auctions/bidding.py
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction, models
+from django.utils import timezone
+
+from . import counters, eventlog
+from .notifications import notify
+from .sqlite import retry_busy
+from .models import Auction, Bid, Notification
+
+# Outcomes of a bid attempt
+ACCEPTED = "accepted"
+INVALID_AMOUNT = "invalid_amount"
+NOT_FOUND = "not_found"
+CLOSED = "closed"
+OWN_AUCTION = "own_auction"
+TOO_LOW = "too_low"
+# Every attempt lost its race to other bids; nothing wrong with the amount
+CONTENDED = "contended"
+# Turned away before reaching place_bid (auctions/throttle.py)
+RATE_LIMITED = "rate_limited"
+DUPLICATE = "duplicate"
+
+REASON_MESSAGES = {
+    ACCEPTED: "Bid placed: ₹{amount} — good luck!",
+    INVALID_AMOUNT: "Invalid bid amount.",
+    NOT_FOUND: "This auction does not exist.",
+    CLOSED: "This auction is no longer active.",
+    OWN_AUCTION: "You cannot bid on your own auction.",
+    TOO_LOW: "Your bid must be greater than the current bid (₹{current_price}).",
+    CONTENDED: "Many bids are arriving on this auction right now. Please try again.",
+    RATE_LIMITED: "You are bidding too fast. Please wait a moment and try again.",
+    DUPLICATE: "This bid was already submitted.",
+}
+
+# How many times a bid is retried when another bid lands between our read and our write.
+MAX_ATTEMPTS = 5
+
+
+@dataclass(frozen=True)
+class BidResult:
+    reason: str
+    amount: Decimal = None
+    current_price: Decimal = None
+    bid: Bid = None
+    # Event log offset of the bid, when it was logged straight away
+    offset: int = None
+    # Position of the bid among the auction's bids (its bid_count once accepted), from 1
+    seq: int = None
+
+    @property
+    def accepted(self):
+        return self.reason == ACCEPTED
+
+    @property
+    def message(self):
+        return REASON_MESSAGES[self.reason].format(amount=self.amount, current_price=self.current_price)
+
+
+def parse_amount(raw):
+    """
+    Converts a user-supplied amount to a Decimal with at most two decimal places,
+    or returns None if it is not a positive money value.
+    """
+    try:
+        amount = Decimal(str(raw).strip())
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal("0.01")):
+        return None
+    return amount.quantize(Decimal("0.01"))
+
+
+def bid_notifications(owner_id, title, bidder, amount, previous_leader_id):
+    """The unsaved notifications for an accepted bid: the owner's, and the outbid leader's if any."""
+    notes = [
+        Notification(
+            user_id=owner_id,
+            message=f"{bidder.username} placed a bid of ₹{amount} on {title}",
+        )
+    ]
+    if previous_leader_id and previous_leader_id != bidder.pk:
+        notes.append(Notification(
+            user_id=previous_leader_id,
+            message=f"You have been outbid on {title}: the current bid is ₹{amount}.",
+        ))
+    return notes
+
+
+@retry_busy
+def place_bid(auction_id, bidder, raw_amount):
+    """
+    Places a bid of raw_amount by bidder on the auction and returns a BidResult.
+
+    The auction row is read once, then claimed with a single conditional UPDATE
+    that only matches while the price and bid count are still the ones we read.
+    If another bid wins that race we re-read and try again, so two concurrent
+    bids can never both beat the same price; after MAX_ATTEMPTS lost races the
+    result is CONTENDED. The bid row, the bidder's counter and the
+    notifications are written in the same transaction as the claim.
+    """
+    amount = parse_amount(raw_amount)
+    if amount is None:
+        return BidResult(INVALID_AMOUNT)
+
+    for _ in range(MAX_ATTEMPTS):
+        auction = (
+            Auction.objects.filter(pk=auction_id)
+            .only("owner_id", "title", "is_active", "ends_at", "current_price", "bid_count", "leading_bidder_id")
+            .first()
+        )
+        if auction is None:
+            return BidResult(NOT_FOUND, amount)
+        if auction.owner_id == bidder.pk:
+            return BidResult(OWN_AUCTION, amount, auction.current_price)
+        if not auction.is_active or auction.ends_at <= timezone.now():
+            return BidResult(CLOSED, amount, auction.current_price)
+        if amount <= auction.current_price:
+            return BidResult(TOO_LOW, amount, auction.current_price)
+
+        with transaction.atomic():
+            claimed = Auction.objects.filter(
+                pk=auction.pk,
+                is_active=True,
+                ends_at__gt=timezone.now(),
+                bid_count=auction.bid_count,
+                current_price=auction.current_price,
+            ).update(
+                current_price=amount,
+                bid_count=models.F("bid_count") + 1,
+                leading_bidder_id=bidder.pk,
+                version=models.F("version") + 1,
+            )
+            if not claimed:
+                # Someone else bid (or the auction closed) since we read it; look again.
+                continue
+
+            bid = Bid.objects.create(auction_id=auction.pk, bidder_id=bidder.pk, amount=amount)
+            counters.add("tenders_placed", {bidder.pk: 1})
+
+            notify(
+                bid_notifications(auction.owner_id, auction.title, bidder, amount, auction.leading_bidder_id)
+            )
+
+        offset = eventlog.record_after_commit(
+            eventlog.BID_PLACED, auction.pk, bid=bid.pk, bidder=bidder.pk, amount=str(amount)
+        )
+        return BidResult(ACCEPTED, amount, amount, bid, offset, auction.bid_count + 1)
+
+    return BidResult(CONTENDED, amount, auction.current_price)
@@ -0,0 +1,224 @@
+# auctions/broadcast.py
+"""
+Fan-out helpers for the auction WebSocket groups.
+
+Group messages carry their frame already JSON-encoded (``broadcast_event``), so
+a payload is serialized once per group_send rather than once per socket. With
+BID_COALESCE_WINDOW_MS set, bids accepted on the same auction within the window
+are merged into a single "price_update" frame (``BidCoalescer``). Each socket
+writes through an ``Outbox`` that holds at most SOCKET_SEND_QUEUE_SIZE price
+updates and drops the older ones when the client cannot keep up.
+
+Code on other threads (database threads, the live book's flusher, the closer
+worker) hands its events to ``send_from_thread``. Accepted bids go out through
+``send_bid`` (or ``send_bid_from_thread``), which also keeps each frame for
+sockets that reconnect (auctions/resume.py).
+"""
+import asyncio
+import json
+import logging
+import weakref
+from collections import deque
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+
+from . import resume
+
+logger = logging.getLogger(__name__)
+
+# Event loop of the ASGI server in this process, once a socket connected
+_loop = None
+
+
+def broadcast_event(payload, droppable=False):
+    """A channel-layer event that AuctionConsumer.broadcast sends as-is."""
+    return {"type": "broadcast", "text": json.dumps(payload), "droppable": droppable}
+
+
+def bid_frame(username, result):
+    """The frame of an accepted bid (a BidResult) as the auction's sockets get it."""
+    frame = {
+        "id": result.bid.pk,
+        "bidder": username,
+        "amount": str(result.amount),
+        "created_at": result.bid.created_at.isoformat(),
+        "offset": result.offset,
+        "seq": result.seq,
+    }
+    if frame["id"] is None:
+        # A live-book bid has no id until it is written
+        del frame["id"]
+    return frame
+
+
+def listen():
+    """Called on the server's event loop by the sockets; send_from_thread then goes through it."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+async def send_events(channel_layer, events):
+    send_many = getattr(channel_layer, "group_send_many", None)
+    if send_many is not None:
+        await send_many(events)
+    else:
+        await asyncio.gather(*(channel_layer.group_send(group, event) for group, event in events))
+
+
+def send_from_thread(events):
+    """Sends (group, channel event) pairs from a synchronous thread."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not events:
+        return
+    loop = _loop
+    if loop is not None and loop.is_running():
+        # Hand the sends to the server's loop; the calling thread doesn't wait for them
+        asyncio.run_coroutine_threadsafe(send_events(channel_layer, events), loop)
+    elif not isinstance(channel_layer, InMemoryChannelLayer):
+        # No sockets here (closer worker, WSGI, commands): deliver through the
+        # shared layer to the processes that have them
+        async_to_sync(send_events)(channel_layer, events)
+
+
+class Outbox:
+    """
+    Per-connection send queue drained by a background task.
+
+    Droppable frames (price updates) are superseded by newer ones, so when more
+    than `maxsize` of them are waiting the oldest is discarded. Other frames
+    (rejections, auction closed) are always delivered.
+    """
+
+    def __init__(self, send, maxsize):
+        self._send = send
+        self._maxsize = maxsize
+        self._queue = deque()
+        self._droppable = 0
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    def put(self, text, droppable=False):
+        if droppable:
+            if self._droppable >= self._maxsize:
+                for i, (_, old_droppable) in enumerate(self._queue):
+                    if old_droppable:
+                        del self._queue[i]
+                        self._droppable -= 1
+                        self.dropped += 1
+                        break
+            self._droppable += 1
+        self._queue.append((text, droppable))
+        self._ready.set()
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._queue:
+                text, droppable = self._queue.popleft()
+                if droppable:
+                    self._droppable -= 1
+                try:
+                    await self._send(text_data=text)
+                except Exception:
+                    # The socket went away; disconnect() will cancel us.
+                    self._queue.clear()
+                    return
+
+    def close(self):
+        self._task.cancel()
+
+
+class BidCoalescer:
+    """
+    Merges the bids accepted on one auction within `window` seconds into one
+    "price_update" frame with the latest price and a short trail of bids.
+    One coalescer serves every socket of the process on a given event loop.
+    """
+
+    def __init__(self, channel_layer, window, trail_length):
+        self.channel_layer = channel_layer
+        self.window = window
+        self.trail_length = trail_length
+        self._pending = {}
+        # group -> timer of its next flush; flushes under way, kept so they are not collected
+        self._timers = {}
+        self._tasks = set()
+
+    def add(self, group_name, bid):
+        pending = self._pending.setdefault(group_name, [])
+        pending.append(bid)
+        if len(pending) == 1:
+            self._timers[group_name] = asyncio.get_running_loop().call_later(
+                self.window, self._start_flush, group_name
+            )
+
+    def _start_flush(self, group_name):
+        self._timers.pop(group_name, None)
+        task = asyncio.get_running_loop().create_task(self.flush(group_name))
+        self._tasks.add(task)
+        task.add_done_callback(self._flushed)
+
+    def _flushed(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Sending a price update failed", exc_info=task.exception())
+
+    def close(self):
+        """Cancels the flushes still waiting or running; for shutting the loop down."""
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        self._timers.clear()
+        self._pending.clear()
+
+    async def flush(self, group_name):
+        bids = self._pending.pop(group_name, None)
+        if not bids:
+            return
+        latest = bids[-1]
+        payload = {
+            "type": "price_update",
+            "amount": latest["amount"],
+            "bidder": latest["bidder"],
+            "created_at": latest["created_at"],
+            "count": len(bids),
+            "bids": bids[-self.trail_length:],
+        }
+        await self.channel_layer.group_send(group_name, broadcast_event(payload, droppable=True))
+
+
+_coalescers = weakref.WeakKeyDictionary()
+
+
+def get_coalescer(channel_layer):
+    """The coalescer for the running loop, or None when coalescing is switched off."""
+    window_ms = settings.BID_COALESCE_WINDOW_MS
+    if not window_ms:
+        return None
+    loop = asyncio.get_running_loop()
+    coalescer = _coalescers.get(loop)
+    if coalescer is None:
+        coalescer = _coalescers[loop] = BidCoalescer(channel_layer, window_ms / 1000, settings.BID_TRAIL_LENGTH)
+    return coalescer
+
+
+async def send_bid(channel_layer, auction_id, frame):
+    """Sends an accepted bid to the auction's sockets (coalesced when that is on)."""
+    resume.remember(auction_id, dict(frame, type="bid_message"))
+    group_name = f"auction_{auction_id}"
+    coalescer = get_coalescer(channel_layer)
+    if coalescer is not None:
+        coalescer.add(group_name, frame)
+    else:
+        await channel_layer.group_send(group_name, broadcast_event(dict(frame, type="bid_message"), droppable=True))
+
+
+def send_bid_from_thread(auction_id, frame):
+    """send_bid for bids placed off the event loop, such as the detail page's form; never coalesced."""
+    resume.remember(auction_id, dict(frame, type="bid_message"))
+    send_from_thread([(f"auction_{auction_id}", broadcast_event(dict(frame, type="bid_message"), droppable=True))])
@@ -0,0 +1,57 @@
+# auctions/cache.py
+"""
+Fragment cache for rendered auction markup.
+
+Fragments are keyed on the auction's ``version`` column, which every bid, close
+and edit bumps in the same UPDATE that changes the row. A page therefore never
+needs to invalidate anything: the next render after a bid simply asks for a new
+key, and the stale fragment ages out of the cache on its own.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def fragment_cache():
+    return caches[settings.AUCTION_FRAGMENT_CACHE]
+
+
+def fragment_key(name, auction):
+    return f"auction:{auction.pk}:v{auction.version}:{name}"
+
+
+def _count(outcome):
+    with _lock:
+        _stats[outcome] += 1
+
+
+def get_or_render(name, auction, render):
+    """Returns the cached fragment `name` for this auction version, rendering it on a miss."""
+    cache = fragment_cache()
+    key = fragment_key(name, auction)
+    html = cache.get(key)
+    if html is not None:
+        _count("hits")
+        return html
+
+    _count("misses")
+    html = render()
+    cache.set(key, html, settings.AUCTION_FRAGMENT_TIMEOUT)
+    return html
+
+
+def stats():
+    """Hit/miss counters of this process since start (or the last reset)."""
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else None}
+
+
+def reset_stats():
+    with _lock:
+        _stats["hits"] = _stats["misses"] = 0
@@ -0,0 +1,187 @@
+# auctions/closer.py
+import asyncio
+import heapq
+import logging
+import threading
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import counters, livebook
+from .broadcast import broadcast_event
+from .models import Auction
+from .utils import close_auctions_batch
+
+logger = logging.getLogger(__name__)
+
+
+class AuctionCloser:
+    """
+    Closes auctions as they expire, off the request path.
+
+    Keeps an in-memory min-heap of (ends_at, auction_id) for the active auctions
+    and sleeps until the earliest one is due. Auctions created in this process
+    are pushed onto the heap straight away (see signals.py); auctions created by
+    other processes are picked up by a periodic refresh from the database.
+
+    Runs either on its own thread (run_forever) or as an asyncio task on the
+    ASGI server's event loop (run_async).
+    """
+
+    def __init__(self, batch_size=100, refresh_interval=30):
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._notify = self._wakeup.set
+        self._stopping = False
+
+    def schedule(self, auction_id, ends_at):
+        with self._lock:
+            heapq.heappush(self._heap, (ends_at, auction_id))
+            is_next = self._heap[0][1] == auction_id
+        if is_next:
+            self._notify()
+
+    def refresh(self):
+        """Rebuilds the heap from the active auctions in the database."""
+        heap = list(Auction.objects.filter(is_active=True).values_list("ends_at", "pk"))
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+
+    def due(self, now):
+        """Pops up to batch_size auction ids whose end time has passed."""
+        ids = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(ids) < self.batch_size:
+                ids.append(heapq.heappop(self._heap)[1])
+        return ids
+
+    def seconds_until_next(self):
+        with self._lock:
+            if not self._heap:
+                return self.refresh_interval
+            wait = (self._heap[0][0] - timezone.now()).total_seconds()
+        return min(max(wait, 0), self.refresh_interval)
+
+    def run_once(self):
+        """Closes every auction that is due, one batch at a time. Returns the closed ids."""
+        closed = []
+        while True:
+            ids = self.due(timezone.now())
+            if not ids:
+                return closed
+            if settings.LIVE_BOOK:
+                # Bids still held in memory are written before the winner is read
+                for auction_id in ids:
+                    livebook.books.retire(auction_id)
+            closed.extend(close_auctions_batch(ids))
+
+    def _pass(self, last_refresh):
+        """One sync pass: refresh if needed, then close. Returns (events, last_refresh)."""
+        close_old_connections()
+        now = timezone.now()
+        if last_refresh is None or (now - last_refresh).total_seconds() >= self.refresh_interval:
+            self.refresh()
+            last_refresh = now
+            if settings.COUNTER_DELTAS:
+                counters.fold()
+        closed = self.run_once()
+        if closed:
+            logger.info("Closed %d expired auctions", len(closed))
+        return closed_events(closed), last_refresh
+
+    def run_forever(self):
+        last_refresh = None
+        while not self._stopping:
+            try:
+                events, last_refresh = self._pass(last_refresh)
+                if events:
+                    async_to_sync(send_closed_events)(events)
+            except Exception:
+                logger.exception("Auction closer pass failed")
+            self._wakeup.wait(self.seconds_until_next())
+            self._wakeup.clear()
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        # schedule() is called from sync threads, so hop onto the loop to wake us.
+        self._notify = lambda: loop.call_soon_threadsafe(wakeup.set)
+        last_refresh = None
+        while not self._stopping:
+            try:
+                events, last_refresh = await sync_to_async(self._pass)(last_refresh)
+                await send_closed_events(events)
+            except Exception:
+                logger.exception("Auction closer pass failed")
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.seconds_until_next())
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    def stop(self):
+        self._stopping = True
+        self._notify()
+
+
+def closed_events(auction_ids):
+    """Builds the "auction_closed" channel events for the given auctions."""
+    if not auction_ids:
+        return []
+    rows = Auction.objects.filter(pk__in=auction_ids).values_list(
+        "pk", "current_price", "bid_count", "leading_bidder__username"
+    )
+    return [
+        {
+            "type": "auction_closed",
+            "auction_id": pk,
+            "winner": winner,
+            "amount": str(price) if bid_count else None,
+        }
+        for pk, price, bid_count, winner in rows
+    ]
+
+
+async def send_closed_events(events):
+    """Tells everyone watching the closed auctions that bidding is over."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for event in events:
+        await channel_layer.group_send(f"auction_{event['auction_id']}", broadcast_event(event))
+
+
+# The closer running inside this process, if any.
+closer = None
+_closer_task = None
+
+
+def start_closer_thread(**kwargs):
+    """Starts the in-process closer on a daemon thread (WSGI processes)."""
+    global closer
+    if closer is None:
+        closer = AuctionCloser(**kwargs)
+        threading.Thread(target=closer.run_forever, name="auction-closer", daemon=True).start()
+    return closer
+
+
+def with_auction_closer(app, **kwargs):
+    """
+    Wraps an ASGI application so the closer starts as a task on the server's
+    event loop with the first connection (or lifespan startup).
+    """
+    async def application(scope, receive, send):
+        global closer, _closer_task
+        if closer is None:
+            closer = AuctionCloser(**kwargs)
+            _closer_task = asyncio.get_running_loop().create_task(closer.run_async())
+        return await app(scope, receive, send)
+
+    return application
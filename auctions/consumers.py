@@ -1,56 +1,152 @@
 # auctions/consumers.py
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
-from .models import Auction, Bid, Notification, UserProfile
-from django.utils import timezone
+from django.conf import settings
+from . import eventlog, livebook, notifications, perf, replicas, resume, throttle
+from .bidding import BidResult, place_bid
+from .broadcast import Outbox, bid_frame, listen, send_bid
+from .executors import bid_executor
+
+SIGN_IN_TO_BID = {"type": "bid_rejected", "accepted": False, "reason": "unknown_user", "message": "Please sign in to bid."}
+
 
 class AuctionConsumer(AsyncWebsocketConsumer):
+    actions = {"place_bid", "events_since"}
+
     async def connect(self):
+        listen()
         self.auction_id = self.scope["url_route"]["kwargs"]["auction_id"]
         self.group_name = f"auction_{self.auction_id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        self.outbox = Outbox(self.send, settings.SOCKET_SEND_QUEUE_SIZE)
+
+        # Joined the group first, so nothing falls between the replay and the live stream;
+        # the client drops frames whose seq it has already seen.
+        last_seen = self.last_seen()
+        if last_seen is not None:
+            frames = await self.run_db(resume.missed_bids, self.auction_id, last_seen)
+            reply = {"type": "resume", "bids": frames} if frames is not None else {"type": "resync"}
+            self.outbox.put(json.dumps(reply))
+
+    def last_seen(self):
+        """The seq of the last bid the client saw (?last_seen=N), or None on a first connect."""
+        params = parse_qs(self.scope.get("query_string", b"").decode())
+        value = params.get("last_seen", [""])[0]
+        return int(value) if value.isdigit() else None
+
+    async def run_db(self, fn, *args):
+        executor = bid_executor()
+        if executor is not None:
+            # Work for other auctions runs in parallel on their own DB threads
+            return await executor.run(self.auction_id, fn, *args)
+        return await sync_to_async(fn)(*args)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, "outbox"):
+            self.outbox.close()
 
     async def receive(self, text_data):
         data = json.loads(text_data)
         action = data.get("action")
+        # Profiled per action; unknown actions share one bucket so clients cannot grow the registry
+        with perf.profile(f"ws:auction:{action if action in self.actions else 'other'}"):
+            await self.handle(action, data)
+
+    async def handle(self, action, data):
         if action == "place_bid":
+            # The session's user, loaded once per socket by AuthMiddlewareStack
+            user = self.scope.get("user")
+            if user is None or not user.is_authenticated:
+                self.outbox.put(json.dumps(SIGN_IN_TO_BID))
+                return
             amount = data.get("amount")
-            user_id = data.get("user_id")
-            result = await sync_to_async(self.place_bid)(user_id, amount)
-            if result:
-                await self.channel_layer.group_send(
-                    self.group_name,
-                    {
-                        "type": "bid_message",
-                        "bidder": result["bidder"],
-                        "amount": str(result["amount"]),
-                        "created_at": result["created_at"],
-                    },
-                )
-
-    async def bid_message(self, event):
-        await self.send(text_data=json.dumps(event))
-
-    def place_bid(self, user_id, amount):
-        try:
-            auction = Auction.objects.get(pk=self.auction_id)
-            user = UserProfile.objects.get(pk=user_id)
-            amount_dec = float(amount)
-            current = float(auction.current_bid)
-            if amount_dec > current:
-                b = Bid.objects.create(auction=auction, bidder=user, amount=amount_dec)
-                user.tenders_placed += 1
-                user.save()
-                # Optionally create notification for owner when outbid
-                Notification.objects.create(
-                    user=auction.owner,
-                    message=f"{user.username} placed a bid of ₹{amount_dec} on {auction.title}",
-                )
-                return {"bidder": user.username, "amount": amount_dec, "created_at": b.created_at.isoformat()}
-        except Exception:
-            return None
+            refused = throttle.check(user.pk, self.auction_id, data.get("key"), path="ws")
+            if refused:
+                self.outbox.put(json.dumps(self.bid_payload(user, BidResult(refused))))
+                return
+            result = None
+            if settings.LIVE_BOOK:
+                # Decided right here on the event loop once the book is loaded
+                outcome = livebook.try_place_bid(self.auction_id, user, amount)
+                if outcome is not None:
+                    result = self.bid_payload(user, outcome)
+            if result is None:
+                result = await self.run_db(self.place_bid, user, amount)
+            if result.pop("accepted"):
+                replicas.pin(user.pk)
+                await send_bid(self.channel_layer, self.auction_id, result)
+            else:
+                # Rejections only concern the socket that sent the bid
+                self.outbox.put(json.dumps(result))
+        elif action == "events_since":
+            # A reconnecting client catching up from the event log offset it last saw
+            reply = await sync_to_async(self.events_since, thread_sensitive=False)(data.get("offset"))
+            self.outbox.put(json.dumps(reply))
+
+    async def broadcast(self, event):
+        # The frame was serialized once by whoever did the group_send
+        self.outbox.put(event["text"], event["droppable"])
+
+    def place_bid(self, user, amount):
+        submit = livebook.place_bid if settings.LIVE_BOOK else place_bid
+        return self.bid_payload(user, submit(self.auction_id, user, amount))
+
+    def events_since(self, offset):
+        """
+        This auction's events from `offset` on, reading at most
+        EVENT_LOG_SCAN_LIMIT records of the shared log: a client far behind,
+        or watching a quiet auction, asks again from next_offset.
+        """
+        log = eventlog.get_log()
+        if log is None or not str(offset).isdigit():
+            return {"type": "events", "events": [], "next_offset": None}
+        events, next_offset = [], int(offset)
+        for event_offset, event in log.read(int(offset), limit=settings.EVENT_LOG_SCAN_LIMIT):
+            next_offset = event_offset + 1
+            if event["auction"] == self.auction_id:
+                events.append(dict(event, offset=event_offset))
+                if len(events) >= settings.EVENT_LOG_REPLAY_LIMIT:
+                    break
+        return {"type": "events", "events": events, "next_offset": next_offset}
+
+    @staticmethod
+    def bid_payload(user, result):
+        if not result.accepted:
+            return {
+                "type": "bid_rejected",
+                "accepted": False,
+                "reason": result.reason,
+                "message": result.message,
+                "current_price": str(result.current_price) if result.current_price is not None else None,
+            }
+        return dict(bid_frame(user.username, result), accepted=True)
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Pushes a signed-in user's new alerts (see notifications.publish) as they are created."""
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        listen()
+        self.group_name = notifications.user_group(user.pk)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        self.outbox = Outbox(self.send, settings.SOCKET_SEND_QUEUE_SIZE)
+        # The count as of the user row loaded for this connection, for the badge
+        self.outbox.put(json.dumps({"type": "unread", "count": user.unread_notifications}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, "outbox"):
+            self.outbox.close()
+
+    async def broadcast(self, event):
+        self.outbox.put(event["text"], event["droppable"])
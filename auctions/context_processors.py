@@ -0,0 +1,9 @@
+# auctions/context_processors.py
+
+
+def unread_notifications(request):
+    """The unread alert count for the nav badge, read off the user row (no COUNT query)."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {"unread_notifications": user.unread_notifications}
@@ -0,0 +1,97 @@
+# auctions/counters.py
+"""
+The per-user activity counters on UserProfile: vendues_created,
+tenders_placed and auctions_won.
+
+Every write path bumps them through add(). By default that is an UPDATE of
+the user rows (one per distinct increment). With COUNTER_DELTAS on it inserts
+CounterDelta rows instead, so a user bidding in rapid bursts stops queuing
+behind their own profile row on every bid. fold() later sums the deltas into
+the columns and deletes them: the auction closer does it on each refresh, or
+run `manage.py fold_counters`.
+
+Until then a column is behind by its pending deltas, so anything that shows a
+counter reads it with totals(), the column plus the pending sum, in one query.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from .models import CounterDelta, UserProfile
+
+FIELDS = [name for name, _ in CounterDelta.FIELD_CHOICES]
+
+
+def _apply(field, counts):
+    # One UPDATE per distinct increment rather than per user
+    by_count = defaultdict(list)
+    for user_id, n in counts.items():
+        by_count[n].append(user_id)
+    for n, user_ids in by_count.items():
+        UserProfile.objects.filter(pk__in=user_ids).update(**{field: models.F(field) + n})
+
+
+def add(field, counts):
+    """Adds counts ({user id: n}) to a counter, as deltas or straight to the column."""
+    counts = {user_id: n for user_id, n in counts.items() if n}
+    if not counts:
+        return
+    if settings.COUNTER_DELTAS:
+        CounterDelta.objects.bulk_create(
+            CounterDelta(user_id=user_id, field=field, amount=n) for user_id, n in counts.items()
+        )
+    else:
+        _apply(field, counts)
+
+
+class _Conflict(Exception):
+    pass
+
+
+def fold(batch_size=None):
+    """
+    Moves the pending deltas into the UserProfile columns, oldest first, a
+    transaction per batch. A batch is claimed by deleting its rows: when
+    another fold got some of them first, the batch is rolled back and read
+    again. Returns the number of deltas folded.
+    """
+    batch_size = batch_size or settings.COUNTER_FOLD_BATCH_SIZE
+    folded = 0
+    while True:
+        try:
+            with transaction.atomic():
+                rows = list(
+                    CounterDelta.objects.order_by("id").values_list("id", "user_id", "field", "amount")[:batch_size]
+                )
+                if not rows:
+                    return folded
+                deleted, _ = CounterDelta.objects.filter(id__in=[row[0] for row in rows]).delete()
+                if deleted != len(rows):
+                    raise _Conflict
+
+                per_field = defaultdict(Counter)
+                for _, user_id, field, amount in rows:
+                    per_field[field][user_id] += amount
+                for field, counts in per_field.items():
+                    _apply(field, counts)
+        except _Conflict:
+            continue
+        folded += len(rows)
+        if len(rows) < batch_size:
+            return folded
+
+
+def totals(user_id):
+    """{counter: value} for one user, including the deltas not folded yet."""
+    pending = {
+        f"{field}_pending": Coalesce(
+            models.Sum("counter_deltas__amount", filter=models.Q(counter_deltas__field=field)), 0
+        )
+        for field in FIELDS
+    }
+    row = next(iter(UserProfile.objects.filter(pk=user_id).values(*FIELDS).annotate(**pending)), None)
+    if row is None:
+        return dict.fromkeys(FIELDS, 0)
+    return {field: row[field] + row[f"{field}_pending"] for field in FIELDS}
@@ -0,0 +1,276 @@
+# auctions/eventlog.py
+"""
+Append-only log of auction events (EVENT_LOG): auction_created, bid_placed and
+auction_closed, each a JSON object, written after the transaction that caused
+it commits.
+
+The log is a directory of segment files named after the offset of their first
+event; offsets number the events from 0 across segments. A record is its
+length and CRC32 followed by the JSON payload, so a record torn by a crash is
+recognised and cut off by the next writer. Writers in several processes
+serialize on a lock file; readers memory-map the segments and need no lock.
+
+Snapshots hold the state folded from the log up to an offset (see State) and
+are written whenever a segment fills up, by `replay_events --snapshot`, or from
+the current database with `replay_events --bootstrap` when the log is switched
+on for an existing site. `replay_events` then rebuilds the denormalized auction
+columns and the UserProfile counters from the latest snapshot plus the events
+after it.
+"""
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<II")  # payload length, crc32 of the payload
+
+AUCTION_CREATED = "auction_created"
+BID_PLACED = "bid_placed"
+AUCTION_CLOSED = "auction_closed"
+
+
+def _records(buffer, start=0):
+    """Yields (end position, payload) for each intact record of a segment from `start`."""
+    pos, size = start, len(buffer)
+    while pos + HEADER.size <= size:
+        length, crc = HEADER.unpack_from(buffer, pos)
+        end = pos + HEADER.size + length
+        if end > size:
+            return
+        payload = buffer[pos + HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            return
+        yield end, payload
+        pos = end
+
+
+class EventLog:
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync=False):
+        self.directory = str(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        # Where this process last saw the end of the log
+        self._base = self._count = self._position = None
+        os.makedirs(os.path.join(self.directory, "snapshots"), exist_ok=True)
+
+    # Segments
+
+    def segments(self):
+        """Base offsets of the segments, oldest first."""
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def _segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}.seg")
+
+    def _catch_up(self):
+        """Counts the records other writers appended since we last looked; cuts a torn tail."""
+        bases = self.segments() or [0]
+        base = bases[-1]
+        if base != self._base:
+            self._base, self._count, self._position = base, 0, 0
+        path = self._segment_path(base)
+        if not os.path.exists(path):
+            open(path, "ab").close()
+        with open(path, "rb") as fh:
+            fh.seek(self._position)
+            tail = fh.read()
+        intact = 0
+        for end, _ in _records(tail):
+            self._count += 1
+            intact = end
+        if intact < len(tail):
+            logger.warning("Event log %s: cutting a torn record at byte %d", path, self._position + intact)
+            os.truncate(path, self._position + intact)
+        self._position += intact
+
+    # Writing
+
+    def append(self, event):
+        """Appends one event and returns its offset."""
+        payload = json.dumps(event, separators=(",", ":")).encode()
+        record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        rolled = False
+        with self._lock, open(os.path.join(self.directory, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._catch_up()
+            if self._position and self._position + len(record) > self.segment_bytes:
+                self._base, self._count, self._position = self._base + self._count, 0, 0
+                rolled = True
+            with open(self._segment_path(self._base), "ab") as fh:
+                fh.write(record)
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+            offset = self._base + self._count
+            self._count += 1
+            self._position += len(record)
+        if rolled:
+            # The full segment gets a snapshot, so replays can start after it
+            threading.Thread(target=self.write_snapshot, name="event-log-snapshot", daemon=True).start()
+        return offset
+
+    # Reading
+
+    def read(self, since=0, limit=None):
+        """Yields (offset, event) from offset `since` on, reading the segments memory-mapped."""
+        bases = self.segments()
+        # Start in the last segment that begins at or before `since`
+        first = max([i for i, base in enumerate(bases) if base <= since] or [0])
+        returned = 0
+        for base in bases[first:]:
+            with open(self._segment_path(base), "rb") as fh:
+                if os.fstat(fh.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    for offset, (_, payload) in enumerate(_records(buffer), start=base):
+                        if offset < since:
+                            continue
+                        yield offset, json.loads(payload)
+                        returned += 1
+                        if limit is not None and returned >= limit:
+                            return
+
+    def end(self):
+        """The offset the next event will get."""
+        with self._lock:
+            self._catch_up()
+            return self._base + self._count
+
+    # Snapshots
+
+    def _snapshot_dir(self):
+        return os.path.join(self.directory, "snapshots")
+
+    def latest_snapshot(self):
+        """The newest snapshot as a State, or an empty State at offset 0."""
+        names = sorted(name for name in os.listdir(self._snapshot_dir()) if name.endswith(".json"))
+        if not names:
+            return State()
+        with open(os.path.join(self._snapshot_dir(), names[-1])) as fh:
+            return State.from_json(json.load(fh))
+
+    def save_snapshot(self, state):
+        path = os.path.join(self._snapshot_dir(), f"{state.offset:020d}.json")
+        # Processes that rolled the same segment may write the same snapshot at once
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(state.to_json(), fh)
+        os.replace(tmp, path)
+        return path
+
+    def fold(self, state=None):
+        """`state` (default: the latest snapshot) brought up to the end of the log."""
+        state = self.latest_snapshot() if state is None else state
+        for offset, event in self.read(state.offset):
+            state.apply(event)
+            state.offset = offset + 1
+        return state
+
+    def write_snapshot(self):
+        try:
+            return self.save_snapshot(self.fold())
+        except Exception:
+            logger.exception("Event log snapshot failed")
+
+
+class State:
+    """Auction and user counters folded from events; what a snapshot stores."""
+
+    def __init__(self, offset=0, auctions=None, users=None):
+        self.offset = offset
+        # auction id -> [owner_id, current_price, bid_count, leading_bidder_id, is_active]
+        self.auctions = auctions or {}
+        # user id -> [tenders_placed, auctions_won]
+        self.users = users or {}
+
+    def _user(self, user_id):
+        return self.users.setdefault(user_id, [0, 0])
+
+    def apply(self, event):
+        kind, auction_id = event["type"], event["auction"]
+        if kind == AUCTION_CREATED:
+            self.auctions[auction_id] = [event["owner"], Decimal(event["base_price"]), 0, None, True]
+        elif kind == BID_PLACED:
+            auction = self.auctions.get(auction_id)
+            if auction is not None:
+                auction[2] += 1
+                # Bids are appended after commit, from several threads and processes, so
+                # a lower one can land after a higher one: the highest leads, not the last.
+                amount = Decimal(event["amount"])
+                if auction[2] == 1 or amount > auction[1]:
+                    auction[1], auction[3] = amount, event["bidder"]
+            self._user(event["bidder"])[0] += 1
+        elif kind == AUCTION_CLOSED:
+            auction = self.auctions.get(auction_id)
+            if auction is not None:
+                auction[4] = False
+            if event["winner"]:
+                self._user(event["winner"])[1] += 1
+
+    def to_json(self):
+        return {
+            "offset": self.offset,
+            "auctions": {str(pk): [o, str(p), n, lead, active] for pk, (o, p, n, lead, active) in self.auctions.items()},
+            "users": {str(pk): counters for pk, counters in self.users.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data["offset"],
+            {int(pk): [o, Decimal(p), n, lead, active] for pk, (o, p, n, lead, active) in data["auctions"].items()},
+            {int(pk): counters for pk, counters in data["users"].items()},
+        )
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """The process-wide EventLog, or None when EVENT_LOG is off."""
+    global _log
+    if not settings.EVENT_LOG:
+        return None
+    with _log_lock:
+        if _log is None or _log.directory != str(settings.EVENT_LOG_DIR):
+            _log = EventLog(settings.EVENT_LOG_DIR, settings.EVENT_LOG_SEGMENT_BYTES, settings.EVENT_LOG_FSYNC)
+        return _log
+
+
+def record(kind, auction_id, **fields):
+    """
+    Appends an event and returns its offset; None when the log is off or the
+    write failed. Never raises: the database has already committed by now.
+    """
+    log = get_log()
+    if log is None:
+        return None
+    try:
+        return log.append({"type": kind, "auction": auction_id, "ts": timezone.now().isoformat(), **fields})
+    except OSError:
+        logger.exception("Could not append %s for auction %s to the event log", kind, auction_id)
+        return None
+
+
+def record_after_commit(kind, auction_id, **fields):
+    """
+    record() once the current transaction commits. Returns the offset when
+    there is no transaction open (so the event is written right away), else None.
+    """
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: record(kind, auction_id, **fields))
+        return None
+    return record(kind, auction_id, **fields)
@@ -0,0 +1,72 @@
+# auctions/executors.py
+"""
+Database threads for the async (WebSocket) side.
+
+sync_to_async(thread_sensitive=True) runs every call of the process on one
+thread, so a bid on one auction waits behind bids on all the others. Django's
+async ORM methods (aget, acreate, ...) are thin wrappers over that same
+executor and there are no async transactions, so they do not help either.
+
+Instead each auction is pinned to one of BID_DB_THREADS single-thread
+executors: bids on the same auction still run one after another (they would
+only race on the same row), while bids on different auctions run in parallel,
+each thread keeping its own database connection for as long as it lives.
+
+On SQLite every bid still queues for the one write lock, so
+benchmarks/bench_async_bids.py shows only a few percent over sync_to_async;
+databases that take concurrent writers gain more. BID_DB_THREADS = 0 turns it
+off.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class KeyedExecutor:
+    """`size` single-thread executors; work for the same key always lands on the same thread."""
+
+    def __init__(self, size, name="db"):
+        self.size = size
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-{i}") for i in range(size)
+        ]
+
+    async def run(self, key, fn, *args, **kwargs):
+        executor = self._executors[hash(key) % self.size]
+        # Carry the caller's context variables (e.g. the perf profile) over to the thread
+        call = partial(contextvars.copy_context().run, _in_thread, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+
+
+def _in_thread(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        # Drop the thread's connection if the failure left it unusable. Not after
+        # every call: with CONN_MAX_AGE = 0 that would reconnect for each bid.
+        close_old_connections()
+        raise
+
+
+_lock = threading.Lock()
+_bid_executor = None
+
+
+def bid_executor():
+    """The process-wide executor for bids, or None when BID_DB_THREADS is 0."""
+    global _bid_executor
+    if not settings.BID_DB_THREADS:
+        return None
+    with _lock:
+        if _bid_executor is None or _bid_executor.size != settings.BID_DB_THREADS:
+            _bid_executor = KeyedExecutor(settings.BID_DB_THREADS, name="bid-db")
+        return _bid_executor
@@ -0,0 +1,113 @@
+# auctions/exports.py
+"""
+Streaming exports of the bid history and of closed-auction results, as CSV or
+NDJSON, for `manage.py export_data` and the staff endpoint /_export/<kind>/.
+
+Rows are read as tuples with QuerySet.iterator(chunk_size=...), which fetches
+them from the database cursor a chunk at a time instead of caching the whole
+result, and are written out in batches as they arrive. Memory stays flat
+whatever the number of rows.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Auction, Bid
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# kind -> (column names, values_list fields)
+COLUMNS = {
+    "bids": (
+        ["bid_id", "auction_id", "auction_title", "category", "bidder", "amount", "created_at"],
+        ["id", "auction_id", "auction__title", "auction__category", "bidder__username", "amount", "created_at"],
+    ),
+    "results": (
+        ["auction_id", "title", "category", "seller", "winner", "final_price", "bid_count", "ends_at"],
+        ["id", "title", "category", "owner__username", "leading_bidder__username", "current_price", "bid_count",
+         "ends_at"],
+    ),
+}
+
+
+def parse_moment(value, end_of_day=False):
+    """An aware datetime from an ISO date or datetime string; None for empty; ValueError if malformed."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Not a date or datetime: {value!r}")
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def queryset(kind, since=None, until=None, auction_ids=None, category=None):
+    """
+    The rows of an export as a values_list queryset in id order. `since` and
+    `until` bound the bid time for bids and the end time for results.
+    """
+    if kind == "bids":
+        qs, when, prefix = Bid.objects.all(), "created_at", "auction__"
+        auction_field = "auction_id"
+    elif kind == "results":
+        qs, when, prefix = Auction.objects.filter(is_active=False), "ends_at", ""
+        auction_field = "id"
+    else:
+        raise ValueError(f"Unknown export {kind!r}")
+    if since is not None:
+        qs = qs.filter(**{f"{when}__gte": since})
+    if until is not None:
+        qs = qs.filter(**{f"{when}__lte": until})
+    if auction_ids:
+        qs = qs.filter(**{f"{auction_field}__in": auction_ids})
+    if category:
+        qs = qs.filter(**{f"{prefix}category": category})
+    return qs.order_by("id").values_list(*COLUMNS[kind][1])
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value if value is None or isinstance(value, (int, str)) else str(value)
+
+
+def _rows(kind, rows):
+    if kind == "results":
+        # No bids: there is no winner and no final price
+        for row in rows:
+            yield row if row[6] else (*row[:5], None, *row[6:])
+    else:
+        yield from rows
+
+
+def stream(kind, fmt, qs, chunk_size=2000):
+    """Yields the export of `qs` as text, a batch of chunk_size rows at a time."""
+    header = COLUMNS[kind][0]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(header)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    for n, row in enumerate(_rows(kind, qs.iterator(chunk_size=chunk_size)), 1):
+        cells = [_cell(value) for value in row]
+        if fmt == "csv":
+            writer.writerow(cells)
+        else:
+            buffer.write(json.dumps(dict(zip(header, cells))) + "\n")
+        if n % chunk_size == 0:
+            yield flush()
+    yield flush()
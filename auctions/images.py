@@ -0,0 +1,206 @@
+# auctions/images.py
+"""
+Resized renditions of uploaded images (auction photos and avatars).
+
+Once an upload has committed, build() runs on one of IMAGE_WORKERS background
+threads (Pillow releases the GIL while decoding, resizing and encoding, so
+threads scale without the pickling of a process pool). It hashes the file and
+moves it to originals/<sha256>, so the same photo uploaded twice is stored
+once, then renders each rendition of the field as WebP and JPEG under
+derived/<sha256>/, skipping any that are already there. The digest is saved
+on the row (<field>_digest), which is how templates find the renditions:
+
+    {% load auction_images %}
+    {% picture auction.image "thumb" alt=auction.title class="w-full" %}
+
+Until the digest is set, the tags fall back to the original.
+`manage.py build_image_derivatives` builds renditions for existing uploads.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# name -> (bounding box, crop to fill it)
+RENDITIONS = {
+    "thumb": ((640, 640), False),
+    "medium": ((1280, 1280), False),
+    "avatar": ((160, 160), True),
+}
+# model -> (image field, its renditions); the digest goes in <field>_digest
+FIELDS = {
+    "auctions.Auction": ("image", ("thumb", "medium")),
+    "auctions.UserProfile": ("avatar", ("avatar",)),
+}
+# Every column that can hold an upload, repointed when it turns out to be a duplicate
+REFERENCES = [
+    ("auctions.Auction", "image"),
+    ("auctions.UserProfile", "avatar"),
+    ("auctions.Vendue", "attachment"),
+]
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def file_digest(f):
+    f.seek(0)
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: f.read(1 << 16), b""):
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+def original_name(digest, name):
+    return f"originals/{digest[:2]}/{digest}{os.path.splitext(name)[1].lower()}"
+
+
+def derivative_name(digest, rendition, fmt):
+    return f"derived/{digest[:2]}/{digest}/{rendition}.{EXTENSIONS[fmt]}"
+
+
+def url(file, rendition, fmt="jpeg"):
+    """URL of a rendition of an image field's file, or of the original until it is built."""
+    digest = getattr(file.instance, f"{file.field.name}_digest", "")
+    if not digest:
+        return file.url
+    return file.storage.url(derivative_name(digest, rendition, fmt))
+
+
+def _flatten(image):
+    """RGB for JPEG: transparent areas become white."""
+    if image.mode == "RGB":
+        return image
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+    return background
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        _flatten(image).save(buffer, "JPEG", quality=settings.IMAGE_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=settings.IMAGE_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def render(f, renditions, formats=FORMATS):
+    """
+    {(rendition, format): encoded bytes} for an image file. The image is
+    decoded once, at the smallest JPEG scale still larger than the biggest
+    rendition, and each fitted rendition is resized from the previous one.
+    """
+    f.seek(0)
+    with Image.open(f) as image:
+        largest = max((RENDITIONS[name][0] for name in renditions), key=lambda box: box[0] * box[1])
+        # JPEG only: decodes straight to 1/2, 1/4 or 1/8 scale, by far the cheapest resize
+        image.draft("RGB", largest)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    out, source = {}, image
+    for name in sorted(renditions, key=lambda n: -RENDITIONS[n][0][0] * RENDITIONS[n][0][1]):
+        box, crop = RENDITIONS[name]
+        if crop:
+            resized = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+        else:
+            resized = source.copy()
+            resized.thumbnail(box, Image.Resampling.LANCZOS)
+            source = resized
+        for fmt in formats:
+            out[name, fmt] = _encode(resized, fmt)
+    return out
+
+
+def build(label, pk):
+    """
+    Dedupes and renders the image of one row; returns its digest, or None if
+    the row has no image. Rows still pointing at the upload (including the
+    Vendue an auction was made from) are repointed in one transaction, and
+    the duplicate file is deleted afterwards, by the build that repointed
+    them: another build of the same upload may still be reading it.
+    """
+    model = apps.get_model(label)
+    field_name, renditions = FIELDS[label]
+    name = model.objects.filter(pk=pk).values_list(field_name, flat=True).first()
+    if not name:
+        return None
+    storage = model._meta.get_field(field_name).storage
+
+    with storage.open(name, "rb") as f:
+        digest = file_digest(f)
+        original = original_name(digest, name)
+        if original != name and not storage.exists(original):
+            f.seek(0)
+            original = storage.save(original, File(f))
+        missing = [
+            (rendition, fmt) for rendition in renditions for fmt in FORMATS
+            if not storage.exists(derivative_name(digest, rendition, fmt))
+        ]
+        if missing:
+            for (rendition, fmt), data in render(f, {r for r, _ in missing}).items():
+                if (rendition, fmt) in missing:
+                    storage.save(derivative_name(digest, rendition, fmt), ContentFile(data))
+
+    repointed = 0
+    with transaction.atomic():
+        for ref_label, ref_field in REFERENCES:
+            ref_model = apps.get_model(ref_label)
+            changes = {ref_field: original}
+            if FIELDS.get(ref_label, (None,))[0] == ref_field:
+                changes[f"{ref_field}_digest"] = digest
+            if ref_label == "auctions.Auction":
+                # Cached cards are keyed on the version, see auctions/cache.py
+                changes["version"] = F("version") + 1
+            repointed += ref_model.objects.filter(**{ref_field: name}).update(**changes)
+    if repointed and original != name:
+        storage.delete(name)
+    return digest
+
+
+def _run(label, pk):
+    try:
+        return build(label, pk)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.exception("Could not build image renditions for %s %s", label, pk)
+        return None
+
+
+def _in_thread(label, pk):
+    try:
+        return _run(label, pk)
+    finally:
+        close_old_connections()
+
+
+_lock = threading.Lock()
+_executor = None
+
+
+def submit(label, pk):
+    """Builds on the image threads, or right away when IMAGE_WORKERS is 0."""
+    global _executor
+    if not settings.IMAGE_WORKERS:
+        return _run(label, pk)
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="images")
+    return _executor.submit(_in_thread, label, pk)
+
+
+def build_later(instance):
+    """Builds the renditions of the instance's image once the current transaction commits."""
+    label, pk = instance._meta.label, instance.pk
+    transaction.on_commit(lambda: submit(label, pk))
@@ -0,0 +1,383 @@
+# auctions/layers.py
+"""
+A channel layer for running several ASGI worker processes on one host without
+Redis. Messages and group memberships live in a small SQLite database in WAL
+mode that every worker opens; each worker polls it for the messages addressed
+to its own process-specific channels.
+
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "auctions.layers.SQLiteChannelLayer",
+            "CONFIG": {"path": BASE_DIR / "channels.sqlite3"},
+        }
+    }
+
+Messages must be JSON-serializable (everything this project sends is).
+"""
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import string
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+
+from .sqlite import is_busy
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    process TEXT,
+    expires REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id);
+CREATE INDEX IF NOT EXISTS messages_process ON messages (process, id);
+CREATE TABLE IF NOT EXISTS groups (
+    group_name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    joined REAL NOT NULL,
+    PRIMARY KEY (group_name, channel)
+);
+CREATE INDEX IF NOT EXISTS groups_channel ON groups (channel);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer backed by a SQLite file shared by the processes of one host.
+
+    Each channel holds at most `capacity` unexpired messages (ChannelFull on
+    send, silently skipped on group_send, as with the other layers). Messages
+    expire after `expiry` seconds and a channel whose message expired undelivered
+    is dropped from its groups; memberships themselves expire after
+    `group_expiry` seconds.
+
+    Messages polled for this process wait in a queue per channel, which holds
+    at most `capacity` of them too (more are dropped). A queue goes when its
+    channel leaves its last group, and when it has held messages for `expiry`
+    seconds with no receive() waiting on it: the channel is then dropped from
+    its groups, as a channel whose message expired in the database would be.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        path=None,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        poll_interval=0.002,
+        max_poll_interval=0.05,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = str(path or settings.BASE_DIR / "channels.sqlite3")
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.client_prefix = "".join(random.choice(string.ascii_letters) for _ in range(12))
+
+        # All SQLite work happens on this one thread, with one connection.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-channel-layer")
+        self._conn = None
+        self._last_cleanup = 0.0
+        self._processes = set()
+        # Local channel -> queue of polled messages, its groups, receive() calls waiting on it
+        self._local = {}
+        self._members = {}
+        self._waiting = Counter()
+        # Local channel -> when it was first seen holding messages nobody waited for
+        self._unwatched = {}
+        self._last_expiry = 0.0
+        self._poller = None
+
+    # Blocking side (runs on the executor thread)
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, fn, *args):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db, *args)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def _insert(self, db, channels, body, counts):
+        now = time.time()
+        rows, full = [], []
+        for channel in channels:
+            if counts.get(channel, 0) >= self.get_capacity(channel):
+                full.append(channel)
+            else:
+                process = self.non_local_name(channel) if "!" in channel else None
+                rows.append((channel, process, now + self.expiry, body))
+        db.executemany("INSERT INTO messages (channel, process, expires, body) VALUES (?, ?, ?, ?)", rows)
+        return full
+
+    def _send(self, db, channel, body):
+        (count,) = db.execute(
+            "SELECT COUNT(*) FROM messages WHERE channel = ? AND expires > ?", (channel, time.time())
+        ).fetchone()
+        return self._insert(db, [channel], body, {channel: count})
+
+    def _group_send(self, db, group, body):
+        now = time.time()
+        channels = [
+            row[0]
+            for row in db.execute(
+                "SELECT channel FROM groups WHERE group_name = ? AND joined > ?", (group, now - self.group_expiry)
+            )
+        ]
+        counts = dict(db.execute(
+            "SELECT m.channel, COUNT(*) FROM messages m JOIN groups g ON g.channel = m.channel "
+            "WHERE g.group_name = ? AND m.expires > ? GROUP BY m.channel",
+            (group, now),
+        ))
+        return self._insert(db, channels, body, counts)
+
+    def _drain_local(self, processes):
+        """
+        Removes and returns every pending message for this process's channels.
+        Checks with a plain read first, so an idle poll never takes the write lock.
+        """
+        db = self._db()
+        if time.time() - self._last_cleanup >= 1.0:
+            self._write(self._cleanup)
+        marks = ",".join("?" * len(processes))
+        if not db.execute(f"SELECT 1 FROM messages WHERE process IN ({marks}) LIMIT 1", processes).fetchone():
+            return []
+        return self._write(self._take_local, processes)
+
+    def _take_local(self, db, processes):
+        marks = ",".join("?" * len(processes))
+        rows = db.execute(
+            f"SELECT id, channel, body FROM messages WHERE process IN ({marks}) AND expires > ? ORDER BY id",
+            (*processes, time.time()),
+        ).fetchall()
+        if rows:
+            db.execute(f"DELETE FROM messages WHERE process IN ({marks}) AND id <= ?", (*processes, rows[-1][0]))
+        return [(channel, body) for _, channel, body in rows]
+
+    def _take_one(self, db, channel):
+        row = db.execute(
+            "SELECT id, body FROM messages WHERE channel = ? AND expires > ? ORDER BY id LIMIT 1",
+            (channel, time.time()),
+        ).fetchone()
+        if row:
+            db.execute("DELETE FROM messages WHERE id = ?", (row[0],))
+            return row[1]
+        return None
+
+    def _leave_groups(self, db, channels):
+        db.executemany("DELETE FROM groups WHERE channel = ?", [(channel,) for channel in channels])
+
+    def _cleanup(self, db):
+        now = time.time()
+        self._last_cleanup = now
+        db.execute(
+            "DELETE FROM groups WHERE channel IN (SELECT channel FROM messages WHERE expires <= ?)", (now,)
+        )
+        db.execute("DELETE FROM messages WHERE expires <= ?", (now,))
+        db.execute("DELETE FROM groups WHERE joined <= ?", (now - self.group_expiry,))
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        if await self._run(self._write, self._send, channel, json.dumps(message)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if "!" in channel:
+            self._processes.add(self.non_local_name(channel))
+            self._ensure_poller()
+            queue = self._queue(channel)
+            self._waiting[channel] += 1
+            try:
+                return await queue.get()
+            finally:
+                self._waiting[channel] -= 1
+                if not self._waiting[channel]:
+                    del self._waiting[channel]
+                    if queue.empty() and self._local.get(channel) is queue:
+                        del self._local[channel]
+
+        # General channels are rare here; poll the table directly.
+        interval = self.poll_interval
+        while True:
+            body = await self._run(self._write, self._take_one, channel)
+            if body is not None:
+                return json.loads(body)
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    async def new_channel(self, prefix="specific."):
+        process = f"{prefix}{self.client_prefix}!"
+        self._processes.add(process)
+        return process + "".join(random.choice(string.ascii_letters) for _ in range(12))
+
+    def _queue(self, channel):
+        queue = self._local.get(channel)
+        if queue is None:
+            queue = self._local[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _drop_local(self, channel):
+        """Forgets a local channel's queued messages, unless a receive() is waiting on it."""
+        self._unwatched.pop(channel, None)
+        if not self._waiting[channel]:
+            self._local.pop(channel, None)
+
+    def _expire_local(self):
+        """Drops the queues nobody has waited on for `expiry` seconds; returns their channels."""
+        now = time.monotonic()
+        if now - self._last_expiry < min(1.0, self.expiry):
+            return []
+        self._last_expiry = now
+        expired = []
+        for channel, queue in list(self._local.items()):
+            if self._waiting[channel] or queue.empty():
+                self._unwatched.pop(channel, None)
+            elif now - self._unwatched.setdefault(channel, now) >= self.expiry:
+                expired.append(channel)
+                self._members.pop(channel, None)
+                self._drop_local(channel)
+        return expired
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        """
+        Moves this process's messages from the database into local queues.
+
+        Every socket of the process waits on those queues and nothing starts
+        the poller again while they do, so no error may end the loop: a failed
+        poll is logged (a locked database only counts as busy) and the next
+        one waits longer.
+        """
+        interval = self.poll_interval
+        while True:
+            try:
+                expired = self._expire_local()
+                if expired:
+                    await self._run(self._write, self._leave_groups, expired)
+                batch = await self._run(self._drain_local, sorted(self._processes))
+            except Exception as exc:
+                if not is_busy(exc):
+                    logger.exception("Polling the channel layer at %s failed", self.path)
+                interval = min(interval * 2, self.max_poll_interval)
+                # Jittered, so the workers that collided do not all come back at once
+                await asyncio.sleep(random.uniform(interval / 2, interval))
+                continue
+            for channel, body in batch:
+                try:
+                    message = json.loads(body)
+                except ValueError:
+                    logger.warning("Dropped a message for %s that is not JSON", channel)
+                    continue
+                try:
+                    self._queue(channel).put_nowait(message)
+                except asyncio.QueueFull:
+                    # As for a full channel in the database, the message is dropped
+                    logger.debug("Dropped a message for %s: its queue is full", channel)
+            # Poll fast while traffic flows, back off when idle.
+            interval = self.poll_interval if batch else min(interval * 2, self.max_poll_interval)
+            await asyncio.sleep(interval)
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        if "!" in channel:
+            self._members.setdefault(channel, set()).add(group)
+        await self._run(
+            self._write,
+            lambda db: db.execute(
+                "INSERT OR REPLACE INTO groups (group_name, channel, joined) VALUES (?, ?, ?)",
+                (group, channel, time.time()),
+            ),
+        )
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        groups = self._members.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self._members[channel]
+                self._drop_local(channel)
+        await self._run(
+            self._write,
+            lambda db: db.execute("DELETE FROM groups WHERE group_name = ? AND channel = ?", (group, channel)),
+        )
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        # Serialized once, whatever the size of the group.
+        await self._run(self._write, self._group_send, group, json.dumps(message))
+
+    async def group_send_many(self, messages):
+        """group_send for several (group, message) pairs in one write transaction."""
+        bodies = []
+        for group, message in messages:
+            assert isinstance(message, dict), "Message is not a dict"
+            self.require_valid_group_name(group)
+            bodies.append((group, json.dumps(message)))
+
+        def send_all(db):
+            for group, body in bodies:
+                self._group_send(db, group, body)
+
+        await self._run(self._write, send_all)
+
+    # Flush extension
+
+    async def flush(self):
+        def delete_all(db):
+            db.execute("DELETE FROM messages")
+            db.execute("DELETE FROM groups")
+
+        await self._run(self._write, delete_all)
+        self._local = {}
+        self._members = {}
+        self._unwatched = {}
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
@@ -0,0 +1,309 @@
+# auctions/livebook.py
+"""
+Opt-in in-memory book for live auctions (LIVE_BOOK).
+
+The process keeps each auction's price, leader and last few bids in memory and
+decides bids against that state under a lock, without a database round trip.
+Accepted bids are written behind: a flusher thread persists each auction's
+waiting bids in one transaction as soon as LIVE_BOOK_FLUSH_BIDS are waiting,
+and at the latest LIVE_BOOK_FLUSH_MS after they were accepted. A crash can
+therefore lose that much; on restart the books are rebuilt from Auction and Bid,
+which remain the source of truth.
+
+Only one process may take bids for a given auction in this mode (route an
+auction's sockets and form posts to one worker). Should the row change under a
+book anyway, its flush finds the auction no longer matching what it last wrote;
+the waiting bids are then replayed through bidding.place_bid and the book is
+reloaded. Bids that no longer stand had already been acknowledged, so their
+bidders get an alert and the auction's sockets a "bids_retracted" frame with
+the price as the database has it.
+
+Bids in the last LIVE_BOOK_FLUSH_MS of an auction skip the book and go
+straight to the database, after whatever the book still holds, so the closer
+never closes an auction with bids still in memory. The book stays loaded
+until the auction has ended; the flusher then drops it.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from . import bidding, counters, eventlog, resume
+from .bidding import ACCEPTED, CLOSED, INVALID_AMOUNT, NOT_FOUND, OWN_AUCTION, TOO_LOW, BidResult
+from .broadcast import broadcast_event, send_from_thread
+from .notifications import notify
+from .models import Auction, Bid, Notification, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+class _Conflict(Exception):
+    pass
+
+
+class Book:
+    """The live state of one auction."""
+
+    def __init__(self, auction, recent):
+        self.auction_id = auction.pk
+        self.owner_id = auction.owner_id
+        self.title = auction.title
+        self.ends_at = auction.ends_at
+        self.is_active = auction.is_active
+        self.price = auction.current_price
+        self.count = auction.bid_count
+        self.leader_id = auction.leading_bidder_id
+        self.recent = deque(recent, maxlen=settings.LIVE_BOOK_TRAIL)
+        # Accepted, not yet written: (bid, bidder username, leader it displaced)
+        self.pending = []
+        # (current_price, bid_count) of the row as last written; flushes are conditional on it
+        self.stored = (auction.current_price, auction.bid_count)
+        self.lock = threading.Lock()
+        self.flushing = threading.Lock()
+        # Set once the book is dropped; it then sends every bid to the database
+        self.retired = False
+
+    def offer(self, bidder, amount, now):
+        """Decides a bid in memory. Returns None when it has to go to the database instead."""
+        with self.lock:
+            if self.retired:
+                return None
+            if self.owner_id == bidder.pk:
+                return BidResult(OWN_AUCTION, amount, self.price)
+            if not self.is_active or self.ends_at <= now:
+                return BidResult(CLOSED, amount, self.price)
+            # The database decides these, so the book's price may be behind from here on
+            if (self.ends_at - now).total_seconds() * 1000 < settings.LIVE_BOOK_FLUSH_MS:
+                return None
+            if amount <= self.price:
+                return BidResult(TOO_LOW, amount, self.price)
+
+            # created_at is the acceptance time; the flush's bulk_create restamps it
+            # (auto_now_add), at most a flush interval later.
+            bid = Bid(auction_id=self.auction_id, bidder_id=bidder.pk, amount=amount, created_at=now)
+            self.pending.append((bid, bidder.username, self.leader_id))
+            self.recent.append(bid)
+            self.price, self.count, self.leader_id = amount, self.count + 1, bidder.pk
+            return BidResult(ACCEPTED, amount, amount, bid, seq=self.count)
+
+
+class Books:
+    """The books of this process, loaded on first use and flushed by one background thread."""
+
+    def __init__(self):
+        self._books = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def peek(self, auction_id):
+        return self._books.get(auction_id)
+
+    def get(self, auction_id):
+        """The book for auction_id, loading it from the database on first use (None if it doesn't exist)."""
+        book = self._books.get(auction_id)
+        if book is not None:
+            return book
+        auction = (
+            Auction.objects.filter(pk=auction_id)
+            .only("owner_id", "title", "ends_at", "is_active", "current_price", "bid_count", "leading_bidder_id")
+            .first()
+        )
+        if auction is None:
+            return None
+        recent = Bid.objects.filter(auction_id=auction_id).order_by("-amount")[:settings.LIVE_BOOK_TRAIL]
+        with self._lock:
+            book = self._books.setdefault(auction_id, Book(auction, reversed(list(recent))))
+            self._start()
+        return book
+
+    def retire(self, auction_id):
+        """Writes out and drops the book; later bids go to the database until it is reloaded."""
+        book = self._books.get(auction_id)
+        if book is None:
+            return
+        with book.lock:
+            book.retired = True
+        with self._lock:
+            self._books.pop(auction_id, None)
+        self._flush(book)
+
+    def evict_ended(self, now=None):
+        """Retires the books of auctions that have ended, closer or not in this process."""
+        now = now or timezone.now()
+        for auction_id, book in list(self._books.items()):
+            if book.ends_at <= now:
+                self.retire(auction_id)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="live-book-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def notify(self, book):
+        if len(book.pending) >= settings.LIVE_BOOK_FLUSH_BIDS:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.LIVE_BOOK_FLUSH_MS / 1000)
+            self._wake.clear()
+            try:
+                if self.flush():
+                    close_old_connections()
+                self.evict_ended()
+            except Exception:
+                logger.exception("Live book flush failed")
+                close_old_connections()
+
+    def flush(self, auction_ids=None):
+        """
+        Writes the waiting bids of the given auctions (default: all) to the
+        database. Returns how many books had bids to write.
+        """
+        ids = list(self._books) if auction_ids is None else auction_ids
+        written = 0
+        for auction_id in ids:
+            book = self._books.get(auction_id)
+            if book is not None and book.pending:
+                self._flush(book)
+                written += 1
+        return written
+
+    def _flush(self, book):
+        with book.flushing:
+            with book.lock:
+                batch, book.pending = book.pending, []
+                stored_price, stored_count = book.stored
+            if not batch:
+                return
+            last = batch[-1][0]
+            try:
+                with transaction.atomic():
+                    claimed = Auction.objects.filter(
+                        pk=book.auction_id, is_active=True, current_price=stored_price, bid_count=stored_count
+                    ).update(
+                        current_price=last.amount,
+                        bid_count=models.F("bid_count") + len(batch),
+                        leading_bidder_id=last.bidder_id,
+                        version=models.F("version") + 1,
+                    )
+                    if not claimed:
+                        raise _Conflict
+                    Bid.objects.bulk_create([bid for bid, _, _ in batch])
+
+                    counters.add("tenders_placed", Counter(bid.bidder_id for bid, _, _ in batch))
+
+                    notes = []
+                    for bid, username, previous_leader_id in batch:
+                        bidder = UserProfile(pk=bid.bidder_id, username=username)
+                        notes += bidding.bid_notifications(
+                            book.owner_id, book.title, bidder, bid.amount, previous_leader_id
+                        )
+                    notify(notes)
+            except _Conflict:
+                self._replay(book, batch)
+                return
+            except Exception:
+                # Keep the bids for the next flush rather than dropping them
+                with book.lock:
+                    book.pending[:0] = batch
+                raise
+            with book.lock:
+                book.stored = (last.amount, stored_count + len(batch))
+            for bid, _, _ in batch:
+                eventlog.record_after_commit(
+                    eventlog.BID_PLACED, book.auction_id, bid=bid.pk, bidder=bid.bidder_id, amount=str(bid.amount)
+                )
+
+    def _replay(self, book, batch):
+        # The row changed behind the book: let the database decide each bid again.
+        with book.lock:
+            book.retired = True
+            batch += book.pending
+            book.pending = []
+        with self._lock:
+            self._books.pop(book.auction_id, None)
+        lost = []
+        for bid, username, _ in batch:
+            bidder = UserProfile(pk=bid.bidder_id, username=username)
+            result = bidding.place_bid(book.auction_id, bidder, bid.amount)
+            if not result.accepted:
+                lost.append((bid, username, result))
+        logger.warning(
+            "Auction %s changed outside its live book; replayed %d bids, %d no longer accepted",
+            book.auction_id, len(batch), len(lost),
+        )
+        if lost:
+            self._retract(book, lost)
+
+    def _retract(self, book, lost):
+        """Tells the bidders, and everyone watching the auction, that acknowledged bids did not stand."""
+        with transaction.atomic():
+            notify([
+                Notification(
+                    user_id=bid.bidder_id,
+                    message=f"Your bid of ₹{bid.amount} on {book.title} could not be kept: {result.message}",
+                )
+                for bid, _, result in lost
+            ])
+        price, count, leader = (
+            Auction.objects.filter(pk=book.auction_id)
+            .values_list("current_price", "bid_count", "leading_bidder__username")
+            .get()
+        )
+        # The buffered frames carry the book's seqs, which the replay renumbered
+        resume.forget(book.auction_id)
+        frame = {
+            "type": "bids_retracted",
+            "bids": [
+                {"bidder": username, "amount": str(bid.amount), "reason": result.reason}
+                for bid, username, result in lost
+            ],
+            "amount": str(price),
+            "bidder": leader,
+            "seq": count,
+        }
+        send_from_thread([(f"auction_{book.auction_id}", broadcast_event(frame))])
+
+
+books = Books()
+
+
+def try_place_bid(auction_id, bidder, raw_amount):
+    """
+    Decides the bid purely in memory, or returns None if that needs the database
+    (book not loaded yet, or the auction is about to end). Safe on the event loop.
+    """
+    amount = bidding.parse_amount(raw_amount)
+    if amount is None:
+        return BidResult(INVALID_AMOUNT)
+    book = books.peek(auction_id)
+    if book is None:
+        return None
+    result = book.offer(bidder, amount, timezone.now())
+    if result is not None and result.accepted:
+        books.notify(book)
+    return result
+
+
+def place_bid(auction_id, bidder, raw_amount):
+    """bidding.place_bid through the live book; same arguments and BidResult."""
+    result = try_place_bid(auction_id, bidder, raw_amount)
+    if result is not None:
+        return result
+    book = books.get(auction_id)
+    if book is None:
+        return BidResult(NOT_FOUND, bidding.parse_amount(raw_amount))
+    result = try_place_bid(auction_id, bidder, raw_amount)
+    if result is not None:
+        return result
+
+    # Close to the end: write straight through, after whatever the book still holds.
+    books.flush([auction_id])
+    return bidding.place_bid(auction_id, bidder, raw_amount)
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from PIL import Image, UnidentifiedImageError
+
+from auctions import images
+
+
+class Command(BaseCommand):
+    help = "Dedupes existing auction images and avatars and builds their resized renditions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Also go over images that already have a digest, rebuilding missing renditions.")
+        parser.add_argument("--workers", type=int, default=4, help="Images processed at a time.")
+
+    def build(self, label, pk):
+        try:
+            return images.build(label, pk) is not None
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+            self.stderr.write(f"{label} {pk}: {exc}")
+            return False
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        jobs = []
+        for label, (field_name, _) in images.FIELDS.items():
+            qs = apps.get_model(label).objects.exclude(**{field_name: ""}).exclude(**{f"{field_name}__isnull": True})
+            if not options["all"]:
+                qs = qs.filter(**{f"{field_name}_digest": ""})
+            jobs += [(label, pk) for pk in qs.values_list("pk", flat=True).iterator()]
+
+        with ThreadPoolExecutor(max_workers=max(options["workers"], 1), thread_name_prefix="images") as pool:
+            built = sum(pool.map(lambda job: self.build(*job), jobs))
+        self.stdout.write(self.style.SUCCESS(f"Built renditions for {built} of {len(jobs)} images."))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from auctions.models import Auction
+from auctions.utils import compute_bid_stats
+
+
+class Command(BaseCommand):
+    help = "Compares the denormalized bid columns on Auction with the Bid table and optionally repairs drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="Rewrite drifted auctions from the Bid table.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Auctions checked per query.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = drifted = 0
+        last_pk = 0
+
+        while True:
+            ids = list(
+                Auction.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+
+            expected = compute_bid_stats(Auction.objects.filter(pk__in=ids))
+            stored = Auction.objects.filter(pk__in=ids).values_list(
+                "pk", "current_price", "bid_count", "leading_bidder_id"
+            )
+            for pk, price, count, leader_id in stored:
+                checked += 1
+                if (price, count, leader_id) == expected[pk]:
+                    continue
+                drifted += 1
+                want_price, want_count, want_leader = expected[pk]
+                self.stdout.write(
+                    f"auction {pk}: stored ({price}, {count}, {leader_id}) "
+                    f"!= expected ({want_price}, {want_count}, {want_leader})"
+                )
+                if options["repair"]:
+                    Auction.objects.filter(pk=pk).update(
+                        current_price=want_price,
+                        bid_count=want_count,
+                        leading_bidder_id=want_leader,
+                        version=F("version") + 1,
+                    )
+
+        action = "repaired" if options["repair"] else "found"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} auctions, {action} {drifted} with drift."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import exports
+
+
+class Command(BaseCommand):
+    help = "Streams the bid history or the closed-auction results as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(exports.COLUMNS))
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--since", help="Date or datetime (ISO 8601); bids placed or auctions ended from then.")
+        parser.add_argument("--until", help="Date or datetime (ISO 8601); a bare date includes that whole day.")
+        parser.add_argument("--auction", type=int, action="append", help="Only this auction (repeatable).")
+        parser.add_argument("--category", help="Only auctions of this category.")
+        parser.add_argument("--output", help="File to write (default: standard output).")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched and written per batch.")
+
+    def handle(self, *args, **options):
+        try:
+            since = exports.parse_moment(options["since"])
+            until = exports.parse_moment(options["until"], end_of_day=True)
+        except ValueError as exc:
+            raise CommandError(exc)
+        qs = exports.queryset(options["kind"], since, until, options["auction"], options["category"])
+        chunks = exports.stream(options["kind"], options["format"], qs, options["chunk_size"])
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as fh:
+                fh.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions import counters
+
+
+class Command(BaseCommand):
+    help = "Folds the pending counter deltas into the UserProfile counters, once or every few seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, help="Keep folding, this many seconds apart.")
+        parser.add_argument("--batch-size", type=int, help="Deltas folded per transaction.")
+
+    def handle(self, *args, **options):
+        while True:
+            folded = counters.fold(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Folded {folded} counter deltas."))
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,51 @@
+import glob
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from auctions import perf
+
+
+class Command(BaseCommand):
+    help = "Slowest endpoints by p95 wall time, merged from the profiling snapshots of every process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Endpoints shown.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+        parser.add_argument("--reset", action="store_true", help="Delete the snapshots after reporting.")
+
+    def handle(self, *args, **options):
+        paths = glob.glob(os.path.join(settings.PERF_SNAPSHOT_DIR, "*.json"))
+        snapshots = []
+        for path in paths:
+            try:
+                with open(path) as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        rows = perf.report(perf.merge(snapshots))[:options["limit"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+        elif not rows:
+            self.stdout.write(
+                f"No samples in {settings.PERF_SNAPSHOT_DIR}; is PERF_INSTRUMENTATION=True on the server?"
+            )
+        else:
+            self.stdout.write(f"{len(snapshots)} process snapshot(s)")
+            for row in rows:
+                wall, queries, sql = row["wall_ms"], row["queries"], row["sql_ms"]
+                self.stdout.write(
+                    f"{row['endpoint']:<32} {row['requests']:>6} req  "
+                    f"wall p50 {wall['p50']:.1f} / p95 {wall['p95']:.1f} / p99 {wall['p99']:.1f} ms  "
+                    f"queries p50 {queries['p50']:.0f} / max {queries['max']:.0f}  "
+                    f"sql p95 {sql['p95']:.1f} ms"
+                )
+                for dup in row["duplicate_queries"]:
+                    self.stdout.write(self.style.WARNING(f"    repeated in {dup['requests']} req: {dup['sql']}"))
+
+        if options["reset"]:
+            for path in paths:
+                os.remove(path)
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auctions.notifications import prune
+
+
+class Command(BaseCommand):
+    help = "Deletes read notifications older than the retention period, a batch per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+            help="Keep read notifications younger than this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Notifications deleted per transaction.")
+        parser.add_argument("--archive", help="Append the deleted notifications to this file as JSON lines.")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        if options["archive"]:
+            with open(options["archive"], "a") as archive:
+                deleted = prune(before, options["batch_size"], archive)
+        else:
+            deleted = prune(before, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} read notifications from before {before:%Y-%m-%d %H:%M}."
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from auctions import search
+
+
+class Command(BaseCommand):
+    help = "Recreates missing search index triggers and rebuilds the full-text index from the auction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--optimize", action="store_true", help="Also merge the index into a single b-tree.")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database alias to rebuild.")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError("The full-text index is SQLite only; other databases search with LIKE.")
+        if search.install(connection):
+            self.stdout.write("Recreated missing index objects.")
+        search.rebuild(connection, optimize=options["optimize"])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {search.TABLE}")
+            (count,) = cursor.fetchone()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} auctions."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from auctions.notifications import recount
+
+
+class Command(BaseCommand):
+    help = "Recomputes every user's unread notification counter from the notification rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", help="Only this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        updated = recount(options["user"])
+        self.stdout.write(self.style.SUCCESS(f"Recounted unread notifications for {updated} users."))
@@ -0,0 +1,106 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from auctions import counters, eventlog
+from auctions.models import Auction, UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the denormalized auction columns and the UserProfile counters from the event log "
+        "(latest snapshot plus the events after it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what differs.")
+        parser.add_argument("--snapshot", action="store_true", help="Also save the folded state as a snapshot.")
+        parser.add_argument("--from-scratch", action="store_true", help="Ignore snapshots and fold the whole log.")
+        parser.add_argument(
+            "--bootstrap",
+            action="store_true",
+            help="Snapshot the current database at the end of the log, for a log switched on for an existing "
+            "site. Run it while no bids are coming in.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows compared per query.")
+
+    def handle(self, *args, **options):
+        log = eventlog.get_log()
+        if log is None:
+            raise CommandError("The event log is off (EVENT_LOG).")
+
+        if not options["dry_run"]:
+            # The counters are compared as stored, so nothing may be pending
+            counters.fold()
+
+        if options["bootstrap"]:
+            state = self.state_from_database()
+            state.offset = log.end()
+            self.stdout.write(self.style.SUCCESS(f"Wrote {log.save_snapshot(state)}"))
+            return
+
+        start = time.perf_counter()
+        state = log.fold(eventlog.State() if options["from_scratch"] else None)
+        folded = time.perf_counter() - start
+        self.stdout.write(
+            f"Folded up to offset {state.offset}: {len(state.auctions)} auctions, "
+            f"{len(state.users)} users in {folded:.2f}s"
+        )
+        if options["snapshot"]:
+            self.stdout.write(f"Wrote {log.save_snapshot(state)}")
+
+        auctions, users = self.apply(state, options["batch_size"], options["dry_run"])
+        action = "would rewrite" if options["dry_run"] else "rewrote"
+        self.stdout.write(self.style.SUCCESS(f"{action} {auctions} auctions and {users} users"))
+
+    def state_from_database(self):
+        state = eventlog.State()
+        for pk, owner_id, price, count, leader_id, active in Auction.objects.values_list(
+            "pk", "owner_id", "current_price", "bid_count", "leading_bidder_id", "is_active"
+        ).iterator():
+            state.auctions[pk] = [owner_id, price, count, leader_id, active]
+        for pk, tenders, won in UserProfile.objects.values_list("pk", "tenders_placed", "auctions_won").iterator():
+            state.users[pk] = [tenders, won]
+        return state
+
+    def apply(self, state, batch_size, dry_run):
+        auctions_changed = users_changed = 0
+
+        ids = sorted(state.auctions)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            stored = Auction.objects.filter(pk__in=chunk).values_list(
+                "pk", "current_price", "bid_count", "leading_bidder_id", "is_active"
+            )
+            for pk, *current in stored:
+                _, *wanted = state.auctions[pk]
+                if current == wanted:
+                    continue
+                auctions_changed += 1
+                self.stdout.write(f"auction {pk}: {tuple(current)} -> {tuple(wanted)}", style_func=self.style.WARNING)
+                if not dry_run:
+                    price, count, leader_id, active = wanted
+                    Auction.objects.filter(pk=pk).update(
+                        current_price=price,
+                        bid_count=count,
+                        leading_bidder_id=leader_id,
+                        is_active=active,
+                        version=F("version") + 1,
+                    )
+
+        ids = sorted(state.users)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            for pk, *current in UserProfile.objects.filter(pk__in=chunk).values_list(
+                "pk", "tenders_placed", "auctions_won"
+            ):
+                wanted = state.users[pk]
+                if current == wanted:
+                    continue
+                users_changed += 1
+                self.stdout.write(f"user {pk}: {tuple(current)} -> {tuple(wanted)}", style_func=self.style.WARNING)
+                if not dry_run:
+                    UserProfile.objects.filter(pk=pk).update(tenders_placed=wanted[0], auctions_won=wanted[1])
+
+        return auctions_changed, users_changed
@@ -0,0 +1,34 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from auctions.closer import AuctionCloser, closed_events, send_closed_events
+
+
+class Command(BaseCommand):
+    help = "Runs the auction closer in the foreground, closing auctions as they expire."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.AUCTION_CLOSER_BATCH_SIZE)
+        parser.add_argument(
+            "--refresh-interval",
+            type=float,
+            default=settings.AUCTION_CLOSER_REFRESH_SECONDS,
+            help="Seconds between rescans of the database for auctions created by other processes.",
+        )
+        parser.add_argument("--once", action="store_true", help="Close whatever is due now and exit.")
+
+    def handle(self, *args, **options):
+        closer = AuctionCloser(batch_size=options["batch_size"], refresh_interval=options["refresh_interval"])
+        if options["once"]:
+            closer.refresh()
+            closed = closer.run_once()
+            async_to_sync(send_closed_events)(closed_events(closed))
+            self.stdout.write(self.style.SUCCESS(f"Closed {len(closed)} auctions."))
+            return
+
+        self.stdout.write("Auction closer running. Press Ctrl+C to stop.")
+        try:
+            closer.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import replicas
+
+
+class Command(BaseCommand):
+    help = "Copies the primary SQLite database over the read replica, once or every few seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, help="Keep copying, this many seconds apart.")
+
+    def handle(self, *args, **options):
+        if replicas.REPLICA not in settings.DATABASES:
+            raise CommandError("No replica database is configured; set DB_REPLICA=True.")
+        source = settings.DATABASES["default"]["NAME"]
+        target = settings.DATABASES[replicas.REPLICA]["NAME"]
+        if str(source) == str(target):
+            raise CommandError("The replica is the primary database itself (a test mirror?).")
+        while True:
+            start = time.monotonic()
+            pages = replicas.sync(source, target)
+            self.stdout.write(self.style.SUCCESS(
+                f"Copied {pages} pages to {target} in {time.monotonic() - start:.2f}s."
+            ))
+            if not options["every"]:
+                return
+            time.sleep(max(options["every"] - (time.monotonic() - start), 0))
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_bid_stats(apps, schema_editor):
+    Auction = apps.get_model("auctions", "Auction")
+    Bid = apps.get_model("auctions", "Bid")
+
+    leader = Bid.objects.filter(auction=models.OuterRef("pk")).order_by("-amount", "id")
+    rows = Auction.objects.annotate(
+        top=models.Max("bids__amount"),
+        n=models.Count("bids"),
+        leader_id=models.Subquery(leader.values("bidder_id")[:1]),
+    ).values_list("pk", "base_price", "top", "n", "leader_id")
+
+    for pk, base_price, top, n, leader_id in list(rows):
+        Auction.objects.filter(pk=pk).update(
+            current_price=top if n else base_price,
+            bid_count=n,
+            leading_bidder_id=leader_id,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0003_remove_vendue_duration_hours_vendue_duration_minutes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="bid_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="current_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="leading_bidder",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="leading_auctions",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(backfill_bid_stats, migrations.RunPython.noop),
+    ]
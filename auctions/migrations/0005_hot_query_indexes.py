@@ -0,0 +1,39 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0004_auction_bid_stats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(
+                condition=models.Q(("is_active", True)), fields=["ends_at"], name="auction_active_ends_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["category", "base_price"],
+                name="auction_active_cat_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(fields=["auction", "-amount"], name="bid_auction_amount_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(fields=["bidder", "-created_at"], name="bid_bidder_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["user", "-created_at"], name="notification_user_created_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0005_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
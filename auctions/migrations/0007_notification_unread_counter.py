@@ -0,0 +1,42 @@
+# Generated by Django 4.2.26 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_notifications(apps, schema_editor):
+    Notification = apps.get_model("auctions", "Notification")
+    UserProfile = apps.get_model("auctions", "UserProfile")
+
+    unread = (
+        Notification.objects.filter(user=models.OuterRef("pk"), read=False)
+        .order_by()
+        .values("user")
+        .annotate(n=models.Count("pk"))
+        .values("n")
+    )
+    UserProfile.objects.update(unread_notifications=Coalesce(models.Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0006_auction_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="unread_notifications",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("read", True)),
+                fields=["created_at"],
+                name="notification_read_created_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_unread_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.26 on 2026-10-18 15:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from auctions import search
+
+    search.install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from auctions import search
+
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for name in search.TRIGGERS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {search.TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0007_notification_unread_counter"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.26 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auctions", "0008_auction_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="image_digest",
+            field=models.CharField(blank=True, default="", editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="avatar_digest",
+            field=models.CharField(blank=True, default="", editable=False, max_length=64),
+        ),
+    ]
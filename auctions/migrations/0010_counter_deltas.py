@@ -0,0 +1,40 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auctions", "0009_image_digests"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CounterDelta",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "field",
+                    models.CharField(
+                        choices=[
+                            ("vendues_created", "Vendues created"),
+                            ("tenders_placed", "Tenders placed"),
+                            ("auctions_won", "Auctions won"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("amount", models.IntegerField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="counter_deltas",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
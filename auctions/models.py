@@ -6,9 +6,13 @@ from django.utils import timezone
 
 class UserProfile(AbstractUser):
     avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)
+    # sha256 of the avatar once its renditions are built (auctions/images.py)
+    avatar_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
     vendues_created = models.PositiveIntegerField(default=0)
     tenders_placed = models.PositiveIntegerField(default=0)
     auctions_won = models.PositiveIntegerField(default=0)
+    # Unread Notification rows, kept in step by auctions/notifications.py
+    unread_notifications = models.PositiveIntegerField(default=0)
 
 class Auction(models.Model):
     CATEGORY_CHOICES = [
@@ -23,19 +27,80 @@ class Auction(models.Model):
     description = models.TextField()
     owner = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="auctions")
     image = models.ImageField(upload_to="auctions/", null=True, blank=True)
+    # sha256 of the image once its renditions are built (auctions/images.py)
+    image_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
     base_price = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     ends_at = models.DateTimeField()
     category = models.CharField(max_length=30, choices=CATEGORY_CHOICES, default="Other")
     is_active = models.BooleanField(default=True)
 
+    # Denormalized bid state, kept in step with the Bid table by every bid write
+    # path (see bidding.place_bid) so pages never have to sort the bids.
+    current_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    bid_count = models.PositiveIntegerField(default=0)
+    leading_bidder = models.ForeignKey(
+        UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name="leading_auctions"
+    )
+    # Bumped by every write that changes what the auction looks like (bids, closing,
+    # edits); cached fragments are keyed on it, see auctions/cache.py.
+    version = models.PositiveIntegerField(default=0)
+
+    BID_FIELDS = ["current_price", "bid_count", "leading_bidder"]
+
+    class Meta:
+        # Partial rather than (is_active, ...) composite indexes: Django renders
+        # is_active=True as a bare boolean term, which SQLite can match against an
+        # index condition but not use as an equality on a leading index column.
+        indexes = [
+            # listing and the closer: active auctions by end time
+            models.Index(fields=["ends_at"], condition=models.Q(is_active=True), name="auction_active_ends_idx"),
+            # listing filtered by category and price range
+            models.Index(
+                fields=["category", "base_price"],
+                condition=models.Q(is_active=True),
+                name="auction_active_cat_price_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            # Until the first bid arrives the asking price is the base price.
+            if not self.bid_count:
+                self.current_price = self.base_price
+            return super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not update_fields:
+            return super().save(*args, **kwargs)
+        unloaded = ["version"]
+        if update_fields is None and not args:
+            # The bid columns belong to the bid write paths: a row loaded before
+            # a bid was committed must not write the old values back over it.
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.BID_FIELDS
+            ] + ["current_price"]
+            self.current_price = models.Case(
+                models.When(bid_count=0, then=models.Value(self.base_price)),
+                default=models.F("current_price"),
+                output_field=self._meta.get_field("current_price"),
+            )
+            unloaded.append("current_price")
+        elif update_fields is not None and "version" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "version"]
+        self.version = models.F("version") + 1
+        super().save(*args, **kwargs)
+        # Left deferred rather than read back: the first access loads what the UPDATE wrote
+        for name in unloaded:
+            del self.__dict__[name]
+
     @property
     def current_bid(self):
-        latest = self.bids.order_by("-amount").first()
-        return latest.amount if latest else self.base_price
+        return self.current_price
 
     @property
     def time_remaining_seconds(self):
@@ -49,6 +114,14 @@ class Bid(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # highest bid per auction
+            models.Index(fields=["auction", "-amount"], name="bid_auction_amount_idx"),
+            # a user's own bids, newest first
+            models.Index(fields=["bidder", "-created_at"], name="bid_bidder_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.bidder.username} - {self.amount}"
 
@@ -59,6 +132,30 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # a user's alerts, newest first
+            models.Index(fields=["user", "-created_at"], name="notification_user_created_idx"),
+            # the retention job: read alerts by age
+            models.Index(fields=["created_at"], condition=models.Q(read=True), name="notification_read_created_idx"),
+        ]
+
+
+class CounterDelta(models.Model):
+    """
+    A pending increment of one of a user's activity counters, folded into the
+    UserProfile column later (auctions/counters.py). Append-only until folded.
+    """
+    FIELD_CHOICES = [
+        ("vendues_created", "Vendues created"),
+        ("tenders_placed", "Tenders placed"),
+        ("auctions_won", "Auctions won"),
+    ]
+
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="counter_deltas")
+    field = models.CharField(max_length=30, choices=FIELD_CHOICES)
+    amount = models.IntegerField()
+
 
 class Vendue(models.Model):
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -0,0 +1,139 @@
+# auctions/notifications.py
+"""
+Alerts and the per-user unread counter.
+
+UserProfile.unread_notifications counts the user's unread Notification rows,
+so the badge in base.html needs no COUNT query. Every path that changes the
+unread rows goes through here: notify() inserts alerts and bumps the counters
+in the caller's transaction, mark_read() flips rows with one UPDATE and takes
+off exactly as many as it flipped, and prune() only ever deletes read rows,
+which leaves the counters alone. Anything else that deletes unread rows (the
+admin's delete views do) calls recount() for the users it touched afterwards;
+``manage.py recount_unread`` runs it for everyone, to repair counters that
+drifted anyway.
+
+New alerts are also pushed to the user's open NotificationConsumer sockets
+(group ``user_<id>``) once the transaction that created them commits: one
+frame per user per transaction, however many alerts it holds, and all the
+frames of a transaction handed to the channel layer in one go, so closing an
+auction with hundreds of losers is one batch rather than hundreds of sends.
+"""
+import json
+from collections import Counter, defaultdict
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+
+from .broadcast import broadcast_event, send_from_thread
+from .models import Notification, UserProfile
+from .sqlite import retry_busy
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def notify(notes, batch_size=None):
+    """
+    Inserts the unsaved Notifications and bumps their users' unread counters,
+    one UPDATE per distinct number of new alerts. Call it inside the
+    transaction that caused the alerts.
+    """
+    if not notes:
+        return
+    Notification.objects.bulk_create(notes, batch_size=batch_size)
+    by_count = defaultdict(list)
+    for user_id, n in Counter(note.user_id for note in notes).items():
+        by_count[n].append(user_id)
+    for n, user_ids in by_count.items():
+        UserProfile.objects.filter(pk__in=user_ids).update(
+            unread_notifications=models.F("unread_notifications") + n
+        )
+    transaction.on_commit(lambda: publish(notes))
+
+
+def push_events(notes):
+    """(group, channel event) pairs for the new notes: one "notifications" frame per user."""
+    by_user = defaultdict(list)
+    for note in notes:
+        by_user[note.user_id].append({
+            "id": note.pk,
+            "message": note.message,
+            "created_at": note.created_at.isoformat(),
+        })
+    return [
+        (
+            user_group(user_id),
+            broadcast_event({"type": "notifications", "unread_delta": len(items), "notifications": items}),
+        )
+        for user_id, items in by_user.items()
+    ]
+
+
+def publish(notes):
+    """Sends the committed notes to their users' sockets."""
+    send_from_thread(push_events(notes))
+
+
+@retry_busy
+def mark_read(user, ids=None):
+    """
+    Marks the user's unread notifications with the given ids (default: all of
+    them) read and returns how many were flipped.
+    """
+    with transaction.atomic():
+        unread = Notification.objects.filter(user=user, read=False)
+        if ids is not None:
+            unread = unread.filter(pk__in=ids)
+        marked = unread.update(read=True)
+        if marked:
+            # Rows flipped by a concurrent call are not matched again, so each
+            # is only ever subtracted once; Greatest guards a drifted counter.
+            UserProfile.objects.filter(pk=user.pk).update(
+                unread_notifications=Greatest(models.F("unread_notifications") - marked, 0)
+            )
+    user.unread_notifications = max(user.unread_notifications - marked, 0)
+    return marked
+
+
+def recount(user_ids=None):
+    """
+    Sets the unread counters of the given users (default: everyone) to their
+    actual number of unread notifications, in one UPDATE, and returns how many
+    profiles it wrote.
+    """
+    unread = (
+        Notification.objects.filter(user=models.OuterRef("pk"), read=False)
+        .order_by()
+        .values("user")
+        .annotate(n=models.Count("pk"))
+        .values("n")
+    )
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(pk__in=user_ids)
+    return profiles.update(unread_notifications=Coalesce(models.Subquery(unread), 0))
+
+
+def prune(before, batch_size=1000, archive=None):
+    """
+    Deletes read notifications created before `before`, batch_size rows per
+    transaction, and returns how many went. With `archive` (a text file) each
+    row is written to it as a line of JSON before it is deleted.
+    """
+    old = Notification.objects.filter(read=True, created_at__lt=before)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            if archive is None:
+                ids = list(old.values_list("pk", flat=True)[:batch_size])
+            else:
+                rows = list(old.values("id", "user_id", "message", "created_at")[:batch_size])
+                ids = [row["id"] for row in rows]
+                for row in rows:
+                    row["created_at"] = row["created_at"].isoformat()
+                    archive.write(json.dumps(row) + "\n")
+                archive.flush()
+            if not ids:
+                return deleted
+            deleted += Notification.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,148 @@
+# auctions/pagination.py
+import base64
+import json
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset plus the cursors around it."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, params=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def _url(self, cursor):
+        # Keep the other GET parameters (filters, page_size) on the link
+        params = self._params.copy()
+        params["cursor"] = cursor
+        return "?" + params.urlencode()
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self.has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url(self.prev_cursor) if self.has_previous else None
+
+
+def encode_cursor(values, backwards=False):
+    payload = {"v": values, "b": backwards}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Returns (values, backwards), or None for a missing or tampered cursor."""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return list(payload["v"]), bool(payload["b"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def page_size_from(params, default=None):
+    """The page_size GET parameter, clamped to KEYSET_MAX_PAGE_SIZE."""
+    default = default or settings.KEYSET_PAGE_SIZE
+    try:
+        size = int(params.get("page_size", default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, settings.KEYSET_MAX_PAGE_SIZE))
+
+
+def _after(keys, values, backwards):
+    """
+    Q for rows strictly after `values` in the ordering given by `keys`, e.g. for
+    ("ends_at", "id"): ends_at > v0 OR (ends_at = v0 AND id > v1).
+    """
+    alternatives = []
+    for i, key in enumerate(keys):
+        descending = key.startswith("-")
+        name = key.lstrip("-")
+        lookup = "lt" if descending != backwards else "gt"
+        equal = {k.lstrip("-"): v for k, v in zip(keys[:i], values[:i])}
+        alternatives.append(Q(**equal, **{f"{name}__{lookup}": values[i]}))
+    return reduce(lambda a, b: a | b, alternatives)
+
+
+def _flip(key):
+    return key[1:] if key.startswith("-") else "-" + key
+
+
+def keyset_paginate(queryset, keys, params, page_size=None):
+    """
+    Cursor-based pagination of `queryset` ordered by `keys` (the last of which
+    must be unique, usually "id"). Reads `cursor` and `page_size` from `params`
+    (a QueryDict such as request.GET) and returns a KeysetPage. Each page is one
+    indexed range query of page_size + 1 rows, however deep the reader scrolls.
+    """
+    page_size = page_size or page_size_from(params)
+    model = queryset.model
+    fields = [model._meta.get_field(key.lstrip("-")) for key in keys]
+
+    cursor = decode_cursor(params.get("cursor"))
+    backwards = False
+    qs = queryset.order_by(*keys)
+    if cursor and len(cursor[0]) == len(keys):
+        raw, backwards = cursor
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, raw)]
+        except ValidationError:
+            values = None
+        if values is not None:
+            if backwards:
+                qs = queryset.order_by(*[_flip(k) for k in keys])
+            qs = qs.filter(_after(keys, values, backwards))
+        else:
+            cursor, backwards = None, False
+    else:
+        cursor = None
+
+    rows = list(qs[:page_size + 1])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(obj, towards_start):
+        values = [getattr(obj, field.attname) for field in fields]
+        return encode_cursor([_jsonable(v) for v in values], towards_start)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = cursor_for(rows[-1], False)
+        if cursor is not None and (more or not backwards):
+            prev_cursor = cursor_for(rows[0], True)
+
+    return KeysetPage(rows, next_cursor, prev_cursor, params)
+
+
+def _jsonable(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,191 @@
+# auctions/perf.py
+"""
+Opt-in request profiling (PERF_INSTRUMENTATION).
+
+Every database connection gets an execute wrapper that, while a request or a
+WebSocket receive is being profiled, counts its queries, their time and how
+often each SQL string (parameters left out) ran. PerfMiddleware and
+``profile()`` file one sample per request under the URL name into a rolling
+window per endpoint; ``report()`` turns the windows into percentiles and the
+queries most often repeated within a single request, the usual sign of an N+1.
+
+The numbers are per process. Each process also writes its window to
+PERF_SNAPSHOT_DIR every PERF_SNAPSHOT_SECONDS, which is what
+``manage.py perf_report`` merges; ``/_perf/`` shows the serving process live.
+"""
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_current = contextvars.ContextVar("perf_profile", default=None)
+
+
+class Profile:
+    """What one request did; filled in by the execute wrapper."""
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.sql_time += time.perf_counter() - start
+        profile.statements[sql] += 1
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Installed regardless of the setting: with no profile active it is one
+    # context variable lookup. First in the list, so wrappers pushed later
+    # (tests, benchmarks) nest inside it.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+class Registry:
+    """Rolling windows of (wall, queries, sql_time) samples per endpoint."""
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._last_snapshot = time.monotonic()
+
+    def record(self, wall, profile):
+        name = profile.name
+        duplicated = [sql for sql, count in profile.statements.items() if count > 1]
+        with self._lock:
+            endpoint = self._endpoints.get(name)
+            if endpoint is None:
+                endpoint = self._endpoints[name] = {"samples": deque(maxlen=self.window), "duplicates": Counter()}
+            endpoint["samples"].append((wall, profile.queries, profile.sql_time))
+            # Counted once per request that repeated the statement
+            endpoint["duplicates"].update(duplicated)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {"samples": list(endpoint["samples"]), "duplicates": dict(endpoint["duplicates"])}
+                for name, endpoint in self._endpoints.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def maybe_write_snapshot(self):
+        directory = settings.PERF_SNAPSHOT_DIR
+        now = time.monotonic()
+        if not directory or now - self._last_snapshot < settings.PERF_SNAPSHOT_SECONDS:
+            return
+        self._last_snapshot = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(path + ".tmp", path)
+
+
+registry = Registry(settings.PERF_WINDOW)
+
+
+@contextmanager
+def profile(name):
+    """
+    Profiles the block as one sample of endpoint `name` (a no-op yielding None
+    when disabled). The block may rename the sample through the yielded Profile.
+    """
+    if not settings.PERF_INSTRUMENTATION:
+        yield None
+        return
+    current = Profile(name)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        registry.record(time.perf_counter() - start, current)
+        registry.maybe_write_snapshot()
+
+
+class PerfMiddleware:
+    """Profiles each request under its URL name (view_name, e.g. "auctions:listing")."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with profile("<unresolved>") as current:
+            response = self.get_response(request)
+            # URL resolution happens inside get_response
+            match = getattr(request, "resolver_match", None)
+            if current is not None and match is not None:
+                current.name = match.view_name
+        return response
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    return values[max(1, math.ceil(pct / 100 * len(values))) - 1]
+
+
+def _summary(values, scale=1.0, digits=2):
+    values = sorted(values)
+    out = {f"p{pct}": round(_percentile(values, pct) * scale, digits) for pct in (50, 95, 99)}
+    out["max"] = round(values[-1] * scale, digits)
+    return out
+
+
+def merge(snapshots):
+    """Combines snapshots of several processes into one."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, endpoint in snapshot.items():
+            target = merged.setdefault(name, {"samples": [], "duplicates": Counter()})
+            target["samples"].extend(tuple(sample) for sample in endpoint["samples"])
+            target["duplicates"].update(endpoint["duplicates"])
+    return merged
+
+
+def report(snapshot, top=3):
+    """Per-endpoint percentiles, slowest p95 first."""
+    rows = []
+    for name, endpoint in snapshot.items():
+        samples = endpoint["samples"]
+        if not samples:
+            continue
+        walls, queries, sql_times = zip(*samples)
+        rows.append({
+            "endpoint": name,
+            "requests": len(samples),
+            "wall_ms": _summary(walls, 1000),
+            "queries": _summary(queries, 1, 0),
+            "sql_ms": _summary(sql_times, 1000),
+            "duplicate_queries": [
+                {"sql": sql[:300], "requests": count}
+                for sql, count in Counter(endpoint["duplicates"]).most_common(top)
+            ],
+        })
+    rows.sort(key=lambda row: row["wall_ms"]["p95"], reverse=True)
+    return rows
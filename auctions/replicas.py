@@ -0,0 +1,134 @@
+# auctions/replicas.py
+"""
+Read replica routing.
+
+With DB_REPLICA on, views wrapped in @replica_reads (the listing, search, bid
+history and alerts pages, the auction admin's change list) read from the
+"replica" database. Everything else reads from and writes to "default":
+bids, the closer, sessions, and any code outside those views.
+
+A replica runs behind the primary, so a user who has just written (any
+non-GET request, or a bid over a socket) is pinned to the primary for
+REPLICA_PIN_SECONDS and sees their own bids straight away. Pins live in the
+REPLICA_PIN_CACHE cache; point it at a shared backend when several processes
+serve the same users.
+
+For SQLite the replica is a second database file, refreshed from the primary
+with the online backup API by `manage.py sync_replica` (once, or --every N
+seconds). Pages read from it are at most that many seconds old, plus the time
+a copy takes.
+"""
+import contextvars
+import sqlite3
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+REPLICA = "replica"
+# Apps whose rows have to be read back as soon as they are written
+PRIMARY_ONLY_APPS = {"sessions"}
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_reads_from = contextvars.ContextVar("replica_reads_from", default=None)
+
+
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def pin(user_id):
+    """Reads of this user go to the primary for the next REPLICA_PIN_SECONDS."""
+    if settings.DB_REPLICA and user_id:
+        caches[settings.REPLICA_PIN_CACHE].set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return bool(caches[settings.REPLICA_PIN_CACHE].get(_pin_key(user_id)))
+
+
+def read_alias(request):
+    """The database the request's reads may go to: the replica, or None for the primary."""
+    if not settings.DB_REPLICA or request.method not in SAFE_METHODS:
+        return None
+    user = request.user
+    if user.is_authenticated and is_pinned(user.pk):
+        return None
+    return REPLICA
+
+
+def replica_reads(view):
+    """Sends the view's reads to the replica, unless the user is pinned to the primary."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _reads_from.set(read_alias(request))
+        try:
+            response = view(request, *args, **kwargs)
+            # TemplateResponses (the admin's) query while rendering
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+            return response
+        finally:
+            _reads_from.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return "default"
+        return _reads_from.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        # Explicitly, or Django would write an instance back to the database it was read from
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy of the primary, schema included
+        return db != REPLICA
+
+
+class PinWritesMiddleware:
+    """Pins users to the primary after each request that may have written."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and request.user.is_authenticated:
+            pin(request.user.pk)
+        return response
+
+
+def sync(source, target):
+    """
+    Copies the SQLite database at `source` over the one at `target` with the
+    online backup API and returns the number of pages copied.
+
+    The copy is a single backup step. Copied in several steps, it would start
+    over whenever another connection wrote to the source between two of them,
+    so under steady bidding it might never finish. In one step it reads the
+    source in a single read transaction, which in WAL mode does not hold up
+    the primary's writers. The target stays write-locked for the whole copy:
+    replica readers wait for it, up to their busy timeout, and then read the
+    new copy.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        copied = 0
+
+        def progress(status, remaining, total):
+            nonlocal copied
+            copied = total
+
+        src.backup(dst, pages=-1, progress=progress)
+        return copied
+    finally:
+        dst.close()
+        src.close()
@@ -0,0 +1,96 @@
+# auctions/resume.py
+"""
+Catching a reconnecting socket up on the bids it missed.
+
+Every bid frame carries ``seq``, the bid's position among the auction's bids.
+A client that reconnects with ``?last_seen=<seq>`` gets the bids after that
+one (missed_bids): from a small per-process buffer of each auction's recent bid
+frames when it still reaches back far enough, else with one indexed query over
+Bid (bids of an auction are strictly increasing in amount, so amount order is
+seq order). Every bid broadcast from this process is buffered, whichever path
+placed it, but bids placed through other processes are not: the buffer is only
+trusted when its last seq has caught up with the auction's bid_count.
+If more than RESUME_MAX_BIDS were missed the client is told to reload instead.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from .models import Auction, Bid
+
+_lock = threading.Lock()
+# auction id -> recent bid frames, for the RESUME_BUFFER_AUCTIONS most recently bid on
+_recent = OrderedDict()
+
+
+def remember(auction_id, frame):
+    """Keeps an accepted bid's frame (with its seq) for sockets that come back later."""
+    if frame.get("seq") is None:
+        return
+    with _lock:
+        buffer = _recent.get(auction_id)
+        if buffer is None:
+            buffer = _recent[auction_id] = deque(maxlen=settings.RESUME_BUFFER_SIZE)
+            while len(_recent) > settings.RESUME_BUFFER_AUCTIONS:
+                _recent.popitem(last=False)
+        else:
+            _recent.move_to_end(auction_id)
+        buffer.append(frame)
+
+
+def forget(auction_id):
+    """Drops an auction's buffered frames, once their seqs no longer hold."""
+    with _lock:
+        _recent.pop(auction_id, None)
+
+
+def from_buffer(auction_id, last_seen):
+    """
+    The buffered frames after last_seen, or None if the buffer doesn't hold all
+    of them (it doesn't reach back that far, or has gaps from bids placed
+    through another process).
+    """
+    with _lock:
+        buffer = list(_recent.get(auction_id, ()))
+    frames = [frame for frame in buffer if frame["seq"] > last_seen]
+    if not frames:
+        # Up to date as far as this process knows
+        return [] if buffer and buffer[-1]["seq"] == last_seen else None
+    if [frame["seq"] for frame in frames] != list(range(last_seen + 1, last_seen + 1 + len(frames))):
+        return None
+    return frames
+
+
+def from_database(auction_id, last_seen):
+    """The bids after last_seen as frames, or None if there are more than RESUME_MAX_BIDS."""
+    limit = settings.RESUME_MAX_BIDS
+    rows = (
+        Bid.objects.filter(auction_id=auction_id)
+        .order_by("amount", "id")
+        .values_list("id", "bidder__username", "amount", "created_at")[last_seen:last_seen + limit + 1]
+    )
+    if len(rows) > limit:
+        return None
+    return [
+        {
+            "type": "bid_message",
+            "id": pk,
+            "bidder": username,
+            "amount": str(amount),
+            "created_at": created_at.isoformat(),
+            "seq": last_seen + i + 1,
+        }
+        for i, (pk, username, amount, created_at) in enumerate(rows)
+    ]
+
+
+def missed_bids(auction_id, last_seen):
+    """Frames for the bids after last_seen, or None when the client should reload."""
+    frames = from_buffer(auction_id, last_seen)
+    if frames is not None:
+        count = Auction.objects.filter(pk=auction_id).values_list("bid_count", flat=True).first()
+        # Live-book bids are buffered before they are written, so the count may be behind
+        if count is None or count <= (frames[-1]["seq"] if frames else last_seen):
+            return frames
+    return from_database(auction_id, last_seen)
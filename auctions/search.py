@@ -0,0 +1,163 @@
+# auctions/search.py
+"""
+Full-text search over auction titles and descriptions (SQLite FTS5).
+
+auctions_auction_fts is an external-content FTS5 index over auctions_auction:
+it stores only the index, and triggers on the auction table keep it in step on
+insert, delete and updates of title or description (the bid path's UPDATEs of
+the price columns never touch it). Searches keep the auctions whose id is a
+rowid the index matched and rank them by bm25, a title match counting for more
+than a description match.
+
+SQLite drops a table's triggers when a migration rebuilds the table, so
+install() runs after every migrate and puts back anything missing, rebuilding
+the index if it had to. `manage.py rebuild_search_index` rebuilds it by hand.
+Other databases fall back to LIKE over the same two columns.
+"""
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .pagination import KeysetPage, decode_cursor, encode_cursor, page_size_from
+
+TABLE = "auctions_auction_fts"
+# bm25 weights of the indexed columns: title, description
+WEIGHTS = (10.0, 1.0)
+# Words of a query beyond this many are ignored
+MAX_TERMS = 8
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "title, description, content='auctions_auction', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+)
+TRIGGERS = {
+    f"{TABLE}_insert": (
+        f"CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON auctions_auction BEGIN "
+        f"INSERT INTO {TABLE} (rowid, title, description) VALUES (new.id, new.title, new.description); "
+        "END"
+    ),
+    f"{TABLE}_delete": (
+        f"CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON auctions_auction BEGIN "
+        f"INSERT INTO {TABLE} ({TABLE}, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "END"
+    ),
+    f"{TABLE}_update": (
+        f"CREATE TRIGGER IF NOT EXISTS {TABLE}_update AFTER UPDATE OF title, description ON auctions_auction BEGIN "
+        f"INSERT INTO {TABLE} ({TABLE}, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        f"INSERT INTO {TABLE} (rowid, title, description) VALUES (new.id, new.title, new.description); "
+        "END"
+    ),
+}
+
+
+def install(connection):
+    """
+    Creates the index and its triggers where missing, rebuilding the index when
+    anything was. Returns whether it did anything. A no-op off SQLite.
+    """
+    if connection.vendor != "sqlite":
+        return False
+    names = ["auctions_auction", TABLE, *TRIGGERS]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names)
+        existing = {name for (name,) in cursor.fetchall()}
+        if "auctions_auction" not in existing or existing.issuperset([TABLE, *TRIGGERS]):
+            return False
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+    rebuild(connection)
+    return True
+
+
+def rebuild(connection, optimize=False):
+    """Re-reads every auction into the index; with optimize, also merges its b-trees into one."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.label == "auctions":
+        install(connections[using])
+
+
+def terms(text):
+    return re.findall(r"\w+", text or "")[:MAX_TERMS]
+
+
+def match_expression(text):
+    """
+    FTS5 query for free text: every word has to match, the last one also as a
+    prefix (for search-as-you-type). Words are quoted, so nothing a user types
+    is read as FTS5 syntax. None when there are no words.
+    """
+    words = terms(text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def _like(queryset, words):
+    return queryset.filter(reduce(
+        lambda q, word: q & (Q(title__icontains=word) | Q(description__icontains=word)), words, Q()
+    ))
+
+
+def matching(queryset, text):
+    """The auctions of `queryset` matching `text`, in whatever order the queryset has."""
+    match = match_expression(text)
+    if match is None:
+        return queryset.none()
+    if connections[queryset.db].vendor != "sqlite":
+        return _like(queryset, terms(text))
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s", (match,)))
+
+
+def search_auctions(queryset, text):
+    """
+    The auctions of `queryset` (e.g. listing_queryset, so with its filters)
+    matching `text`, best match first. Each carries its bm25 score as `rank`
+    (lower is better) on SQLite.
+    """
+    match = match_expression(text)
+    if match is None:
+        return queryset.none()
+    if connections[queryset.db].vendor != "sqlite":
+        return _like(queryset, terms(text)).order_by("ends_at", "id")
+    table = queryset.model._meta.db_table
+    # Scored row by row, by rowid, within the rows the index matched
+    rank = RawSQL(
+        f"SELECT bm25({TABLE}, %s, %s) FROM {TABLE} WHERE {TABLE} MATCH %s AND {TABLE}.rowid = {table}.id",
+        (*WEIGHTS, match),
+        output_field=FloatField(),
+    )
+    return matching(queryset, text).annotate(rank=rank).order_by("rank", "id")
+
+
+def ranked_page(queryset, params):
+    """
+    A page of ranked results. Ranks are not a stable key to seek on, so the
+    cursor is an offset, capped at SEARCH_MAX_RESULTS.
+    """
+    page_size = page_size_from(params)
+    cursor = decode_cursor(params.get("cursor"))
+    offset = cursor[0][0] if cursor and len(cursor[0]) == 1 and isinstance(cursor[0][0], int) else 0
+    offset = max(0, min(offset, settings.SEARCH_MAX_RESULTS - page_size))
+
+    rows = list(queryset[offset:offset + page_size + 1])
+    more = len(rows) > page_size and offset + page_size < settings.SEARCH_MAX_RESULTS
+    next_cursor = encode_cursor([offset + page_size]) if more else None
+    prev_cursor = encode_cursor([max(offset - page_size, 0)], True) if offset else None
+    return KeysetPage(rows[:page_size], next_cursor, prev_cursor, params)
@@ -0,0 +1,54 @@
+# auctions/serializers.py
+from rest_framework import serializers
+
+from .models import Auction, Bid, Notification
+
+
+class AuctionSerializer(serializers.ModelSerializer):
+    owner = serializers.CharField(source="owner.username")
+    leader = serializers.CharField(source="leading_bidder.username", default=None)
+    image = serializers.ImageField(use_url=True)
+
+    class Meta:
+        model = Auction
+        fields = [
+            "id", "title", "description", "category", "owner", "image", "base_price",
+            "current_price", "bid_count", "leader", "ends_at", "is_active", "version",
+        ]
+
+
+class CompactAuctionSerializer(serializers.ModelSerializer):
+    """Just what a list row on a phone shows (?compact=1)."""
+
+    price = serializers.DecimalField(source="current_price", max_digits=12, decimal_places=2)
+    bids = serializers.IntegerField(source="bid_count")
+
+    class Meta:
+        model = Auction
+        fields = ["id", "title", "price", "bids", "ends_at", "version"]
+
+
+class BidSerializer(serializers.ModelSerializer):
+    bidder = serializers.CharField(source="bidder.username")
+
+    class Meta:
+        model = Bid
+        fields = ["id", "bidder", "amount", "created_at"]
+
+
+class MyBidSerializer(serializers.ModelSerializer):
+    auction_title = serializers.CharField(source="auction.title")
+    leading = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Bid
+        fields = ["id", "auction", "auction_title", "amount", "created_at", "leading"]
+
+    def get_leading(self, bid):
+        return bid.auction.leading_bidder_id == bid.bidder_id
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ["id", "message", "created_at", "read"]
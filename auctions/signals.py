@@ -0,0 +1,37 @@
+# auctions/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import closer as closer_module
+from . import eventlog, images
+from .models import Auction, UserProfile
+
+
+@receiver(post_save, sender=Auction)
+def log_auction_created(sender, instance, created, **kwargs):
+    if created:
+        eventlog.record_after_commit(
+            eventlog.AUCTION_CREATED,
+            instance.pk,
+            owner=instance.owner_id,
+            base_price=str(instance.base_price),
+            ends_at=instance.ends_at.isoformat(),
+        )
+
+
+@receiver(post_save, sender=Auction)
+def schedule_auction_close(sender, instance, created, **kwargs):
+    # Only the closer running in this process can be told directly;
+    # closers in other processes see the auction on their next refresh.
+    running = closer_module.closer
+    if running is not None and instance.is_active:
+        running.schedule(instance.pk, instance.ends_at)
+
+
+@receiver(post_save, sender=Auction)
+@receiver(post_save, sender=UserProfile)
+def build_image_renditions(sender, instance, created, **kwargs):
+    # Uploads made later (admin edits) are scheduled by the admin
+    field_name = images.FIELDS[sender._meta.label][0]
+    if created and getattr(instance, field_name):
+        images.build_later(instance)
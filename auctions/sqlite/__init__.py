@@ -0,0 +1,53 @@
+# auctions/sqlite/__init__.py
+"""
+SQLite database backend (ENGINE "auctions.sqlite") with per-connection tuning.
+
+Django's SQLite backend with two OPTIONS of its own, both set by the
+DB_PROFILE chosen in settings:
+
+- "init_pragmas": PRAGMAs run on every new connection (WAL journal,
+  synchronous, busy_timeout, mmap_size, cache_size, temp_store).
+- "transaction_mode": "IMMEDIATE" begins every atomic block with BEGIN
+  IMMEDIATE, taking the write lock up front (as Django 5.1's option of the
+  same name does). A deferred transaction that reads and then writes cannot
+  wait for the lock: when another connection got there first SQLite fails
+  the upgrade with "database is locked" straight away, busy timeout or not.
+
+retry_busy() retries a whole write transaction that still hit a locked
+database, with exponential backoff.
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+
+def is_busy(exc):
+    return "database is locked" in str(exc) or "database is busy" in str(exc)
+
+
+def retry_busy(fn):
+    """
+    Runs fn again, up to DB_BUSY_RETRIES more times, when it fails because the
+    database is locked. fn has to be a whole transaction: inside an enclosing
+    atomic block there is nothing safe to retry, so the error is raised as is.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(settings.DB_BUSY_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as exc:
+                if (
+                    not is_busy(exc)
+                    or attempt == settings.DB_BUSY_RETRIES
+                    or connections[DEFAULT_DB_ALIAS].in_atomic_block
+                ):
+                    raise
+            delay = settings.DB_BUSY_BACKOFF_MS / 1000 * 2 ** attempt
+            # Jittered, so writers that collided do not all come back at once
+            time.sleep(random.uniform(delay / 2, delay))
+
+    return wrapper
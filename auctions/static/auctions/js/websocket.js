@@ -1,20 +1,105 @@
 // auctions/static/auctions/js/websocket.js
-function setupAuctionSocket(auctionId, userId, currentBidSelector) {
+// renderedSeq: the auction's bid_count when the page was rendered, so a socket
+// that drops before its first bid still resumes from the page's price
+function setupAuctionSocket(auctionId, userId, currentBidSelector, renderedSeq) {
   const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
-  const ws = new WebSocket(`${protocol}://${window.location.host}/ws/auction/${auctionId}/`);
-  ws.onopen = () => console.log('ws open');
-  ws.onmessage = ev => {
-    const data = JSON.parse(ev.data);
-    if (data.amount) {
-      document.querySelector(currentBidSelector).innerText = '₹' + data.amount;
+  // seq of the last bid we have shown; sent back on reconnect so the server
+  // replays only what we missed instead of us reloading the page
+  let lastSeen = renderedSeq ?? null;
+  let ws = null;
+  let retryDelay = 500;
+  // Idempotency key of the amount last sent: sending the same amount again
+  // reuses it, so the server drops the repeat instead of placing it twice
+  let sentAmount = null;
+  let sentKey = null;
+
+  function newKey() {
+    return window.crypto?.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`;
+  }
+
+  function showBid(bid) {
+    if (bid.seq != null) {
+      if (lastSeen != null && bid.seq <= lastSeen) return;  // already shown
+      lastSeen = bid.seq;
     }
-  };
+    document.querySelector(currentBidSelector).innerText = '₹' + bid.amount;
+  }
+
+  function connect() {
+    const query = lastSeen != null ? `?last_seen=${lastSeen}` : '';
+    ws = new WebSocket(`${protocol}://${window.location.host}/ws/auction/${auctionId}/${query}`);
+    ws.onopen = () => { retryDelay = 500; };
+    ws.onmessage = ev => {
+      const data = JSON.parse(ev.data);
+      if (data.type === 'resume') {
+        data.bids.forEach(showBid);
+      } else if (data.type === 'resync') {
+        window.location.reload();  // missed too much to replay
+      } else if (data.type === 'price_update') {
+        (data.bids || [data]).forEach(showBid);
+      } else if (data.type === 'bids_retracted') {
+        // Bids shown earlier did not stand; this is the price that does
+        lastSeen = data.seq;
+        document.querySelector(currentBidSelector).innerText = '₹' + data.amount;
+      } else if (data.type === 'bid_rejected') {
+        if (data.reason !== 'duplicate') sentAmount = null;  // decided, so a retry is a new bid
+        alert(data.message);
+      } else if (data.amount) {
+        showBid(data);
+      }
+    };
+    ws.onclose = () => {
+      // Back off (with jitter) so a server restart isn't met by every client at once
+      setTimeout(connect, retryDelay * (0.5 + Math.random()));
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  }
+
+  connect();
   document.getElementById('place-bid')?.addEventListener('click', () => {
     const amt = document.getElementById('bid-amount').value;
     if (!amt || !userId) {
       alert('Enter amount and ensure you are logged in.');
       return;
     }
-    ws.send(JSON.stringify({action: 'place_bid', amount: amt, user_id: userId}));
+    if (amt !== sentAmount) {
+      sentAmount = amt;
+      sentKey = newKey();
+    }
+    // The server takes the bidder from the session, not from the message
+    ws.send(JSON.stringify({action: 'place_bid', amount: amt, key: sentKey}));
   });
 }
+
+function setupNotificationSocket(badgeSelector) {
+  const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+  const badge = document.querySelector(badgeSelector);
+  let unread = Number(badge?.innerText) || 0;
+  let retryDelay = 500;
+
+  function showUnread() {
+    if (!badge) return;
+    badge.innerText = unread;
+    badge.hidden = unread === 0;
+  }
+
+  function connect() {
+    const ws = new WebSocket(`${protocol}://${window.location.host}/ws/notifications/`);
+    ws.onopen = () => { retryDelay = 500; };
+    ws.onmessage = ev => {
+      const data = JSON.parse(ev.data);
+      if (data.type === 'unread') {
+        unread = data.count;  // sent on every (re)connect, so missed pushes don't leave it stale
+      } else if (data.type === 'notifications') {
+        unread += data.unread_delta;
+      }
+      showUnread();
+    };
+    ws.onclose = () => {
+      setTimeout(connect, retryDelay * (0.5 + Math.random()));
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  }
+
+  connect();
+}
@@ -0,0 +1,39 @@
+# auctions/templatetags/auction_cache.py
+from django import template
+
+from auctions.cache import get_or_render
+
+register = template.Library()
+
+
+class AuctionFragmentNode(template.Node):
+    def __init__(self, name, auction, nodelist):
+        self.name = name
+        self.auction = auction
+        self.nodelist = nodelist
+
+    def render(self, context):
+        auction = self.auction.resolve(context)
+        return get_or_render(self.name, auction, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def auction_fragment(parser, token):
+    """
+    Caches the enclosed markup until the auction's version changes:
+
+        {% auction_fragment "card" auction %} ... {% endauction_fragment %}
+
+    Only put markup inside that depends on the auction alone; anything per-user
+    (owner buttons, CSRF tokens) has to stay outside the block.
+    """
+    try:
+        _, name, auction = token.split_contents()
+    except ValueError:
+        raise template.TemplateSyntaxError("auction_fragment takes a fragment name and an auction")
+    if name[0] != name[-1] or name[0] not in "\"'":
+        raise template.TemplateSyntaxError("auction_fragment name must be a quoted string")
+
+    nodelist = parser.parse(("endauction_fragment",))
+    parser.delete_first_token()
+    return AuctionFragmentNode(name[1:-1], parser.compile_filter(auction), nodelist)
@@ -0,0 +1,34 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from auctions import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_url(file, rendition, fmt="jpeg"):
+    """{% image_url auction.image "thumb" %}: the URL of one rendition, or of the original until it is built."""
+    return images.url(file, rendition, fmt) if file else ""
+
+
+@register.simple_tag
+def picture(file, rendition, **attrs):
+    """
+    An <img> of one rendition of an image field, with the WebP version offered
+    to browsers that take it; attributes are passed through to the <img>:
+
+        {% picture auction.image "thumb" alt=auction.title class="w-full h-48" loading="lazy" %}
+    """
+    if not file:
+        return ""
+    jpeg = images.url(file, rendition)
+    if jpeg == file.url:
+        return format_html('<img src="{}"{}>', jpeg, flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}"><img src="{}"{}></picture>',
+        images.url(file, rendition, "webp"),
+        jpeg,
+        flatatt(attrs),
+    )
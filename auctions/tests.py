@@ -1,3 +1,1490 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import csv
+import importlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from io import BytesIO, StringIO
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse, QueryDict
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from unittest import skipUnless
+
+from PIL import Image
+
+from . import bidding
+from . import cache as fragment_stats
+from . import counters, eventlog, images, livebook, perf, replicas, resume, search, throttle
+from .broadcast import BidCoalescer, Outbox
+from .closer import AuctionCloser
+from .consumers import AuctionConsumer, NotificationConsumer
+from .executors import KeyedExecutor
+from .layers import SQLiteChannelLayer
+from .pagination import keyset_paginate
+from .replicas import PinWritesMiddleware, ReplicaRouter, replica_reads
+from .sqlite import retry_busy
+from .sqlite.base import DatabaseWrapper
+from .utils import close_auctions_batch
+from .views import listing_queryset
+from .models import Auction, Bid, CounterDelta, Notification, UserProfile, Vendue
+
+
+# Pages render {% static %} tags, which need collectstatic under the manifest storage
+plain_static = override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+
+
+class SocketClient(ApplicationCommunicator):
+    """Minimal WebSocket test client (channels.testing needs daphne, which we don't ship)."""
+
+    def __init__(self, app, path, **scope):
+        super().__init__(app, {"type": "websocket", "path": path, "headers": [], "subprotocols": [], **scope})
+
+    async def connect(self):
+        await self.send_input({"type": "websocket.connect"})
+        return (await self.receive_output(1))["type"] == "websocket.accept"
+
+    async def send_json_to(self, data):
+        await self.send_input({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json_from(self, timeout=1):
+        return json.loads((await self.receive_output(timeout))["text"])
+
+    async def disconnect(self):
+        await self.send_input({"type": "websocket.disconnect", "code": 1000})
+        await self.wait(1)
+
+
+def make_auction(owner, **kwargs):
+    kwargs.setdefault("title", "Lamp")
+    kwargs.setdefault("description", "Brass desk lamp")
+    kwargs.setdefault("base_price", Decimal("10.00"))
+    kwargs.setdefault("ends_at", timezone.now() + timedelta(hours=1))
+    return Auction.objects.create(owner=owner, **kwargs)
+
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.bob = UserProfile.objects.create_user("bob")
+        self.auction = make_auction(self.owner)
+
+    def test_accepted_bid_updates_counters_and_notifies(self):
+        bidding.place_bid(self.auction.pk, self.alice, "12")
+        result = bidding.place_bid(self.auction.pk, self.bob, "15.50")
+
+        self.assertTrue(result.accepted)
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("15.50"))
+        self.assertEqual(self.auction.bid_count, 2)
+        self.assertEqual(self.auction.leading_bidder, self.bob)
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.tenders_placed, 1)
+        self.assertEqual(Notification.objects.filter(user=self.owner).count(), 2)
+        self.assertEqual(Notification.objects.filter(user=self.alice).count(), 1)
+
+    def test_rejections(self):
+        cases = [
+            (self.alice, "abc", bidding.INVALID_AMOUNT),
+            (self.alice, "12.345", bidding.INVALID_AMOUNT),
+            (self.owner, "20", bidding.OWN_AUCTION),
+            (self.alice, "10", bidding.TOO_LOW),
+        ]
+        for user, amount, reason in cases:
+            with self.subTest(amount=amount):
+                self.assertEqual(bidding.place_bid(self.auction.pk, user, amount).reason, reason)
+        self.assertEqual(bidding.place_bid(0, self.alice, "20").reason, bidding.NOT_FOUND)
+
+        Auction.objects.filter(pk=self.auction.pk).update(ends_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(bidding.place_bid(self.auction.pk, self.alice, "20").reason, bidding.CLOSED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_losing_every_race_is_not_reported_as_too_low(self):
+        def always_outbid(execute, sql, params, many, context):
+            # As if another bid landed between each read and claim
+            if sql.startswith('UPDATE "auctions_auction"'):
+                sql = sql.replace(" WHERE ", " WHERE 0 AND ", 1)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(always_outbid):
+            result = bidding.place_bid(self.auction.pk, self.alice, "50")
+
+        self.assertEqual(result.reason, bidding.CONTENDED)
+        self.assertIn("try again", result.message)
+        self.assertFalse(Bid.objects.exists())
+
+
+class AuctionBidStatsTests(TestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.bob = UserProfile.objects.create_user("bob")
+        self.auction = make_auction(self.owner)
+
+    def test_backfill_reads_the_bid_table(self):
+        Bid.objects.create(auction=self.auction, bidder=self.alice, amount=Decimal("12.00"))
+        Bid.objects.create(auction=self.auction, bidder=self.bob, amount=Decimal("15.00"))
+        unbid = make_auction(self.owner, base_price=Decimal("7.00"))
+        Auction.objects.update(current_price=0, bid_count=0, leading_bidder=None)
+
+        migration = importlib.import_module("auctions.migrations.0004_auction_bid_stats")
+        migration.backfill_bid_stats(apps, None)
+
+        self.auction.refresh_from_db()
+        unbid.refresh_from_db()
+        self.assertEqual((self.auction.current_price, self.auction.bid_count), (Decimal("15.00"), 2))
+        self.assertEqual(self.auction.leading_bidder, self.bob)
+        self.assertEqual((unbid.current_price, unbid.bid_count, unbid.leading_bidder), (Decimal("7.00"), 0, None))
+
+    def test_saving_a_stale_row_keeps_bids_placed_since(self):
+        stale = Auction.objects.get(pk=self.auction.pk)
+        bidding.place_bid(self.auction.pk, self.alice, "20")
+
+        stale.title = "Brass lamp"
+        stale.base_price = Decimal("12.00")
+        stale.save()
+
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.title, "Brass lamp")
+        self.assertEqual((self.auction.current_price, self.auction.bid_count), (Decimal("20.00"), 1))
+        self.assertEqual(self.auction.leading_bidder, self.alice)
+        self.assertEqual(stale.current_price, Decimal("20.00"))
+
+    def test_base_price_edit_moves_the_price_until_the_first_bid(self):
+        self.auction.base_price = Decimal("25.00")
+        self.auction.save()
+        self.assertEqual(self.auction.current_price, Decimal("25.00"))
+
+    def test_every_edit_bumps_the_version_in_its_update(self):
+        before = Auction.objects.values_list("version", flat=True).get(pk=self.auction.pk)
+        with self.assertNumQueries(1):
+            self.auction.title = "Brass lamp"
+            self.auction.save(update_fields=["title"])
+        with self.assertNumQueries(1):
+            self.auction.save()
+        self.assertEqual(self.auction.version, before + 2)
+
+
+@plain_static
+class BidAdmissionTests(TestCase):
+    def setUp(self):
+        throttle.reset()
+        resume._recent.clear()
+        self.addCleanup(throttle.reset)
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.auction = make_auction(self.owner)
+        self.url = f"/auction/{self.auction.pk}/"
+        self.client.force_login(self.alice)
+
+    def test_token_bucket_refills_at_the_rate(self):
+        buckets = throttle.Buckets(rate=2, burst=2)
+        self.assertEqual([buckets.take("k", now=0) for _ in range(3)], [True, True, False])
+        self.assertFalse(buckets.take("k", now=0.25))
+        self.assertTrue(buckets.take("k", now=0.5))
+        self.assertTrue(buckets.take("other", now=0.5))
+
+    def test_resubmitted_form_places_one_bid(self):
+        key = self.client.get(self.url).context["bid_key"]
+        self.client.post(self.url, {"amount": "12", "idempotency_key": key})
+        response = self.client.post(self.url, {"amount": "12", "idempotency_key": key}, follow=True)
+
+        self.assertContains(response, "already submitted")
+        self.assertEqual(Bid.objects.filter(auction=self.auction).count(), 1)
+        # Buffered for reconnecting sockets like a socket bid
+        self.assertEqual([(f["seq"], f["amount"]) for f in resume._recent[self.auction.pk]], [(1, "12.00")])
+        self.assertNotEqual(self.client.get(self.url).context["bid_key"], key)
+
+    @override_settings(BID_BURST_PER_USER=1, BID_RATE_PER_USER=0.001)
+    def test_flooding_bidder_is_turned_away_before_touching_the_auction(self):
+        self.client.post(self.url, {"amount": "12"})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {"amount": "13"})
+
+        self.assertFalse([q for q in queries if "auctions_auction" in q["sql"] or "auctions_bid" in q["sql"]])
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_price, Decimal("12.00"))
+        self.assertEqual(throttle.stats()["http"], {
+            "admitted": 1, bidding.RATE_LIMITED: 1, bidding.DUPLICATE: 0, "shed_ratio": 0.5,
+        })
+
+        self.alice.is_staff = True
+        self.alice.save()
+        self.assertEqual(self.client.get("/_perf/").json()["bid_admission"]["http"][bidding.RATE_LIMITED], 1)
+
+    @override_settings(
+        BID_BURST_PER_USER=2, BID_RATE_PER_USER=0.001, BID_BURST_PER_AUCTION=1, BID_RATE_PER_AUCTION=0.001
+    )
+    def test_turned_away_bids_cost_the_bidder_nothing(self):
+        other = self.auction.pk + 1
+        self.assertIsNone(throttle.check(1, self.auction.pk, "a"))
+        self.assertEqual(throttle.check(1, self.auction.pk, "a"), bidding.DUPLICATE)
+        # The auction's bucket is empty: neither the bidder's token nor the key is spent
+        self.assertEqual(throttle.check(1, self.auction.pk, "b"), bidding.RATE_LIMITED)
+        self.assertIsNone(throttle.check(1, other, "b"))
+        self.assertEqual(throttle.check(1, other + 1), bidding.RATE_LIMITED)
+
+    @override_settings(BID_RATE_CACHE="default", BID_BURST_PER_AUCTION=2, BID_RATE_PER_AUCTION=0.001)
+    def test_shared_cache_backend(self):
+        cache.clear()
+        self.assertIsNone(throttle.check(1, self.auction.pk, "k"))
+        # Another process, same cache
+        throttle.reset()
+        self.assertEqual(throttle.check(1, self.auction.pk, "k"), bidding.DUPLICATE)
+        self.assertIsNone(throttle.check(2, self.auction.pk))
+        self.assertEqual(throttle.check(2, self.auction.pk), bidding.RATE_LIMITED)
+        self.assertIsNone(throttle.check(3, self.auction.pk + 1))
+
+class ConcurrentBiddingTests(TransactionTestCase):
+    THREADS = 8
+    BIDS_PER_THREAD = 15
+
+    def test_accepted_bids_strictly_increase(self):
+        owner = UserProfile.objects.create_user("owner")
+        bidders = [UserProfile.objects.create_user(f"bidder{i}") for i in range(self.THREADS)]
+        auction = make_auction(owner, base_price=Decimal("1.00"))
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def hammer(i, user):
+            start.wait()
+            try:
+                # Every thread walks the same price ladder, so most bids collide.
+                for step in range(self.BIDS_PER_THREAD):
+                    bidding.place_bid(auction.pk, user, Decimal(2 + step * 2 + i % 2))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hammer, args=(i, u)) for i, u in enumerate(bidders)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        amounts = list(Bid.objects.filter(auction=auction).order_by("id").values_list("amount", flat=True))
+        self.assertTrue(amounts)
+        self.assertEqual(amounts, sorted(set(amounts)))
+
+        auction.refresh_from_db()
+        self.assertEqual(auction.bid_count, len(amounts))
+        self.assertEqual(auction.current_price, amounts[-1])
+
+
+class AuctionCloserTests(TestCase):
+    def test_closes_only_due_auctions(self):
+        owner = UserProfile.objects.create_user("owner")
+        alice = UserProfile.objects.create_user("alice")
+        expired = make_auction(owner, ends_at=timezone.now() + timedelta(seconds=30))
+        bidding.place_bid(expired.pk, alice, "20")
+        Auction.objects.filter(pk=expired.pk).update(ends_at=timezone.now() - timedelta(seconds=1))
+        running = make_auction(owner)
+
+        closer = AuctionCloser()
+        closer.refresh()
+        self.assertEqual(closer.run_once(), [expired.pk])
+        self.assertEqual(closer.run_once(), [])
+
+        expired.refresh_from_db()
+        running.refresh_from_db()
+        self.assertFalse(expired.is_active)
+        self.assertTrue(running.is_active)
+        alice.refresh_from_db()
+        self.assertEqual(alice.auctions_won, 1)
+
+    def test_batch_close_awards_wins_and_notifies_losers(self):
+        owner = UserProfile.objects.create_user("owner")
+        alice = UserProfile.objects.create_user("alice")
+        bob = UserProfile.objects.create_user("bob")
+        lots = [make_auction(owner, title=f"Lot {i}") for i in range(3)]
+        for lot in lots[:2]:
+            bidding.place_bid(lot.pk, bob, "11")
+            bidding.place_bid(lot.pk, alice, "12")
+        Auction.objects.update(ends_at=timezone.now() - timedelta(seconds=1))
+        Notification.objects.all().delete()
+
+        closed = close_auctions_batch([lot.pk for lot in lots])
+
+        self.assertEqual(sorted(closed), sorted(lot.pk for lot in lots))
+        self.assertFalse(Auction.objects.filter(is_active=True).exists())
+        alice.refresh_from_db()
+        bob.refresh_from_db()
+        self.assertEqual((alice.auctions_won, bob.auctions_won), (2, 0))
+        self.assertEqual(Notification.objects.filter(user=alice, message__startswith="You won").count(), 2)
+        self.assertEqual(Notification.objects.filter(user=bob, message__startswith="You lost").count(), 2)
+        self.assertEqual(close_auctions_batch([lot.pk for lot in lots]), [])
+
+
+@plain_static
+@override_settings(COUNTER_DELTAS=True)
+class CounterDeltaTests(TestCase):
+    def test_increments_wait_as_deltas_and_the_account_page_counts_them(self):
+        owner = UserProfile.objects.create_user("owner")
+        alice = UserProfile.objects.create_user("alice")
+        lots = [make_auction(owner, title=f"Lot {i}") for i in range(2)]
+        for lot in lots:
+            bidding.place_bid(lot.pk, alice, "11")
+            bidding.place_bid(lot.pk, alice, "12")
+        Auction.objects.filter(pk=lots[0].pk).update(ends_at=timezone.now() - timedelta(seconds=1))
+        close_auctions_batch([lots[0].pk])
+
+        alice.refresh_from_db()
+        self.assertEqual((alice.tenders_placed, alice.auctions_won), (0, 0))
+        self.assertEqual(CounterDelta.objects.count(), 5)
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.totals(alice.pk), {"vendues_created": 0, "tenders_placed": 4, "auctions_won": 1})
+
+        self.assertEqual(counters.fold(batch_size=2), 5)
+        self.assertFalse(CounterDelta.objects.exists())
+        alice.refresh_from_db()
+        self.assertEqual((alice.tenders_placed, alice.auctions_won), (4, 1))
+
+        bidding.place_bid(lots[1].pk, alice, "13")
+        self.client.force_login(alice)
+        response = self.client.get("/account/")
+        self.assertEqual((response.context["tenders_placed"], response.context["auctions_won"]), (5, 1))
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite specific")
+class QueryPlanTests(TestCase):
+    """
+    Guards the indexes in Meta.indexes: none of the hot queries in views.py,
+    utils.py and closer.py may fall back to a full table scan.
+    """
+
+    def hot_queries(self):
+        user = UserProfile.objects.create_user("planner")
+        now = timezone.now()
+        return {
+            "listing": listing_queryset({}),
+            "listing by category": listing_queryset({"category": "Art"}),
+            "listing by category and price": listing_queryset(
+                {"category": "Art", "price_min": "5", "price_max": "50"}
+            ),
+            "expired auctions": Auction.objects.filter(is_active=True, ends_at__lt=now).values_list("pk", flat=True),
+            "closer refresh": Auction.objects.filter(is_active=True).values_list("ends_at", "pk"),
+            "highest bid": Bid.objects.filter(auction_id=1).order_by("-amount"),
+            "bids page": user.bids.select_related("auction").order_by("-created_at"),
+            "alerts page": Notification.objects.filter(user=user).order_by("-created_at"),
+            "mark alerts read": Notification.objects.filter(user=user, read=False).values("pk"),
+            "alert retention": Notification.objects.filter(read=True, created_at__lt=now).values_list("pk", flat=True),
+            "closing bidders": Bid.objects.filter(auction_id__in=[1, 2]).values_list("auction_id", "bidder_id").distinct(),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for label, qs in self.hot_queries().items():
+            sql, params = qs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            with self.subTest(query=label, plan=plan):
+                scans = [step for step in plan if re.fullmatch(r"SCAN \w+", step)]
+                self.assertEqual(scans, [])
+
+
+@plain_static
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user("reader")
+        Notification.objects.bulk_create(
+            [Notification(user=self.user, message=f"note {i}") for i in range(7)]
+        )
+        # Same timestamp for several rows, so the id tie-breaker matters
+        Notification.objects.filter(pk__in=Notification.objects.order_by("id").values("id")[:4]).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        self.expected = list(Notification.objects.order_by("-created_at", "-id").values_list("message", flat=True))
+
+    def page(self, cursor=None):
+        params = QueryDict(mutable=True)
+        params["page_size"] = "3"
+        if cursor:
+            params["cursor"] = cursor
+        return keyset_paginate(Notification.objects.filter(user=self.user), ("-created_at", "-id"), params)
+
+    def test_walks_forward_and_back(self):
+        first = self.page()
+        second = self.page(first.next_cursor)
+        third = self.page(second.next_cursor)
+        seen = [n.message for page in (first, second, third) for n in page]
+
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+        self.assertEqual([n.message for n in self.page(third.prev_cursor)], self.expected[3:6])
+        self.assertEqual([n.message for n in self.page(second.prev_cursor)], self.expected[:3])
+
+    def test_bad_cursor_starts_from_the_top(self):
+        self.assertEqual([n.message for n in self.page("not-a-cursor")], self.expected[:3])
+
+    def test_listing_keeps_filters_in_links(self):
+        owner = UserProfile.objects.create_user("owner")
+        for i in range(30):
+            make_auction(owner, title=f"Lot {i}", category="Art")
+        self.client.force_login(self.user)
+
+        response = self.client.get("/listing/", {"category": "Art", "page_size": "10"})
+
+        self.assertEqual(len(response.context["auctions"]), 10)
+        self.assertIn("category=Art", response.context["page"].next_url)
+
+
+@plain_static
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.bob = UserProfile.objects.create_user("bob")
+        self.auction = make_auction(self.owner)
+        bidding.place_bid(self.auction.pk, self.alice, "12")
+        bidding.place_bid(self.auction.pk, self.bob, "15")
+
+    def unread(self, user):
+        user.refresh_from_db(fields=["unread_notifications"])
+        return user.unread_notifications
+
+    def test_counter_follows_new_alerts_and_badge_shows_it(self):
+        self.assertEqual((self.unread(self.owner), self.unread(self.alice), self.unread(self.bob)), (2, 1, 0))
+        Auction.objects.filter(pk=self.auction.pk).update(ends_at=timezone.now() - timedelta(seconds=1))
+        close_auctions_batch([self.auction.pk])
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (2, 1))
+
+        self.client.force_login(self.alice)
+        self.assertContains(self.client.get("/alerts/"), '<span id="unread-badge" class="nav-badge">2</span>', html=True)
+
+    def test_mark_selected_then_all_read(self):
+        self.client.force_login(self.owner)
+        first = Notification.objects.filter(user=self.owner).first()
+        response = self.client.post(
+            "/alerts/read/", {"id": [first.pk, Notification.objects.get(user=self.alice).pk]},
+            HTTP_ACCEPT="application/json",
+        )
+        # Someone else's alert is left alone
+        self.assertEqual(response.json(), {"marked": 1, "unread": 1})
+        self.assertFalse(Notification.objects.get(user=self.alice).read)
+
+        response = self.client.post("/alerts/read/", {"all": "1"})
+        self.assertRedirects(response, "/alerts/")
+        self.assertFalse(Notification.objects.filter(user=self.owner, read=False).exists())
+        self.assertEqual(self.unread(self.owner), 0)
+        self.assertEqual(self.client.get("/alerts/read/").status_code, 405)
+
+    def test_prune_deletes_only_old_read_alerts(self):
+        Notification.objects.filter(user=self.owner).update(read=True)
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=100))
+        fresh = Notification.objects.create(user=self.bob, message="fresh", read=True)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, "alerts.ndjson")
+            call_command("prune_notifications", days=90, batch_size=1, archive=archive, stdout=StringIO())
+            with open(archive) as fh:
+                archived = [json.loads(line) for line in fh]
+
+        self.assertEqual(len(archived), 2)
+        self.assertEqual({row["user_id"] for row in archived}, {self.owner.pk})
+        self.assertQuerysetEqual(
+            Notification.objects.order_by("pk").values_list("user_id", flat=True), [self.alice.pk, fresh.user_id]
+        )
+        self.assertEqual(self.unread(self.alice), 1)
+
+    def test_deleted_unread_alerts_leave_the_counter(self):
+        staff = UserProfile.objects.create_superuser("staff", password="x")
+        self.client.force_login(staff)
+        outbid = Notification.objects.get(user=self.alice)
+        response = self.client.post("/admin/auctions/notification/", {
+            "action": "delete_selected", "_selected_action": [outbid.pk], "post": "yes",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.unread(self.alice), 0)
+
+        # Deleted behind the counters' back, then repaired
+        Notification.objects.filter(user=self.owner).first().delete()
+        UserProfile.objects.filter(pk=self.bob.pk).update(unread_notifications=7)
+        call_command("recount_unread", stdout=StringIO())
+        self.assertEqual((self.unread(self.owner), self.unread(self.alice), self.unread(self.bob)), (1, 0, 0))
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5 is SQLite specific")
+@plain_static
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.lamp = make_auction(self.owner, title="Brass lamp", description="Desk light", category="Art")
+        self.desk = make_auction(self.owner, title="Oak desk", description="Comes with a brass lamp")
+        self.closed = make_auction(self.owner, title="Old lamp", is_active=False)
+
+    def search(self, text, **params):
+        return list(search.search_auctions(listing_queryset(QueryDict(mutable=True) | params), text))
+
+    def test_ranked_and_filtered_like_the_listing(self):
+        self.assertEqual(self.search("lamp"), [self.lamp, self.desk])
+        self.assertEqual(self.search("lamps"), [self.lamp, self.desk])  # stemmed
+        self.assertEqual(self.search("bra"), [self.lamp, self.desk])  # last word as a prefix
+        self.assertEqual(self.search("lamp", category="Art"), [self.lamp])
+        for text in ("", '"', "NEAR(lamp", "title:lamp OR", "*"):
+            with self.subTest(text=text):
+                self.search(text)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.lamp.title = "Copper kettle"
+        self.lamp.save()
+        Auction.objects.filter(pk=self.desk.pk).update(description="Plain")
+        self.assertEqual(self.search("kettle"), [self.lamp])
+        self.assertEqual(self.search("plain"), [self.desk])
+        self.assertEqual(self.search("lamp"), [])
+
+        self.desk.delete()
+        self.assertEqual(self.search("oak"), [])
+
+    def test_rebuild_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.TABLE}_insert")
+        make_auction(self.owner, title="Walnut cabinet")
+        self.assertEqual(self.search("walnut"), [])
+
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.search("walnut")), 1)
+        make_auction(self.owner, title="Walnut chair")
+        self.assertEqual(len(self.search("walnut")), 2)
+
+    def test_search_page(self):
+        self.client.force_login(self.owner)
+        response = self.client.get("/search/", {"q": "brass lamp", "page_size": 1})
+        self.assertEqual(list(response.context["auctions"]), [self.lamp])
+        response = self.client.get("/search/" + response.context["page"].next_url)
+        self.assertEqual(list(response.context["auctions"]), [self.desk])
+        self.assertTrue(response.context["page"].has_previous)
+
+
+@plain_static
+class ReadAPITests(TestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.auctions = [
+            make_auction(self.owner, title=f"Lot {i}", ends_at=timezone.now() + timedelta(hours=i + 1))
+            for i in range(3)
+        ]
+        bidding.place_bid(self.auctions[0].pk, self.alice, "12")
+        self.client.force_login(self.alice)
+
+    def test_list_pages_with_cursors_and_compact_mode(self):
+        first = self.client.get("/api/auctions/", {"page_size": 2}).json()
+        self.assertEqual([a["title"] for a in first["results"]], ["Lot 0", "Lot 1"])
+        self.assertEqual(first["results"][0]["leader"], "alice")
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([a["title"] for a in second["results"]], ["Lot 2"])
+
+        compact = self.client.get("/api/auctions/", {"compact": "1"}).json()["results"][0]
+        self.assertEqual(compact, {
+            "id": self.auctions[0].pk, "title": "Lot 0", "price": "12.00", "bids": 1,
+            "ends_at": compact["ends_at"], "version": 1,
+        })
+
+    def test_polling_gets_304_until_a_bid(self):
+        bob = UserProfile.objects.create_user("bob")
+        lot = self.auctions[0].pk
+        for amount, url in enumerate((f"/api/auctions/{lot}/", f"/api/auctions/{lot}/bids/", "/api/auctions/"), 20):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with self.assertNumQueries(3):  # session, user, then one version (or page) lookup
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+                bidding.place_bid(lot, bob, amount)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_own_bids_and_notifications(self):
+        bids = self.client.get("/api/me/bids/").json()["results"]
+        self.assertEqual([(b["auction_title"], b["amount"], b["leading"]) for b in bids], [("Lot 0", "12.00", True)])
+        self.client.force_login(self.owner)
+        notes = self.client.get("/api/me/notifications/").json()["results"]
+        self.assertEqual([n["read"] for n in notes], [False])
+
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/me/bids/").status_code, 403)
+
+
+@plain_static
+class ExportTests(TestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.lamp = make_auction(self.owner, title="Lamp", category="Art")
+        self.chair = make_auction(self.owner, title="Chair", category="Furniture")
+        for auction, amount in ((self.lamp, "11"), (self.lamp, "12"), (self.chair, "20")):
+            bidding.place_bid(auction.pk, self.alice, amount)
+
+    def export(self, *args, **options):
+        out = StringIO()
+        call_command("export_data", *args, stdout=out, chunk_size=1, **options)
+        return out.getvalue()
+
+    def test_bid_history_as_csv_filtered_by_category_and_date(self):
+        rows = list(csv.reader(StringIO(self.export("bids", category="Art"))))
+        self.assertEqual(rows[0][:6], ["bid_id", "auction_id", "auction_title", "category", "bidder", "amount"])
+        self.assertEqual([row[5] for row in rows[1:]], ["11.00", "12.00"])
+
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.export("bids", since=tomorrow).splitlines(), [",".join(rows[0])])
+
+    def test_results_as_ndjson(self):
+        Auction.objects.update(ends_at=timezone.now() - timedelta(seconds=1))
+        close_auctions_batch([self.lamp.pk, self.chair.pk])
+        unsold = make_auction(self.owner, title="Vase", is_active=False)
+
+        rows = [json.loads(line) for line in self.export("results", format="ndjson").splitlines()]
+
+        self.assertEqual(
+            [(r["title"], r["winner"], r["final_price"]) for r in rows],
+            [("Lamp", "alice", "12.00"), ("Chair", "alice", "20.00"), ("Vase", None, None)],
+        )
+        self.assertEqual(rows[2]["auction_id"], unsold.pk)
+
+    def test_staff_endpoint_streams(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get("/_export/bids/").status_code, 302)
+
+        staff = UserProfile.objects.create_user("staff", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get("/_export/bids/", {"format": "ndjson", "auction": self.chair.pk})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["amount"] for line in lines], ["20.00"])
+        self.assertEqual(self.client.get("/_export/bids/", {"since": "yesterday"}).status_code, 400)
+
+
+def image_upload(name="photo.jpg", size=(3000, 2000), fmt="JPEG", mode="RGB", orientation=None):
+    buffer = BytesIO()
+    image = Image.linear_gradient("L").resize(size).convert(mode)
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, fmt, exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@plain_static
+@override_settings(IMAGE_WORKERS=0)
+class ImageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings_override = override_settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.owner = UserProfile.objects.create_user("owner")
+
+    def files(self, directory):
+        root = os.path.join(self.media, directory)
+        return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, fs in os.walk(root) for f in fs)
+
+    def post_vendue(self, upload):
+        self.client.force_login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/vendue/", {
+                "title": "Lamp", "description": "Brass", "base_price": "10", "duration_minutes": "60",
+                "category": "Art", "attachment": upload,
+            })
+        return Auction.objects.latest("id")
+
+    def test_upload_is_stored_once_and_resized(self):
+        # EXIF orientation 6: the camera was held upright, so the photo is portrait
+        first = self.post_vendue(image_upload(orientation=6))
+        second = self.post_vendue(image_upload(name="copy.jpg", orientation=6))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith(f"originals/{first.image_digest[:2]}/"))
+        self.assertEqual(set(Vendue.objects.values_list("attachment", flat=True)), {first.image.name})
+        self.assertEqual(self.files("vendue_attachments"), [])
+        self.assertEqual(len(self.files("originals")), 1)
+        self.assertEqual(len(self.files("derived")), 4)
+        self.assertGreater(second.version, 0)
+
+        with Image.open(os.path.join(self.media, images.derivative_name(first.image_digest, "thumb", "jpeg"))) as thumb:
+            self.assertEqual(thumb.size, (426, 640))
+
+        html = self.client.get("/listing/").content.decode()
+        webp = images.derivative_name(first.image_digest, "thumb", "webp")
+        self.assertIn(f'<source type="image/webp" srcset="/media/{webp}">', html)
+        self.assertNotIn(first.image.url, html)
+
+    def test_avatar_is_cropped_and_flattened(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = UserProfile.objects.create_user(
+                "alice", avatar=image_upload("me.png", size=(400, 300), fmt="PNG", mode="RGBA")
+            )
+        user.refresh_from_db()
+
+        with Image.open(os.path.join(self.media, images.derivative_name(user.avatar_digest, "avatar", "jpeg"))) as jpeg:
+            self.assertEqual((jpeg.size, jpeg.mode), ((160, 160), "RGB"))
+        self.assertEqual(images.url(user.avatar, "avatar", "webp")[-11:], "avatar.webp")
+
+    def test_unreadable_upload_keeps_the_original(self):
+        with self.assertLogs("auctions.images", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            auction = make_auction(self.owner, image=SimpleUploadedFile("broken.jpg", b"not a jpeg"))
+        auction.refresh_from_db()
+
+        self.assertEqual(auction.image_digest, "")
+        self.assertEqual(images.url(auction.image, "thumb"), auction.image.url)
+
+    def test_changed_image_stops_showing_the_old_renditions(self):
+        auction = self.post_vendue(image_upload())
+        old = images.url(auction.image, "thumb")
+        auction.image = SimpleUploadedFile("broken.jpg", b"not a jpeg")
+        form = type("Form", (), {"changed_data": ["image"]})()
+        # The new upload cannot be rendered, so its original is all there is
+        with self.assertLogs("auctions.images", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            admin.site._registry[Auction].save_model(RequestFactory().post("/"), auction, form, True)
+        auction.refresh_from_db()
+
+        self.assertEqual(auction.image_digest, "")
+        self.assertNotEqual(images.url(auction.image, "thumb"), old)
+        self.assertEqual(images.url(auction.image, "thumb"), auction.image.url)
+
+    def test_only_the_build_that_repointed_deletes_the_upload(self):
+        auction = make_auction(self.owner, image=image_upload())
+        render = images.render
+
+        def render_while_another_build_finishes(*args, **kwargs):
+            Auction.objects.filter(pk=auction.pk).update(image="originals/elsewhere.jpg")
+            return render(*args, **kwargs)
+
+        images.render = render_while_another_build_finishes
+        self.addCleanup(setattr, images, "render", render)
+        images.build("auctions.Auction", auction.pk)
+
+        # That other build deletes the upload once it is done reading it
+        self.assertTrue(os.path.exists(auction.image.path))
+
+
+@plain_static
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_stats.reset_stats()
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.auction = make_auction(self.owner)
+        self.client.force_login(self.alice)
+
+    def test_detail_header_is_cached_until_the_next_bid(self):
+        url = f"/auction/{self.auction.pk}/"
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(fragment_stats.stats()["hits"], 1)
+
+        bidding.place_bid(self.auction.pk, self.alice, "42")
+        response = self.client.get(url)
+
+        self.assertEqual(fragment_stats.stats()["misses"], 2)
+        self.assertContains(response, "₹42.00")
+
+    @plain_static
+    def test_owner_buttons_do_not_load_each_owner(self):
+        def queries_for_listing():
+            self.client.get("/listing/")  # fills the fragment cache
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/listing/")
+            return len(queries)
+
+        self.client.force_login(self.owner)
+        one = queries_for_listing()
+        for i in range(3):
+            make_auction(self.owner, title=f"Lot {i}")
+        self.assertEqual(queries_for_listing(), one)
+
+
+@plain_static
+@modify_settings(MIDDLEWARE={"prepend": "auctions.perf.PerfMiddleware"})
+class PerfInstrumentationTests(TestCase):
+    def setUp(self):
+        snapshots = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshots.cleanup)
+        settings_override = override_settings(
+            PERF_INSTRUMENTATION=True, PERF_SNAPSHOT_DIR=snapshots.name, PERF_SNAPSHOT_SECONDS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        perf.registry.reset()
+        self.addCleanup(perf.registry.reset)
+        self.user = UserProfile.objects.create_user("reader")
+        self.client.force_login(self.user)
+
+    def test_requests_are_profiled_by_url_name(self):
+        make_auction(UserProfile.objects.create_user("owner"))
+        self.client.get("/listing/")
+
+        samples = perf.registry.snapshot()["auctions:listing"]["samples"]
+        self.assertEqual(len(samples), 1)
+        self.assertGreater(samples[0][1], 0)
+
+    def test_repeated_statements_are_reported(self):
+        with perf.profile("n_plus_one"):
+            for name in ("a", "b", "c"):
+                UserProfile.objects.filter(username=name).exists()
+
+        (row,) = perf.report(perf.registry.snapshot())
+        self.assertEqual(row["queries"]["max"], 3)
+        self.assertIn("auctions_userprofile", row["duplicate_queries"][0]["sql"])
+
+    def test_perf_endpoint_is_staff_only_and_report_reads_snapshots(self):
+        self.assertEqual(self.client.get("/_perf/").status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        endpoints = [row["endpoint"] for row in self.client.get("/_perf/").json()["endpoints"]]
+        self.assertIn("auctions:perf", endpoints)
+
+        out = StringIO()
+        call_command("perf_report", stdout=out)
+        self.assertIn("auctions:perf", out.getvalue())
+
+
+class AuctionSocketTests(TransactionTestCase):
+    def setUp(self):
+        throttle.reset()
+        resume._recent.clear()
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.auction = make_auction(self.owner)
+
+    def communicator(self, query_string=b"", user=None):
+        app = URLRouter([path("ws/auction/<int:auction_id>/", AuctionConsumer.as_asgi())])
+        return SocketClient(
+            app, f"/ws/auction/{self.auction.pk}/", query_string=query_string, user=user or self.alice
+        )
+
+    async def test_reconnect_replays_only_missed_bids(self):
+        bidder = self.communicator()
+        await bidder.connect()
+        for amount in ("11", "12", "13"):
+            await bidder.send_json_to({"action": "place_bid", "amount": amount})
+            await bidder.receive_json_from()
+
+        from_buffer = self.communicator(b"last_seen=1")
+        await from_buffer.connect()
+        replay = await from_buffer.receive_json_from()
+        self.assertEqual([(b["seq"], b["amount"]) for b in replay["bids"]], [(2, "12.00"), (3, "13.00")])
+
+        resume._recent.clear()  # as after a restart
+        from_db = self.communicator(b"last_seen=2")
+        await from_db.connect()
+        replay = await from_db.receive_json_from()
+        self.assertEqual([(b["seq"], b["amount"]) for b in replay["bids"]], [(3, "13.00")])
+
+        for socket in (bidder, from_buffer, from_db):
+            await socket.disconnect()
+
+    async def test_page_seq_of_zero_replays_every_bid(self):
+        # The page was rendered before any bid; its socket dropped before seeing one
+        bob = await sync_to_async(UserProfile.objects.create_user)("bob")
+        await sync_to_async(bidding.place_bid)(self.auction.pk, bob, "11")
+        await sync_to_async(bidding.place_bid)(self.auction.pk, self.alice, "12")
+
+        socket = self.communicator(b"last_seen=0")
+        await socket.connect()
+        replay = await socket.receive_json_from()
+
+        self.assertEqual([(b["seq"], b["bidder"]) for b in replay["bids"]], [(1, "bob"), (2, "alice")])
+        await socket.disconnect()
+
+    async def test_resume_sees_bids_placed_through_other_paths(self):
+        bidder = self.communicator()
+        await bidder.connect()
+        await bidder.send_json_to({"action": "place_bid", "amount": "11"})
+        await bidder.receive_json_from()
+        bob = await sync_to_async(UserProfile.objects.create_user)("bob")
+        # Another process: the bid never reaches this one's buffer
+        await sync_to_async(bidding.place_bid)(self.auction.pk, bob, "12")
+
+        again = self.communicator(b"last_seen=1")
+        await again.connect()
+        replay = await again.receive_json_from()
+
+        self.assertEqual([(b["seq"], b["bidder"]) for b in replay["bids"]], [(2, "bob")])
+        await bidder.disconnect()
+        await again.disconnect()
+
+    async def test_rejected_bid_goes_back_to_sender_only(self):
+        bidder, watcher = self.communicator(), self.communicator()
+        await bidder.connect()
+        await watcher.connect()
+
+        await bidder.send_json_to({"action": "place_bid", "amount": "1"})
+        reply = await bidder.receive_json_from()
+
+        self.assertEqual(reply["reason"], bidding.TOO_LOW)
+        self.assertTrue(await watcher.receive_nothing())
+        await bidder.disconnect()
+        await watcher.disconnect()
+
+    async def test_bidder_is_the_session_user_and_repeats_are_shed(self):
+        anonymous = self.communicator(user=AnonymousUser())
+        await anonymous.connect()
+        await anonymous.send_json_to({"action": "place_bid", "amount": "50", "user_id": self.alice.pk})
+        self.assertEqual((await anonymous.receive_json_from())["reason"], "unknown_user")
+
+        bidder = self.communicator()
+        await bidder.connect()
+        await bidder.send_json_to({"action": "place_bid", "amount": "11", "key": "a"})
+        self.assertEqual((await bidder.receive_json_from())["amount"], "11.00")
+        await bidder.send_json_to({"action": "place_bid", "amount": "11", "key": "a"})
+        self.assertEqual((await bidder.receive_json_from())["reason"], bidding.DUPLICATE)
+        with override_settings(BID_BURST_PER_USER=0, BID_RATE_PER_USER=0.001):
+            await bidder.send_json_to({"action": "place_bid", "amount": "12", "key": "b"})
+            self.assertEqual((await bidder.receive_json_from())["reason"], bidding.RATE_LIMITED)
+
+        self.assertEqual(await sync_to_async(Bid.objects.count)(), 1)
+        await anonymous.disconnect()
+        await bidder.disconnect()
+
+    @override_settings(BID_COALESCE_WINDOW_MS=50, BID_TRAIL_LENGTH=2)
+    async def test_bids_within_the_window_are_coalesced(self):
+        bidder, watcher = self.communicator(), self.communicator()
+        await bidder.connect()
+        await watcher.connect()
+
+        for amount in ("11", "12", "13"):
+            await bidder.send_json_to({"action": "place_bid", "amount": amount})
+        frame = await watcher.receive_json_from(timeout=2)
+
+        self.assertEqual(frame["type"], "price_update")
+        self.assertEqual((frame["amount"], frame["count"]), ("13.00", 3))
+        self.assertEqual([b["amount"] for b in frame["bids"]], ["12.00", "13.00"])
+        self.assertTrue(await watcher.receive_nothing())
+        await bidder.disconnect()
+        await watcher.disconnect()
+
+    async def test_coalescer_reports_failed_flushes_and_closes(self):
+        groups = []
+
+        class FullLayer:
+            async def group_send(self, group, event):
+                groups.append(group)
+                raise ChannelFull(group)
+
+        coalescer = BidCoalescer(FullLayer(), 0.01, 2)
+        coalescer.add("auction_1", {"amount": "11.00", "bidder": "alice", "created_at": ""})
+        with self.assertLogs("auctions.broadcast", "ERROR"):
+            await asyncio.sleep(0.05)
+
+        coalescer.add("auction_2", {"amount": "12.00", "bidder": "alice", "created_at": ""})
+        coalescer.close()
+        await asyncio.sleep(0.05)
+        self.assertEqual(groups, ["auction_1"])
+
+    async def test_outbox_drops_stale_price_updates_for_a_lagging_client(self):
+        sent, gate = [], asyncio.Event()
+
+        async def slow_send(text_data):
+            await gate.wait()
+            sent.append(text_data)
+
+        outbox = Outbox(slow_send, maxsize=2)
+        outbox.put("p1", droppable=True)
+        await asyncio.sleep(0)  # p1 is now in flight
+        for frame in ("p2", "closed", "p3", "p4"):
+            outbox.put(frame, droppable=frame != "closed")
+        gate.set()
+        await asyncio.sleep(0.01)
+        outbox.close()
+
+        self.assertEqual(sent, ["p1", "closed", "p3", "p4"])
+        self.assertEqual(outbox.dropped, 1)
+
+
+class NotificationSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.auction = make_auction(self.owner)
+
+    def communicator(self, user):
+        app = URLRouter([path("ws/notifications/", NotificationConsumer.as_asgi())])
+        return SocketClient(app, "/ws/notifications/", user=user)
+
+    async def test_anonymous_sockets_are_refused(self):
+        self.assertFalse(await self.communicator(AnonymousUser()).connect())
+
+    async def test_bid_alerts_are_pushed_to_the_owner(self):
+        inbox = self.communicator(self.owner)
+        self.assertTrue(await inbox.connect())
+        self.assertEqual(await inbox.receive_json_from(), {"type": "unread", "count": 0})
+        bidder = SocketClient(
+            URLRouter([path("ws/auction/<int:auction_id>/", AuctionConsumer.as_asgi())]),
+            f"/ws/auction/{self.auction.pk}/",
+            user=self.alice,
+        )
+        await bidder.connect()
+
+        await bidder.send_json_to({"action": "place_bid", "amount": "12"})
+        frame = await inbox.receive_json_from(timeout=2)
+
+        self.assertEqual(frame["type"], "notifications")
+        self.assertEqual(frame["unread_delta"], 1)
+        self.assertEqual(frame["notifications"][0]["message"], "alice placed a bid of ₹12.00 on Lamp")
+        await bidder.disconnect()
+        await inbox.disconnect()
+
+    async def test_one_frame_per_user_per_close(self):
+        inbox = self.communicator(self.alice)
+        await inbox.connect()
+        await inbox.receive_json_from()
+        lots = await sync_to_async(self.expired_lots_won_by_alice)(3)
+        sent = []
+        layer = get_channel_layer()
+        original = layer.group_send
+
+        async def counting_group_send(group, message):
+            sent.append(group)
+            await original(group, message)
+
+        layer.group_send = counting_group_send
+        try:
+            await sync_to_async(close_auctions_batch)([lot.pk for lot in lots])
+            frame = await inbox.receive_json_from(timeout=2)
+        finally:
+            del layer.group_send
+
+        self.assertEqual(frame["unread_delta"], 3)
+        self.assertEqual(sent, [f"user_{self.alice.pk}"])
+        self.assertTrue(await inbox.receive_nothing())
+        await inbox.disconnect()
+
+    def expired_lots_won_by_alice(self, n):
+        lots = [make_auction(self.owner, title=f"Lot {i}") for i in range(n)]
+        for lot in lots:
+            bidding.place_bid(lot.pk, self.alice, "20")
+        Auction.objects.update(ends_at=timezone.now() - timedelta(seconds=1))
+        return lots
+
+
+class SQLiteChannelLayerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "channels.sqlite3")
+
+    async def test_group_send_reaches_channels_of_another_process(self):
+        # Two layer instances on one file stand in for two worker processes.
+        worker_a = SQLiteChannelLayer(path=self.path)
+        worker_b = SQLiteChannelLayer(path=self.path)
+        channel = await worker_a.new_channel()
+        await worker_a.group_add("auction_1", channel)
+
+        await worker_b.group_send("auction_1", {"type": "broadcast", "text": "hi"})
+        message = await asyncio.wait_for(worker_a.receive(channel), 2)
+
+        self.assertEqual(message["text"], "hi")
+        await worker_a.close()
+
+    async def test_group_send_many_delivers_to_each_group(self):
+        layer = SQLiteChannelLayer(path=self.path)
+        first, second = await layer.new_channel(), await layer.new_channel()
+        await layer.group_add("user_1", first)
+        await layer.group_add("user_2", second)
+
+        await layer.group_send_many([("user_1", {"n": 1}), ("user_2", {"n": 2}), ("user_3", {"n": 3})])
+
+        self.assertEqual((await asyncio.wait_for(layer.receive(first), 2))["n"], 1)
+        self.assertEqual((await asyncio.wait_for(layer.receive(second), 2))["n"], 2)
+        await layer.close()
+
+    async def test_capacity_and_discard(self):
+        layer = SQLiteChannelLayer(path=self.path, capacity=2)
+        channel = await layer.new_channel()
+        await layer.send(channel, {"n": 1})
+        await layer.send(channel, {"n": 2})
+        with self.assertRaises(ChannelFull):
+            await layer.send(channel, {"n": 3})
+
+        await layer.group_add("g", channel)
+        await layer.group_discard("g", channel)
+        await layer.group_send("g", {"n": 4})
+        received = [(await asyncio.wait_for(layer.receive(channel), 2))["n"] for _ in range(2)]
+
+        self.assertEqual(received, [1, 2])
+        await layer.close()
+
+    async def test_local_queues_are_bounded_and_dropped(self):
+        layer = SQLiteChannelLayer(path=self.path, capacity=2)
+        channel = await layer.new_channel()
+        await layer.group_add("g", channel)
+        await layer.group_send("g", {"n": 1})
+        self.assertEqual((await asyncio.wait_for(layer.receive(channel), 2))["n"], 1)
+
+        # Polled while no receive() waits: only two fit in the queue
+        for n in (2, 3, 4):
+            await layer.group_send("g", {"n": n})
+            await asyncio.sleep(0.1)
+        received = [(await asyncio.wait_for(layer.receive(channel), 2))["n"] for _ in range(2)]
+        self.assertEqual(received, [2, 3])
+
+        await layer.group_send("g", {"n": 5})
+        await asyncio.sleep(0.1)
+        await layer.group_discard("g", channel)
+        self.assertNotIn(channel, layer._local)
+        await layer.close()
+
+    async def test_unread_local_queue_expires_with_its_memberships(self):
+        layer = SQLiteChannelLayer(path=self.path, expiry=0.2)
+        channel, other = await layer.new_channel(), await layer.new_channel()
+        await layer.group_add("g", channel)
+        await layer.group_add("g", other)
+        await layer.group_send("g", {"n": 1})
+        # The other channel's socket keeps the poller going; this one's has gone away
+        self.assertEqual((await asyncio.wait_for(layer.receive(other), 2))["n"], 1)
+        receiving = asyncio.ensure_future(layer.receive(other))
+        await asyncio.sleep(1)
+
+        self.assertNotIn(channel, layer._local)
+        with closing(sqlite3.connect(self.path)) as db:
+            self.assertEqual(db.execute("SELECT channel FROM groups").fetchall(), [(other,)])
+        receiving.cancel()
+        await layer.close()
+
+    async def test_poller_survives_failed_polls(self):
+        layer = SQLiteChannelLayer(path=self.path)
+        channel = await layer.new_channel()
+        drain = layer._drain_local
+        failures = [sqlite3.OperationalError("database is locked"), sqlite3.DatabaseError("disk I/O error")]
+
+        def flaky_drain(processes):
+            if failures:
+                raise failures.pop(0)
+            return drain(processes)
+
+        layer._drain_local = flaky_drain
+        await layer.send(channel, {"n": 1})
+        with self.assertLogs("auctions.layers", "ERROR"):
+            message = await asyncio.wait_for(layer.receive(channel), 2)
+
+        self.assertEqual(message["n"], 1)
+        self.assertFalse(failures)
+        await layer.close()
+
+
+class KeyedExecutorTests(TestCase):
+    async def test_same_key_same_thread_and_context_follows(self):
+        executor = KeyedExecutor(4, name="test-db")
+        self.addCleanup(executor.shutdown)
+        marker = contextvars.ContextVar("marker")
+        marker.set("caller")
+
+        def where():
+            return threading.current_thread().name, marker.get()
+
+        first, second = [await executor.run(7, where) for _ in range(2)]
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], "caller")
+        self.assertNotEqual(first[0], threading.current_thread().name)
+
+
+@override_settings(DB_REPLICA=True)
+class ReplicaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = UserProfile.objects.create_user("alice")
+        self.factory = RequestFactory()
+
+    def request(self, method="get"):
+        request = getattr(self.factory, method)("/")
+        request.user = self.alice
+        return request
+
+    def test_read_views_use_the_replica_until_the_user_writes(self):
+        router = ReplicaRouter()
+
+        @replica_reads
+        def view(request):
+            return router.db_for_read(Auction), router.db_for_read(Session), router.db_for_write(Auction)
+
+        self.assertEqual(view(self.request()), ("replica", "default", "default"))
+        self.assertEqual(view(self.request("post")), ("default", "default", "default"))
+        self.assertEqual(router.db_for_read(Auction), "default")
+
+        PinWritesMiddleware(lambda request: HttpResponse())(self.request("post"))
+        self.assertEqual(view(self.request()), ("default", "default", "default"))
+        with override_settings(DB_REPLICA=False):
+            cache.clear()
+            self.assertEqual(view(self.request())[0], "default")
+
+    def test_sync_copies_the_primary(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary, replica = (os.path.join(directory.name, name) for name in ("primary.sqlite3", "replica.sqlite3"))
+        with closing(sqlite3.connect(primary)) as db, db:
+            db.execute("PRAGMA journal_mode=wal")
+            db.execute("CREATE TABLE lots (title TEXT)")
+            db.executemany("INSERT INTO lots VALUES (?)", [("Lamp",), ("Chair",)])
+
+        # A bid being written on the primary neither blocks the copy nor gets into it
+        writer = sqlite3.connect(primary, isolation_level=None)
+        self.addCleanup(writer.close)
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("INSERT INTO lots VALUES ('Vase')")
+        self.assertGreater(replicas.sync(primary, replica), 1)
+        writer.execute("ROLLBACK")
+        with closing(sqlite3.connect(replica)) as db:
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM lots").fetchone(), (2,))
+
+        with self.assertRaises(CommandError):
+            call_command("sync_replica")
+
+
+class DatabaseProfileTests(TransactionTestCase):
+    def profiled_connection(self, name, **pragmas):
+        options = settings.DB_PROFILES["production"]["OPTIONS"]
+        wrapper = DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                "NAME": name,
+                "OPTIONS": {**options, "init_pragmas": {**options["init_pragmas"], **pragmas}},
+            },
+            alias="profiled",
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_and_immediate_transactions(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, "profiled.sqlite3")
+        first = self.profiled_connection(name)
+        second = self.profiled_connection(name, busy_timeout=10)
+
+        with first.cursor() as cursor:
+            self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone(), ("wal",))
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone(), (1,))
+
+        # A transaction that has only read still holds the write lock
+        first.set_autocommit(True)
+        first._start_transaction_under_autocommit()
+        with self.assertRaisesRegex(OperationalError, "locked"):
+            second._start_transaction_under_autocommit()
+        first.cursor().execute("ROLLBACK")
+
+    @override_settings(DB_BUSY_RETRIES=3, DB_BUSY_BACKOFF_MS=1)
+    def test_retry_busy(self):
+        calls = []
+
+        @retry_busy
+        def write(failures, message="database is locked"):
+            calls.append(None)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+
+        self.assertEqual(write(2), 3)
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write(4)
+        self.assertEqual(len(calls), 4)
+
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write(1, "no such table: auctions_auction")
+        self.assertEqual(len(calls), 1)
+
+        calls.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write(1)
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(LIVE_BOOK=True, LIVE_BOOK_FLUSH_MS=60000, LIVE_BOOK_FLUSH_BIDS=1000)
+class LiveBookTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = UserProfile.objects.create_user("owner")
+        self.alice = UserProfile.objects.create_user("alice")
+        self.bob = UserProfile.objects.create_user("bob")
+        self.auction = make_auction(self.owner)
+        self.books = livebook.Books()
+        self.book = self.books.get(self.auction.pk)
+
+    def test_bids_are_decided_in_memory_and_written_behind(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.book.offer(self.alice, Decimal("20.00"), timezone.now()).accepted)
+            self.assertEqual(self.book.offer(self.bob, Decimal("15.00"), timezone.now()).reason, bidding.TOO_LOW)
+            self.assertTrue(self.book.offer(self.bob, Decimal("25.00"), timezone.now()).accepted)
+
+        self.books.flush()
+
+        self.auction.refresh_from_db()
+        self.assertEqual((self.auction.current_price, self.auction.bid_count), (Decimal("25.00"), 2))
+        self.assertEqual(self.auction.leading_bidder, self.bob)
+        self.assertEqual(Bid.objects.filter(auction=self.auction).count(), 2)
+        self.assertTrue(Notification.objects.filter(user=self.alice, message__contains="outbid").exists())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.tenders_placed, 1)
+
+    def test_a_changed_row_replays_the_waiting_bids(self):
+        sent = []
+        self.addCleanup(setattr, livebook, "send_from_thread", livebook.send_from_thread)
+        livebook.send_from_thread = sent.extend
+        self.book.offer(self.alice, Decimal("20.00"), timezone.now())
+        # A bid the book never saw, as from another process
+        bidding.place_bid(self.auction.pk, self.bob, "30")
+
+        with self.assertLogs("auctions.livebook", "WARNING"):
+            self.books.flush()
+
+        self.auction.refresh_from_db()
+        self.assertEqual((self.auction.current_price, self.auction.bid_count), (Decimal("30.00"), 1))
+        self.assertIsNone(self.books.peek(self.auction.pk))
+        # Alice was told her bid was accepted; she and the watchers learn it did not stand
+        self.assertTrue(Notification.objects.filter(user=self.alice, message__contains="could not be kept").exists())
+        (group, event), = sent
+        frame = json.loads(event["text"])
+        self.assertEqual(group, f"auction_{self.auction.pk}")
+        self.assertEqual(frame["type"], "bids_retracted")
+        self.assertEqual([(b["bidder"], b["reason"]) for b in frame["bids"]], [("alice", bidding.TOO_LOW)])
+        self.assertEqual((frame["amount"], frame["bidder"], frame["seq"]), ("30.00", "bob", 1))
+
+    def test_last_moments_go_to_the_database_and_ended_books_are_dropped(self):
+        self.addCleanup(setattr, livebook, "books", livebook.books)
+        livebook.books = self.books
+        ends_at = timezone.now() + timedelta(seconds=30)
+        Auction.objects.filter(pk=self.auction.pk).update(ends_at=ends_at)
+        self.book.ends_at = ends_at
+        self.book.offer(self.alice, Decimal("20.00"), ends_at - timedelta(minutes=5))
+
+        # Within LIVE_BOOK_FLUSH_MS of the end: written through, without reloading the book
+        self.assertTrue(livebook.place_bid(self.auction.pk, self.bob, "25").accepted)
+        self.assertEqual(livebook.place_bid(self.auction.pk, self.alice, "22").reason, bidding.TOO_LOW)
+        self.assertIs(self.books.peek(self.auction.pk), self.book)
+        self.assertQuerysetEqual(
+            Bid.objects.filter(auction=self.auction).order_by("amount").values_list("amount", flat=True),
+            [Decimal("20.00"), Decimal("25.00")],
+        )
+
+        self.books.evict_ended(ends_at)
+        self.assertIsNone(self.books.peek(self.auction.pk))
+
+    def test_a_new_process_recovers_from_the_database(self):
+        self.book.offer(self.alice, Decimal("20.00"), timezone.now())
+        self.books.flush()
+
+        book = livebook.Books().get(self.auction.pk)
+
+        self.assertEqual((book.price, book.count, book.leader_id), (Decimal("20.00"), 1, self.alice.pk))
+        self.assertEqual([bid.amount for bid in book.recent], [Decimal("20.00")])
+
+
+class EventLogTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(self.join_snapshot_threads)
+        self.directory = directory.name
+
+    def join_snapshot_threads(self):
+        for thread in threading.enumerate():
+            if thread.name == "event-log-snapshot":
+                thread.join()
+
+    def test_events_since_reads_a_bounded_stretch_of_the_log(self):
+        with self.settings(EVENT_LOG=True, EVENT_LOG_DIR=self.directory, EVENT_LOG_SCAN_LIMIT=4):
+            log = eventlog.get_log()
+            for auction_id in (2, 2, 2, 2, 2, 2, 1):
+                log.append({"type": eventlog.BID_PLACED, "auction": auction_id, "bidder": 1, "amount": "5.00"})
+            consumer = AuctionConsumer()
+            consumer.auction_id = 1
+
+            quiet = consumer.events_since(0)
+            rest = consumer.events_since(quiet["next_offset"])
+
+        self.assertEqual((quiet["events"], quiet["next_offset"]), ([], 4))
+        self.assertEqual(([event["offset"] for event in rest["events"]], rest["next_offset"]), ([6], 7))
+
+    def test_offsets_run_across_segments_and_torn_records_are_cut(self):
+        log = eventlog.EventLog(self.directory, segment_bytes=200)
+        bid = {"type": eventlog.BID_PLACED, "auction": 1, "bidder": 1, "amount": "5.00"}
+        offsets = [log.append(dict(bid, n=n)) for n in range(10)]
+        self.join_snapshot_threads()
+
+        self.assertEqual(offsets, list(range(10)))
+        self.assertGreater(len(log.segments()), 1)
+        self.assertEqual([event["n"] for _, event in log.read(7)], [7, 8, 9])
+        self.assertTrue(os.listdir(os.path.join(self.directory, "snapshots")))
+
+        # A crash halfway through a record
+        with open(log._segment_path(log.segments()[-1]), "ab") as fh:
+            fh.write(b"\x50\x00\x00\x00garbage")
+        other_process = eventlog.EventLog(self.directory, segment_bytes=200)
+        with self.assertLogs("auctions.eventlog", "WARNING"):
+            self.assertEqual(other_process.append(dict(bid, n=10)), 10)
+        self.assertEqual([event["n"] for _, event in log.read(9)], [9, 10])
+
+    def test_replay_rebuilds_counters(self):
+        with override_settings(EVENT_LOG=True, EVENT_LOG_DIR=self.directory):
+            owner = UserProfile.objects.create_user("owner")
+            alice = UserProfile.objects.create_user("alice")
+            bob = UserProfile.objects.create_user("bob")
+            auction = make_auction(owner)
+            bidding.place_bid(auction.pk, alice, "20")
+            bidding.place_bid(auction.pk, bob, "30")
+            Auction.objects.filter(pk=auction.pk).update(ends_at=timezone.now() - timedelta(seconds=1))
+            close_auctions_batch([auction.pk])
+
+            Auction.objects.filter(pk=auction.pk).update(current_price=0, bid_count=0, is_active=True)
+            UserProfile.objects.update(tenders_placed=0, auctions_won=0)
+            call_command("replay_events", stdout=StringIO())
+
+        auction.refresh_from_db()
+        bob.refresh_from_db()
+        self.assertEqual((auction.current_price, auction.bid_count, auction.is_active), (Decimal("30.00"), 2, False))
+        self.assertEqual((bob.tenders_placed, bob.auctions_won), (1, 1))
+
+    def test_replay_keeps_the_highest_bid_whatever_the_log_order(self):
+        with override_settings(EVENT_LOG=True, EVENT_LOG_DIR=self.directory):
+            owner = UserProfile.objects.create_user("owner")
+            alice = UserProfile.objects.create_user("alice")
+            bob = UserProfile.objects.create_user("bob")
+            auction = make_auction(owner)
+            bidding.place_bid(auction.pk, alice, "20")
+            bidding.place_bid(auction.pk, bob, "30")
+            created, alices, bobs = (event for _, event in eventlog.get_log().read(0))
+
+        # As if bob's commit callback had beaten alice's to the log
+        reordered = os.path.join(self.directory, "reordered")
+        log = eventlog.EventLog(reordered)
+        for event in (created, bobs, alices):
+            log.append(event)
+        with override_settings(EVENT_LOG=True, EVENT_LOG_DIR=reordered):
+            call_command("replay_events", stdout=StringIO())
+
+        auction.refresh_from_db()
+        self.assertEqual((auction.current_price, auction.bid_count), (Decimal("30.00"), 2))
+        self.assertEqual(auction.leading_bidder, bob)
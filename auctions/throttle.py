@@ -0,0 +1,243 @@
+# auctions/throttle.py
+"""
+Admission control in front of the bid path.
+
+Both ways in, the detail page's POST and a socket's place_bid, call check()
+before anything queries the database. A bid is turned away when:
+
+* it carries an idempotency key that the same bidder already used in the last
+  BID_IDEMPOTENCY_SECONDS: a double-clicked form, or a socket client sending
+  a bid again. The form renders a fresh key each time; socket clients send
+  one along with each bid. This is checked first, so a repeat costs no tokens.
+* its bidder or its auction is out of tokens. Each has a token bucket of
+  BID_BURST_PER_USER / BID_BURST_PER_AUCTION tokens, refilled at
+  BID_RATE_PER_USER / BID_RATE_PER_AUCTION tokens a second, and a bid takes
+  one from each, only once both have one: a bid the auction's bucket turns
+  away costs its bidder nothing. A bid turned away by the buckets does not
+  use up its key either, so it can be retried as it is.
+
+Buckets and keys are kept in this process, at most MAX_ENTRIES of each, the
+least recently used dropped first. With BID_RATE_CACHE set they go to that
+cache instead, shared between processes; a bucket is then read and written
+back without a lock, so bids racing on the same bucket can spend the same
+token and the limit only holds approximately.
+
+stats() counts the bids let through and turned away on each path, per
+reason; /_perf/ shows them for the serving process.
+"""
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .bidding import DUPLICATE, RATE_LIMITED
+
+MAX_ENTRIES = 100_000
+ADMITTED = "admitted"
+# Longer keys are cut; they only have to tell one submission from another
+MAX_KEY_LENGTH = 64
+
+
+class Buckets:
+    """Token buckets in this process, one per key."""
+
+    def __init__(self, rate, burst, max_entries=MAX_ENTRIES):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (tokens, when they were counted), least recently used first
+        self._buckets = OrderedDict()
+
+    def _tokens(self, key, now):
+        tokens, counted = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - counted) * self.rate)
+
+    def has(self, key, now=None):
+        """Whether the key's bucket holds a token, without taking it."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._tokens(key, now) >= 1
+
+    def take(self, key, now=None):
+        """Takes a token from the key's bucket; False if there was none left."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._tokens(key, now)
+            allowed = tokens >= 1
+            self._buckets.pop(key, None)
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return allowed
+
+
+class CacheBuckets:
+    """Token buckets in a shared cache; approximate, see the module docstring."""
+
+    def __init__(self, rate, burst, cache, prefix):
+        self.rate = rate
+        self.burst = burst
+        self.cache = cache
+        self.prefix = prefix
+        # Long enough for an untouched bucket to have filled up again
+        self.timeout = math.ceil(burst / rate) + 1
+
+    def _tokens(self, cache_key, now):
+        tokens, counted = self.cache.get(cache_key) or (self.burst, now)
+        return min(self.burst, tokens + (now - counted) * self.rate)
+
+    def has(self, key, now=None):
+        now = time.time() if now is None else now
+        return self._tokens(f"{self.prefix}:{key}", now) >= 1
+
+    def take(self, key, now=None):
+        now = time.time() if now is None else now
+        cache_key = f"{self.prefix}:{key}"
+        tokens = self._tokens(cache_key, now)
+        allowed = tokens >= 1
+        self.cache.set(cache_key, (tokens - 1 if allowed else tokens, now), self.timeout)
+        return allowed
+
+
+class SeenKeys:
+    """Idempotency keys used in the last `ttl` seconds, in this process."""
+
+    def __init__(self, ttl, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> expiry; every key lives as long, so the oldest expire first
+        self._keys = OrderedDict()
+
+    def add(self, key, now=None):
+        """Records the key; False if it was already there."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._keys and next(iter(self._keys.values())) <= now:
+                self._keys.popitem(last=False)
+            if key in self._keys:
+                return False
+            self._keys[key] = now + self.ttl
+            if len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+        return True
+
+    def discard(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+
+
+class CacheSeenKeys:
+    """Idempotency keys in a shared cache; cache.add is atomic in the shared backends."""
+
+    def __init__(self, ttl, cache, prefix="bid-key"):
+        self.ttl = ttl
+        self.cache = cache
+        self.prefix = prefix
+
+    def add(self, key, now=None):
+        return self.cache.add(f"{self.prefix}:{key}", True, self.ttl)
+
+    def discard(self, key):
+        self.cache.delete(f"{self.prefix}:{key}")
+
+
+class Admission:
+    """The buckets, keys and counts for one set of settings."""
+
+    def __init__(self, config):
+        self.config = config
+        user_rate, user_burst, auction_rate, auction_burst, cache_alias, ttl = config
+        cache = caches[cache_alias] if cache_alias else None
+
+        def buckets(rate, burst, prefix):
+            if not rate:
+                return None
+            return CacheBuckets(rate, burst, cache, prefix) if cache is not None else Buckets(rate, burst)
+
+        self.users = buckets(user_rate, user_burst, "bid-rate:user")
+        self.auctions = buckets(auction_rate, auction_burst, "bid-rate:auction")
+        self.keys = None
+        if ttl:
+            self.keys = CacheSeenKeys(ttl, cache) if cache is not None else SeenKeys(ttl)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def check(self, user_id, auction_id, key=None, path="http"):
+        seen = f"{user_id}:{str(key)[:MAX_KEY_LENGTH]}" if key and self.keys is not None else None
+        buckets = [(b, k) for b, k in ((self.users, user_id), (self.auctions, auction_id)) if b is not None]
+        if seen is not None and not self.keys.add(seen):
+            reason = DUPLICATE
+        elif not all(bucket.has(k) for bucket, k in buckets):
+            reason = RATE_LIMITED
+        else:
+            # A racing bid can still spend a last token in between; then this one loses
+            reason = None if all([bucket.take(k) for bucket, k in buckets]) else RATE_LIMITED
+        if reason == RATE_LIMITED and seen is not None:
+            self.keys.discard(seen)
+        with self._lock:
+            self._counts[path, reason or ADMITTED] += 1
+        return reason
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        out = {}
+        for path in sorted({path for path, _ in counts}):
+            row = {reason: counts.get((path, reason), 0) for reason in (ADMITTED, RATE_LIMITED, DUPLICATE)}
+            total = sum(row.values())
+            row["shed_ratio"] = round((total - row[ADMITTED]) / total, 4) if total else 0.0
+            out[path] = row
+        return out
+
+
+_lock = threading.Lock()
+_admission = None
+
+
+def _config():
+    return (
+        settings.BID_RATE_PER_USER,
+        settings.BID_BURST_PER_USER,
+        settings.BID_RATE_PER_AUCTION,
+        settings.BID_BURST_PER_AUCTION,
+        settings.BID_RATE_CACHE,
+        settings.BID_IDEMPOTENCY_SECONDS,
+    )
+
+
+def admission():
+    """The process's Admission, built again (counts included) when the settings change."""
+    global _admission
+    config = _config()
+    current = _admission
+    if current is None or current.config != config:
+        with _lock:
+            if _admission is None or _admission.config != config:
+                _admission = Admission(config)
+            current = _admission
+    return current
+
+
+def check(user_id, auction_id, key=None, path="http"):
+    """
+    None if the bid may go on to place_bid, otherwise why it was turned away:
+    bidding.RATE_LIMITED or bidding.DUPLICATE. `path` ("http" or "ws") is
+    only used to count it.
+    """
+    return admission().check(user_id, auction_id, key, path)
+
+
+def stats():
+    """{path: {"admitted": n, "rate_limited": n, "duplicate": n, "shed_ratio": x}}"""
+    return admission().stats()
+
+
+def reset():
+    global _admission
+    with _lock:
+        _admission = None
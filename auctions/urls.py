@@ -1,19 +1,28 @@
 # auctions/urls.py
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = "auctions"
 
 urlpatterns = [
     path("", views.home, name="home"),
     path("listing/", views.listing, name="listing"),
+    path("search/", views.search, name="search"),
     path("auction/<int:pk>/", views.detail, name="detail"),
     path("auction/<int:pk>/delete/", views.auction_delete, name="auction_delete"),
     path("bids/", views.bids, name="bids"),
     path("vendue/", views.vendue, name="vendue"),
     path("alerts/", views.alerts, name="alerts"),
+    path("alerts/read/", views.alerts_read, name="alerts_read"),
     path("account/", views.account, name="account"),
     path("login/", views.user_login, name="login"),
     path("logout/", views.user_logout, name="logout"),
     path("register/", views.user_register, name="register"),
+    path("_perf/", views.perf_stats, name="perf"),
+    path("_export/<str:kind>/", views.export, name="export"),
+    path("api/auctions/", api.AuctionList.as_view(), name="api_auctions"),
+    path("api/auctions/<int:pk>/", api.AuctionDetail.as_view(), name="api_auction"),
+    path("api/auctions/<int:pk>/bids/", api.AuctionBids.as_view(), name="api_auction_bids"),
+    path("api/me/bids/", api.MyBids.as_view(), name="api_my_bids"),
+    path("api/me/notifications/", api.MyNotifications.as_view(), name="api_my_notifications"),
 ]
@@ -1,66 +1,174 @@
+from collections import Counter, defaultdict
 from django.utils import timezone
-from django.db import transaction, models
-from .models import Auction, Bid, Notification, UserProfile
+from django.db import connection, transaction, models
+from . import counters, eventlog
+from .notifications import notify
+from .sqlite import retry_busy
+from .models import Auction, Bid, Notification
 
-def process_expired_auctions():
+
+def compute_bid_stats(auctions=None):
+    """
+    Recomputes (current_price, bid_count, leading_bidder_id) from the Bid table
+    for the given auction queryset (all auctions by default), keyed by auction id.
+    """
+    if auctions is None:
+        auctions = Auction.objects.all()
+    # Highest amount first; on a tie the earliest bid keeps the lead.
+    leader = Bid.objects.filter(auction=models.OuterRef("pk")).order_by("-amount", "id")
+    rows = auctions.order_by().annotate(
+        top=models.Max("bids__amount"),
+        n=models.Count("bids"),
+        leader_id=models.Subquery(leader.values("bidder_id")[:1]),
+    ).values_list("pk", "base_price", "top", "n", "leader_id")
+
+    return {
+        pk: (top if n else base_price, n, leader_id)
+        for pk, base_price, top, n, leader_id in rows
+    }
+
+
+def process_expired_auctions(batch_size=None):
     """
     Checks for active auctions that have passed their end time.
     Closes them (sets is_active=False), determines the winner,
     sends notifications, and updates user stats.
+    With batch_size, closes up to that many auctions per transaction
+    using close_auctions_batch instead of one transaction per auction.
+    Returns the ids of the auctions that were closed.
     """
     now = timezone.now()
     # Filter for active auctions that have expired
-    expired_auctions = Auction.objects.filter(is_active=True, ends_at__lt=now)
+    expired_ids = list(Auction.objects.filter(is_active=True, ends_at__lt=now).values_list("pk", flat=True))
+    if not batch_size:
+        return close_auctions(expired_ids)
+
+    closed = []
+    for start in range(0, len(expired_ids), batch_size):
+        closed.extend(close_auctions_batch(expired_ids[start:start + batch_size]))
+    return closed
 
-    for auction in expired_auctions:
+
+def close_auctions(auction_ids):
+    """
+    Closes the given auctions if they are still active and have expired.
+    Returns the ids of the auctions that were actually closed by this call.
+    """
+    closed = []
+    for auction_id in auction_ids:
         # Use atomic transaction to ensure data integrity
         with transaction.atomic():
-            # Re-fetch the auction to ensure strict consistency (lock logic available if using select_for_update)
-            # For this simple case, checking is_active again after lock or just here is safer.
-            # Using select_for_update would be better for high concurrency, but let's stick to simple safe logic first.
-            # We want to lock this row.
-            curr_auction = Auction.objects.select_for_update().filter(pk=auction.pk).first()
-            
-            if not curr_auction or not curr_auction.is_active:
+            # Claim the auction with a conditional UPDATE before reading it, so a
+            # second closer (or a late bid) cannot act on the same row in between.
+            # Only the flag is written so the bid counters stay untouched.
+            claimed = Auction.objects.filter(
+                pk=auction_id, is_active=True, ends_at__lte=timezone.now()
+            ).update(is_active=False, version=models.F("version") + 1)
+            if not claimed:
                 continue
 
-            # Mark as inactive/completed
-            curr_auction.is_active = False
-            curr_auction.save()
+            curr_auction = Auction.objects.get(pk=auction_id)
+            closed.append(curr_auction.pk)
+            eventlog.record_after_commit(
+                eventlog.AUCTION_CLOSED, curr_auction.pk, winner=curr_auction.leading_bidder_id
+            )
 
-            # Determine the highest bidder
-            highest_bid = curr_auction.bids.order_by("-amount").first()
-
-            if highest_bid:
-                winner = highest_bid.bidder
-                winning_amount = highest_bid.amount
+            # The highest bidder is tracked on the auction row itself
+            if curr_auction.leading_bidder_id:
+                winner = curr_auction.leading_bidder
+                winning_amount = curr_auction.current_price
 
                 # 1. Update Winner's "Won" stat
-                # We also lock the user row to safely increment
-                UserProfile.objects.filter(pk=winner.pk).update(auctions_won=models.F('auctions_won') + 1)
+                counters.add("auctions_won", {winner.pk: 1})
                 
                 # 2. Send "You won" alert
-                Notification.objects.create(
+                notifications = [Notification(
                     user=winner,
                     message=f"You won the auction '{curr_auction.title}' with a bid of {winning_amount}!"
-                )
+                )]
 
                 # 3. Send "You lost" alerts to other unique bidders
                 # Find all other bidders
                 loser_ids = curr_auction.bids.exclude(bidder=winner).values_list('bidder', flat=True).distinct()
                 
-                # Bulk create notifications might be more efficient, but let's loop for simplicity
-                notifications = []
                 for uid in loser_ids:
                     notifications.append(Notification(
                         user_id=uid,
                         message=f"You lost the auction '{curr_auction.title}'."
                     ))
                 
-                if notifications:
-                    Notification.objects.bulk_create(notifications)
+                # Inserted together, bumping each user's unread counter
+                notify(notifications)
             
             else:
                 # No bids were placed.
                 # Auction closes without a winner.
                 pass
+
+    return closed
+
+
+class _BatchConflict(Exception):
+    pass
+
+
+@retry_busy
+def close_auctions_batch(auction_ids):
+    """
+    Set-based version of close_auctions: closes all the given auctions that are
+    still active and expired in a single transaction with a fixed number of queries.
+
+    Winners come straight from the denormalized leading_bidder column, losers from
+    one DISTINCT query over the bids, auctions_won is bumped with one UPDATE per
+    distinct win count, and all notifications are inserted with one bulk_create.
+    If another closer touched any of the rows in the meantime the batch is rolled
+    back and the auctions are closed one by one instead.
+    """
+    if not auction_ids:
+        return []
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            candidates = Auction.objects.filter(pk__in=auction_ids, is_active=True, ends_at__lte=now)
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            rows = list(candidates.values_list("pk", "title", "current_price", "leading_bidder_id"))
+            if not rows:
+                return []
+            ids = [pk for pk, _, _, _ in rows]
+
+            # Flip them all at once; a short count means we raced another closer.
+            flipped = Auction.objects.filter(pk__in=ids, is_active=True).update(
+                is_active=False, version=models.F("version") + 1
+            )
+            if flipped != len(ids):
+                raise _BatchConflict
+
+            winners = {pk: leader_id for pk, _, _, leader_id in rows if leader_id}
+            bidders = defaultdict(set)
+            for auction_id, bidder_id in (
+                Bid.objects.filter(auction_id__in=winners).values_list("auction_id", "bidder_id").distinct()
+            ):
+                bidders[auction_id].add(bidder_id)
+
+            # 1. Update winners' "Won" stat
+            counters.add("auctions_won", Counter(winners.values()))
+
+            # 2. and 3. "You won" / "You lost" alerts for every closed auction
+            notifications = []
+            for pk, title, price, leader_id in rows:
+                if not leader_id:
+                    continue
+                notifications.append(Notification(
+                    user_id=leader_id,
+                    message=f"You won the auction '{title}' with a bid of {price}!"
+                ))
+                for uid in bidders[pk] - {leader_id}:
+                    notifications.append(Notification(user_id=uid, message=f"You lost the auction '{title}'."))
+            notify(notifications, batch_size=500)
+            for pk, _, _, leader_id in rows:
+                eventlog.record_after_commit(eventlog.AUCTION_CLOSED, pk, winner=leader_id)
+    except _BatchConflict:
+        return close_auctions(auction_ids)
+
+    return ids
@@ -1,13 +1,24 @@
 # auctions/views.py
-from decimal import Decimal, InvalidOperation
+import os
+import uuid
 from datetime import timedelta
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.contrib import messages
-from django.http import HttpResponseForbidden, HttpResponseNotAllowed
-from .models import Auction, Bid, Notification, Vendue, UserProfile
-from .utils import process_expired_auctions
+from django.http import (
+    Http404, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse,
+    StreamingHttpResponse,
+)
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from .models import Auction, Notification
+from .bidding import place_bid, BidResult, DUPLICATE, NOT_FOUND
+from .pagination import keyset_paginate
+from .replicas import replica_reads
+from .search import ranked_page, search_auctions
+from . import counters, exports, livebook, notifications, perf, throttle
+from .broadcast import bid_frame, send_bid_from_thread
 
 from .forms import VendueForm, RegisterForm
 from django.contrib.auth import login, authenticate, logout
@@ -16,82 +27,93 @@ def home(request):
     return render(request, "auctions/home.html")
 
 
-@login_required(login_url='/login/')
-def listing(request):
-    process_expired_auctions()
-    qs = Auction.objects.filter(is_active=True)
+def listing_queryset(params):
+    """
+    Active auctions filtered by the listing's GET parameters
+    (category, price_min, price_max).
+    """
+    # Auctions past their end time are hidden even before the closer gets to them
+    qs = Auction.objects.filter(is_active=True, ends_at__gt=timezone.now())
 
-    cat = request.GET.get("category")
+    cat = params.get("category")
     if cat:
         qs = qs.filter(category=cat)
 
-    pmin = request.GET.get("price_min")
-    pmax = request.GET.get("price_max")
+    pmin = params.get("price_min")
+    pmax = params.get("price_max")
 
     if pmin:
         qs = qs.filter(base_price__gte=pmin)
     if pmax:
         qs = qs.filter(base_price__lte=pmax)
 
-    return render(request, "auctions/listing.html", {"auctions": qs})
+    return qs
 
 
 @login_required(login_url='/login/')
-def detail(request, pk):
-    process_expired_auctions()
-    auction = get_object_or_404(Auction, pk=pk)
+@replica_reads
+def listing(request):
+    page = keyset_paginate(listing_queryset(request.GET), ("ends_at", "id"), request.GET)
+    return render(request, "auctions/listing.html", {"auctions": page, "page": page})
+
+
+@login_required(login_url='/login/')
+@replica_reads
+def search(request):
+    """Full-text search over the listing, best match first, with the listing's filters."""
+    q = request.GET.get("q", "").strip()
+    page = ranked_page(search_auctions(listing_queryset(request.GET), q), request.GET)
+    return render(request, "auctions/search.html", {
+        "auctions": page,
+        "page": page,
+        "q": q,
+        "categories": Auction.CATEGORY_CHOICES,
+    })
 
+
+@login_required(login_url='/login/')
+def detail(request, pk):
     # Handle POST = placing a bid
     if request.method == "POST" and request.user.is_authenticated:
-        # Prevent owner from bidding on their own auction
-        if auction.owner == request.user:
-            messages.error(request, "You cannot bid on your own auction.")
-            return redirect("auctions:detail", pk=pk)
-
         raw_amount = request.POST.get("amount")
         if not raw_amount:
             messages.error(request, "Please enter a bid amount.")
             return redirect("auctions:detail", pk=pk)
 
-        try:
-            amount = Decimal(raw_amount)
-        except (InvalidOperation, ValueError):
-            messages.error(request, "Invalid bid amount.")
+        # Turned away before any query about the auction
+        refused = throttle.check(request.user.pk, pk, request.POST.get("idempotency_key"))
+        if refused == DUPLICATE:
+            # A double submission; the first one goes through as usual
+            messages.info(request, BidResult(refused).message)
             return redirect("auctions:detail", pk=pk)
-
-        # ensure auction is still active and hasn't ended
-        if not auction.is_active or auction.time_remaining_seconds <= 0:
-            messages.error(request, "This auction is no longer active.")
-            return redirect("auctions:detail", pk=pk)
-
-        current = Decimal(auction.current_bid)
-        # require strictly greater than current bid
-        if amount <= current:
-            messages.error(request, f"Your bid must be greater than the current bid (₹{current}).")
+        if refused:
+            messages.error(request, BidResult(refused).message)
             return redirect("auctions:detail", pk=pk)
 
-        # create and save bid
-        bid = Bid(auction=auction, bidder=request.user, amount=amount)
-        bid.save()
-
-        # optional: increment quick counter on user profile (keeps an at-a-glance stat)
-        # increment tenders_placed atomically
-        if isinstance(request.user, UserProfile):
-            from django.db.models import F
-            UserProfile.objects.filter(pk=request.user.pk).update(tenders_placed=F("tenders_placed") + 1)
-
-        messages.success(request, f"Bid placed: ₹{amount} — good luck!")
+        submit = livebook.place_bid if settings.LIVE_BOOK else place_bid
+        result = submit(pk, request.user, raw_amount)
+        if result.reason == NOT_FOUND:
+            raise Http404("No Auction matches the given query.")
+        if result.accepted:
+            send_bid_from_thread(pk, bid_frame(request.user.username, result))
+            messages.success(request, result.message)
+        else:
+            messages.error(request, result.message)
         return redirect("auctions:detail", pk=pk)
 
+    auction = get_object_or_404(Auction, pk=pk)
     # GET -> show detail page
-    return render(request, "auctions/detail.html", {"auction": auction})
+    # A fresh key per rendered form, so submitting it twice places one bid
+    return render(request, "auctions/detail.html", {"auction": auction, "bid_key": uuid.uuid4().hex})
 
 
 @login_required(login_url='/login/')
+@replica_reads
 def bids(request):
     # show bids created by the logged-in user with auction info
-    participated = request.user.bids.select_related("auction").order_by("-created_at")
-    return render(request, "auctions/bids.html", {"bids": participated})
+    participated = request.user.bids.select_related("auction")
+    page = keyset_paginate(participated, ("-created_at", "-id"), request.GET)
+    return render(request, "auctions/bids.html", {"bids": page, "page": page})
 
 
 @login_required(login_url='/login/')
@@ -103,11 +125,7 @@ def vendue(request):
             vendue.seller = request.user
             vendue.save()
 
-            # optional quick counter
-            # increment vendues_created atomically
-            if isinstance(request.user, UserProfile):
-                from django.db.models import F
-                UserProfile.objects.filter(pk=request.user.pk).update(vendues_created=F("vendues_created") + 1)
+            counters.add("vendues_created", {request.user.pk: 1})
 
             # Create Auction from Vendue
             ends_at = timezone.now() + timedelta(minutes=vendue.duration_minutes)
@@ -131,10 +149,31 @@ def vendue(request):
 
 
 @login_required(login_url='/login/')
+@replica_reads
 def alerts(request):
-    process_expired_auctions()
-    notes = Notification.objects.filter(user=request.user).order_by("-created_at")
-    return render(request, "auctions/alerts.html", {"notifications": notes})
+    notes = Notification.objects.filter(user=request.user)
+    page = keyset_paginate(notes, ("-created_at", "-id"), request.GET)
+    return render(request, "auctions/alerts.html", {"notifications": page, "page": page})
+
+
+@login_required(login_url='/login/')
+def alerts_read(request):
+    """
+    Marks the posted notification ids read, or all of the user's alerts with
+    all=1, in one UPDATE. Answers JSON when asked for it, else goes back to alerts.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    if request.POST.get("all"):
+        ids = None
+    else:
+        ids = [int(pk) for pk in request.POST.getlist("id") if pk.isdigit()]
+    marked = notifications.mark_read(request.user, ids) if ids != [] else 0
+
+    if "application/json" in request.headers.get("Accept", ""):
+        return JsonResponse({"marked": marked, "unread": request.user.unread_notifications})
+    return redirect("auctions:alerts")
 
 
 @login_required(login_url='/login/')
@@ -142,14 +181,8 @@ def account(request):
     """
     Shows user stats from persisted counters.
     """
-    process_expired_auctions()
-    user = request.user
-
-    context = {
-        "vendues_created": user.vendues_created,
-        "tenders_placed": user.tenders_placed,
-        "auctions_won": user.auctions_won,
-    }
+    # Folded columns plus any increments still waiting in the delta table
+    context = counters.totals(request.user.pk)
     return render(request, "auctions/account.html", context)
 
 
@@ -206,3 +239,36 @@ def auction_delete(request, pk):
     auction.delete()
     messages.success(request, "Auction removed.")
     return redirect("auctions:listing")
+
+
+@staff_member_required
+def perf_stats(request):
+    """Live profiling numbers of the process serving this request (see auctions/perf.py)."""
+    return JsonResponse({
+        "enabled": settings.PERF_INSTRUMENTATION,
+        "pid": os.getpid(),
+        "endpoints": perf.report(perf.registry.snapshot()),
+        "bid_admission": throttle.stats(),
+    })
+
+
+@staff_member_required
+def export(request, kind):
+    """
+    Streams an export (see auctions/exports.py): ?format=csv|ndjson, since,
+    until, auction (repeatable) and category.
+    """
+    fmt = request.GET.get("format", "csv")
+    if kind not in exports.COLUMNS or fmt not in exports.FORMATS:
+        raise Http404("No such export.")
+    try:
+        since = exports.parse_moment(request.GET.get("since"))
+        until = exports.parse_moment(request.GET.get("until"), end_of_day=True)
+        auction_ids = [int(pk) for pk in request.GET.getlist("auction")]
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    qs = exports.queryset(kind, since, until, auction_ids, request.GET.get("category"))
+    response = StreamingHttpResponse(exports.stream(kind, fmt, qs), content_type=exports.FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{kind}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"'
+    return response
@@ -0,0 +1,94 @@
+# benchmarks/bench_async_bids.py
+"""
+Bid throughput of the WebSocket path as the number of concurrently active
+auctions grows: every bid through sync_to_async (one thread for the whole
+process) against the per-auction DB threads of auctions/executors.py.
+
+    python -m benchmarks.bench_async_bids --bids 1000 --sockets 32 --threads 4
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import throwaway_database
+
+from asgiref.sync import sync_to_async  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from auctions.bidding import place_bid  # noqa: E402
+from auctions.executors import KeyedExecutor  # noqa: E402
+from auctions.models import Auction, Bid, Notification, UserProfile  # noqa: E402
+
+
+def seed(n_auctions, n_users):
+    Notification.objects.all().delete()
+    Bid.objects.all().delete()
+    Auction.objects.all().delete()
+    UserProfile.objects.all().delete()
+
+    owner = UserProfile.objects.create(username="owner")
+    users = UserProfile.objects.bulk_create([UserProfile(username=f"bench{i}") for i in range(n_users)])
+    ends_at = timezone.now() + timedelta(hours=1)
+    auctions = Auction.objects.bulk_create([
+        Auction(title=f"Lot {i}", description="", owner=owner, base_price=1, current_price=1, ends_at=ends_at)
+        for i in range(n_auctions)
+    ])
+    return users, [auction.pk for auction in auctions]
+
+
+async def drive(run, users, auction_ids, n_bids, n_sockets):
+    """n_sockets concurrent bidders, each bound to one auction, placing n_bids in total."""
+    remaining = itertools.count()
+    prices = {pk: itertools.count(2) for pk in auction_ids}
+    accepted = 0
+
+    async def socket(i):
+        nonlocal accepted
+        auction_id = auction_ids[i % len(auction_ids)]
+        bidder = users[i]
+        while next(remaining) < n_bids:
+            result = await run(auction_id, place_bid, auction_id, bidder, str(next(prices[auction_id])))
+            accepted += result.accepted
+
+    start = time.perf_counter()
+    await asyncio.gather(*(socket(i) for i in range(n_sockets)))
+    return time.perf_counter() - start, accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bids", type=int, default=1000)
+    parser.add_argument("--sockets", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--auctions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    single = sync_to_async(lambda fn, *a: fn(*a))
+    keyed = KeyedExecutor(args.threads, name="bench-db")
+    modes = {
+        "sync_to_async": lambda key, fn, *a: single(fn, *a),
+        f"{args.threads} DB threads": keyed.run,
+    }
+
+    rows = []
+    with throwaway_database():
+        for n_auctions in args.auctions:
+            row = [n_auctions]
+            for run in modes.values():
+                users, auction_ids = seed(n_auctions, args.sockets)
+                elapsed, accepted = asyncio.run(drive(run, users, auction_ids, args.bids, args.sockets))
+                row.append((args.bids / elapsed, accepted))
+            rows.append(row)
+    keyed.shutdown()
+
+    print(f"{args.bids} bids from {args.sockets} sockets, bids/s (accepted)")
+    print(f"  {'auctions':>8}" + "".join(f"  {label:>22}" for label in modes))
+    for n_auctions, *cells in rows:
+        print(f"  {n_auctions:>8}" + "".join(f"  {rate:>13.0f} ({accepted:>5})" for rate, accepted in cells))
+
+
+if __name__ == "__main__":
+    main()
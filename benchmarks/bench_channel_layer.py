@@ -0,0 +1,117 @@
+# benchmarks/bench_channel_layer.py
+"""
+Group fan-out throughput of the SQLite channel layer against InMemoryChannelLayer.
+
+One sender does --sends group_sends to a group of --watchers channels and we time
+until every watcher has received every message. With --processes N the SQLite
+layer is also measured with the watchers spread over N worker processes, which
+is the setup it exists for (InMemoryChannelLayer cannot do that at all).
+
+    python -m benchmarks.bench_channel_layer --watchers 200 --sends 200 --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.common import print_results
+
+from channels.layers import InMemoryChannelLayer  # noqa: E402
+
+from auctions.layers import SQLiteChannelLayer  # noqa: E402
+
+GROUP = "auction_bench"
+
+
+async def watch(layer, channel, expected):
+    for _ in range(expected):
+        await layer.receive(channel)
+
+
+async def fan_out(make_layer, watchers, sends):
+    layer = make_layer()
+    channels = [await layer.new_channel() for _ in range(watchers)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    receivers = [asyncio.ensure_future(watch(layer, c, sends)) for c in channels]
+
+    start = time.perf_counter()
+    for i in range(sends):
+        await layer.group_send(GROUP, {"type": "broadcast", "text": f'{{"amount": "{i}"}}'})
+    await asyncio.gather(*receivers)
+    elapsed = time.perf_counter() - start
+    if hasattr(layer, "close"):
+        await layer.close()
+    return elapsed
+
+
+def _worker(path, watchers, sends, ready, done):
+    async def run():
+        layer = SQLiteChannelLayer(path=path, capacity=sends + 1)
+        channels = [await layer.new_channel() for _ in range(watchers)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        ready.put(True)
+        await asyncio.gather(*(watch(layer, c, sends) for c in channels))
+        done.put(time.perf_counter())
+        await layer.close()
+
+    asyncio.run(run())
+
+
+def cross_process(path, processes, watchers, sends):
+    ctx = multiprocessing.get_context("spawn")
+    ready, done = ctx.Queue(), ctx.Queue()
+    per_worker = watchers // processes
+    workers = [ctx.Process(target=_worker, args=(path, per_worker, sends, ready, done)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get()
+
+    async def send_all():
+        layer = SQLiteChannelLayer(path=path, capacity=sends + 1)
+        start = time.perf_counter()
+        for i in range(sends):
+            await layer.group_send(GROUP, {"type": "broadcast", "text": f'{{"amount": "{i}"}}'})
+        return start
+
+    start = asyncio.run(send_all())
+    finished = max(done.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    return finished - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--watchers", type=int, default=200)
+    parser.add_argument("--sends", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=0)
+    args = parser.parse_args()
+    # In-memory per-channel capacity must hold a whole run of unreceived sends.
+    capacity = args.sends + 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "in-memory": asyncio.run(fan_out(lambda: InMemoryChannelLayer(capacity=capacity), args.watchers, args.sends)),
+            "sqlite": asyncio.run(fan_out(
+                lambda: SQLiteChannelLayer(path=os.path.join(tmp, "single.sqlite3"), capacity=capacity),
+                args.watchers, args.sends,
+            )),
+        }
+        if args.processes:
+            results[f"sqlite, {args.processes} processes"] = cross_process(
+                os.path.join(tmp, "multi.sqlite3"), args.processes, args.watchers, args.sends
+            )
+
+    delivered = args.watchers * args.sends
+    print_results(f"{args.sends} group_sends to {args.watchers} watchers ({delivered} deliveries)", results, "in-memory")
+    for label, seconds in results.items():
+        print(f"  {label:<28} {delivered / seconds:9.0f} deliveries/s")
+
+
+if __name__ == "__main__":
+    main()
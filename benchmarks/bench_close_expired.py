@@ -0,0 +1,84 @@
+# benchmarks/bench_close_expired.py
+"""
+Compares closing a burst of expired auctions one transaction per auction
+(process_expired_auctions) with the set-based batch mode (batch_size=N).
+
+    python -m benchmarks.bench_close_expired --auctions 10000 --batch-size 500
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from benchmarks.common import print_results, throwaway_database, timed
+
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from auctions.models import Auction, Bid, Notification, UserProfile  # noqa: E402
+from auctions.utils import process_expired_auctions  # noqa: E402
+
+
+def seed(n_auctions, bids_per_auction, n_users):
+    Notification.objects.all().delete()
+    Bid.objects.all().delete()
+    Auction.objects.all().delete()
+    UserProfile.objects.all().delete()
+
+    users = UserProfile.objects.bulk_create(
+        [UserProfile(username=f"bench{i}") for i in range(n_users)]
+    )
+    ended = timezone.now() - timedelta(minutes=1)
+    rng = random.Random(42)
+
+    auctions = []
+    for i in range(n_auctions):
+        owner = users[i % n_users]
+        auctions.append(Auction(
+            title=f"Lot {i}", description="", owner=owner, base_price=1, current_price=1, ends_at=ended,
+        ))
+    auctions = Auction.objects.bulk_create(auctions, batch_size=1000)
+
+    bids = []
+    for auction in auctions:
+        price = 1
+        for _ in range(bids_per_auction):
+            price += rng.randint(1, 5)
+            bids.append(Bid(auction=auction, bidder=rng.choice(users), amount=price))
+        if bids_per_auction:
+            auction.current_price = price
+            auction.bid_count = bids_per_auction
+            auction.leading_bidder = bids[-1].bidder
+    Bid.objects.bulk_create(bids, batch_size=2000)
+    Auction.objects.bulk_update(auctions, ["current_price", "bid_count", "leading_bidder"], batch_size=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--auctions", type=int, default=10000)
+    parser.add_argument("--bids-per-auction", type=int, default=3)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    results, queries = {}, {}
+    with throwaway_database():
+        for label, batch_size in (("loop", None), (f"batch ({args.batch_size})", args.batch_size)):
+            seed(args.auctions, args.bids_per_auction, args.users)
+            count = [0]
+
+            def counter(execute, sql, params, many, context):
+                count[0] += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(counter), timed(results, label):
+                closed = process_expired_auctions(batch_size=batch_size)
+            assert len(closed) == args.auctions
+            queries[label] = count[0]
+
+    print_results(f"Closing {args.auctions} expired auctions ({args.bids_per_auction} bids each)", results, "loop")
+    for label, count in queries.items():
+        print(f"  {label:<28} {count:9d} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/bench_db_profile.py
+"""
+Mixed bid and listing load against the SQLite database profiles: writer
+threads placing bids on a few hot auctions while reader threads load the
+first listing page, each thread on its own connection as separate workers
+would be. Reports bids and pages per second, bids lost to "database is
+locked", and listing latency.
+
+"stock" is the default profile without the busy retries (the code before
+profiles existed), "default + retry" adds them, "production" is
+DB_PROFILE=production. Each runs in a fresh process so settings are read anew.
+
+    python -m benchmarks.bench_db_profile --writers 8 --readers 8 --seconds 10
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from benchmarks.common import throwaway_database
+
+from django.db import OperationalError, connection  # noqa: E402
+from django.http import QueryDict  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from auctions import bidding  # noqa: E402
+from auctions.models import Auction, UserProfile  # noqa: E402
+from auctions.views import listing_queryset  # noqa: E402
+
+CONFIGS = {
+    "stock": {"DB_PROFILE": "default", "retry": False},
+    "default + retry": {"DB_PROFILE": "default", "retry": True},
+    "production": {"DB_PROFILE": "production", "retry": True},
+}
+
+
+def seed(n_auctions, n_bidders):
+    owner = UserProfile.objects.create_user("bench-owner")
+    bidders = UserProfile.objects.bulk_create(UserProfile(username=f"bidder-{i}") for i in range(n_bidders))
+    ends_at = timezone.now() + timedelta(days=1)
+    Auction.objects.bulk_create(
+        Auction(title=f"Lot {i}", description="Bench lot", owner=owner, base_price=1, current_price=1,
+                ends_at=ends_at + timedelta(seconds=i))
+        for i in range(n_auctions)
+    )
+    return list(Auction.objects.values_list("pk", flat=True)), bidders
+
+
+def run(args, retry):
+    place_bid = bidding.place_bid if retry else bidding.place_bid.__wrapped__
+    with throwaway_database():
+        auction_ids, bidders = seed(args.auctions, args.writers)
+        hot = auction_ids[:args.hot]
+        # Every bid is higher than all the bids before it, so none is rejected as too low
+        amounts = itertools.count(2)
+        stop = threading.Event()
+        counts = {"bids": 0, "locked": 0, "pages": 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def writer(bidder):
+            rng = random.Random(bidder.pk)
+            try:
+                while not stop.is_set():
+                    try:
+                        accepted = place_bid(rng.choice(hot), bidder, next(amounts)).accepted
+                        key = "bids" if accepted else None
+                    except OperationalError:
+                        key = "locked"
+                    if key:
+                        with lock:
+                            counts[key] += 1
+            finally:
+                connection.close()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    list(listing_queryset(QueryDict())[:24])
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        counts["pages"] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(b,)) for b in bidders]
+        threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    latencies.sort()
+    return {
+        "bids/s": counts["bids"] / args.seconds,
+        "locked": counts["locked"],
+        "pages/s": counts["pages"] / args.seconds,
+        "p50 ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--auctions", type=int, default=5000)
+    parser.add_argument("--hot", type=int, default=20, help="Auctions the bids go to.")
+    parser.add_argument("--config", choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config:
+        print(json.dumps(run(args, CONFIGS[args.config]["retry"])))
+        return
+
+    print(f"{args.writers} bidders and {args.readers} listing readers for {args.seconds:g}s")
+    print(f"  {'':<20} {'bids/s':>8} {'locked':>8} {'pages/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, config in CONFIGS.items():
+        env = {**os.environ, "DB_PROFILE": config["DB_PROFILE"]}
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_db_profile", *sys.argv[1:], "--config", label],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"  {label:<20} " + " ".join(f"{value:8.1f}" for value in result.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_export.py
+"""
+Peak Python memory and time of exporting the whole bid history: the streaming
+export (values_list + iterator(chunk_size)) against loading the bids as model
+instances the way the admin changelist does. Both run under tracemalloc,
+which slows them down several times over; compare the times with each other only.
+
+    python -m benchmarks.bench_export --bids 500000
+"""
+import argparse
+import random
+import tracemalloc
+from datetime import timedelta
+
+from benchmarks.common import print_results, throwaway_database, timed
+
+from django.utils import timezone  # noqa: E402
+
+from auctions import exports  # noqa: E402
+from auctions.models import Auction, Bid, UserProfile  # noqa: E402
+
+
+def seed(n_bids, n_auctions=1000, n_users=200):
+    users = UserProfile.objects.bulk_create([UserProfile(username=f"bench{i}") for i in range(n_users)])
+    ends_at = timezone.now() + timedelta(days=1)
+    auctions = Auction.objects.bulk_create([
+        Auction(title=f"Lot {i}", description="", owner=users[0], base_price=1, current_price=1, ends_at=ends_at)
+        for i in range(n_auctions)
+    ])
+    rng = random.Random(42)
+    batch = []
+    for i in range(n_bids):
+        batch.append(Bid(auction=auctions[i % n_auctions], bidder=rng.choice(users), amount=1 + i // n_auctions))
+        if len(batch) == 10000:
+            Bid.objects.bulk_create(batch)
+            batch = []
+    Bid.objects.bulk_create(batch)
+
+
+def measure(label, fn, results, peaks):
+    tracemalloc.start()
+    with timed(results, label):
+        fn()
+    peaks[label] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bids", type=int, default=500000)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    def streaming():
+        for _ in exports.stream("bids", "csv", exports.queryset("bids"), args.chunk_size):
+            pass
+
+    def loaded():
+        for bid in list(Bid.objects.select_related("auction", "bidder").order_by("id")):
+            (bid.pk, bid.auction.title, bid.bidder.username, bid.amount, bid.created_at)
+
+    results, peaks = {}, {}
+    with throwaway_database():
+        seed(args.bids)
+        measure("model instances", loaded, results, peaks)
+        measure("streaming export", streaming, results, peaks)
+
+    print_results(f"Exporting {args.bids} bids", results, "model instances")
+    for label, peak in peaks.items():
+        print(f"  {label:<28} {peak / 2**20:9.1f} MiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_images.py
+"""
+Builds the renditions of a batch of phone-sized JPEG photos with
+images.render, one at a time and on thread pools of growing size, and
+compares the bytes a listing card downloads (the original before, the thumb
+rendition now).
+
+    python -m benchmarks.bench_images --photos 24 --threads 1 2 4
+"""
+import argparse
+import io
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import print_results, timed
+
+from PIL import Image, ImageFilter  # noqa: E402
+
+from auctions import images  # noqa: E402
+
+
+def photo(seed, size):
+    """A noisy, blurred JPEG; flat synthetic images compress far better than real photos."""
+    rng = random.Random(seed)
+    image = Image.effect_noise(size, 64).convert("RGB").filter(ImageFilter.GaussianBlur(2))
+    overlay = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    Image.blend(image, overlay, 0.5).save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=24)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    args = parser.parse_args()
+
+    photos = [photo(i, (args.width, args.height)) for i in range(args.photos)]
+    renditions = images.FIELDS["auctions.Auction"][1]
+
+    def build(data):
+        return images.render(io.BytesIO(data), renditions)
+
+    results, out = {}, None
+    with timed(results, "inline"):
+        out = [build(data) for data in photos]
+    for threads in args.threads:
+        with ThreadPoolExecutor(max_workers=threads) as pool, timed(results, f"{threads} threads"):
+            list(pool.map(build, photos))
+
+    print_results(f"Rendering {' + '.join(renditions)} as WebP and JPEG for {args.photos} photos", results, "inline")
+    original = sum(map(len, photos)) / len(photos)
+    print(f"Bytes per card image ({args.width}x{args.height} originals)")
+    print(f"  {'original':<28} {original / 1024:9.0f} KiB")
+    for fmt in images.FORMATS:
+        size = sum(len(built["thumb", fmt]) for built in out) / len(out)
+        print(f"  {'thumb ' + fmt:<28} {size / 1024:9.0f} KiB  ({original / size:5.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_search.py
+"""
+Compares finding auctions by keyword with LIKE '%word%' over title and
+description (what the admin search did) against the FTS5 index behind the
+search page, for the first page of results of a mix of common, rare and
+two-word queries, with the listing's active-only filter applied to both.
+
+    python -m benchmarks.bench_search --auctions 100000 --repeat 5
+"""
+import argparse
+import itertools
+import random
+from datetime import timedelta
+
+from benchmarks.common import print_results, throwaway_database, timed
+
+from django.db import connection  # noqa: E402
+from django.http import QueryDict  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from auctions import search  # noqa: E402
+from auctions.models import Auction, UserProfile  # noqa: E402
+from auctions.views import listing_queryset  # noqa: E402
+
+SYLLABLES = "ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu ra re ri ro ru".split()
+
+
+def vocabulary(size, rng):
+    """`size` distinct made-up words; a real catalogue's vocabulary is in the tens of thousands."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(n_auctions, words):
+    owner = UserProfile.objects.create_user("bench-owner")
+    rng = random.Random(42)
+    # Zipf: the word of rank r turns up about 1/r as often as the most common one
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    ends_at = timezone.now() + timedelta(days=7)
+
+    def text(n):
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=n))
+
+    auctions = [
+        Auction(
+            title=text(rng.randint(2, 5)),
+            description=text(rng.randint(15, 40)),
+            owner=owner,
+            base_price=rng.randint(1, 500),
+            current_price=1,
+            ends_at=ends_at + timedelta(seconds=i),
+            is_active=rng.random() < 0.8,
+        )
+        for i in range(n_auctions)
+    ]
+    Auction.objects.bulk_create(auctions, batch_size=2000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--auctions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5, help="Times each query is run.")
+    parser.add_argument("--page-size", type=int, default=24)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    args = parser.parse_args()
+
+    words = vocabulary(args.vocabulary, random.Random(7))
+    queries = {
+        "common word": words[10],
+        "uncommon word": words[500],
+        "rare word": words[10000],
+        "two words": f"{words[20]} {words[300]}",
+        "prefix": words[100][:3],
+    }
+    results, build = {}, {}
+    with throwaway_database():
+        with timed(build, "seed (index kept by triggers)"):
+            seed(args.auctions, words)
+        with timed(build, "full rebuild"):
+            search.rebuild(connection)
+
+        base = listing_queryset(QueryDict())
+        matches = {}
+        for kind, text in queries.items():
+            like = search._like(base, search.terms(text)).order_by("ends_at", "id")
+            variants = {
+                # LIKE can stop at the first page of hits in ends_at order...
+                "like": like,
+                # ...but it cannot rank, and a ranked page needs every hit scored
+                "fts5 (ends_at order)": search.matching(base, text).order_by("ends_at", "id"),
+                "fts5 (ranked)": search.search_auctions(base, text),
+            }
+            matches[kind] = search.matching(base, text).count()
+            for label, qs in variants.items():
+                with timed(results, f"{kind}: {label}"):
+                    for _ in range(args.repeat):
+                        list(qs[:args.page_size])
+
+    print_results(f"Seeding and indexing {args.auctions} auctions", build)
+    for kind, text in queries.items():
+        runs = {label.split(": ", 1)[1]: t for label, t in results.items() if label.startswith(f"{kind}: ")}
+        print_results(f"First page for {kind} {text!r} ({matches[kind]} hits), {args.repeat} runs", runs, "like")
+
+
+if __name__ == "__main__":
+    main()
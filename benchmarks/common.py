@@ -0,0 +1,45 @@
+# benchmarks/common.py
+"""
+Shared setup for the scripts in this directory. Each benchmark runs against a
+throwaway copy of the schema (the test database), never the real db.sqlite3.
+
+Run them from the repository root, e.g. ``python -m benchmarks.bench_close_expired``.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auctio.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+@contextmanager
+def throwaway_database():
+    """Creates a migrated scratch database for the duration of the block."""
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def timed(results, label):
+    """Stores the wall time of the block, in seconds, as results[label]."""
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
+
+
+def print_results(title, results, baseline=None):
+    print(title)
+    for label, seconds in results.items():
+        line = f"  {label:<28} {seconds:9.3f}s"
+        if baseline and label != baseline:
+            line += f"  ({results[baseline] / seconds:5.1f}x vs {baseline})"
+        print(line)
@@ -0,0 +1,13 @@
+# loadtest/__init__.py
+"""
+Load-testing harness for a locally running ASGI server (e.g. ``daphne auctio.asgi:application``
+or ``uvicorn auctio.asgi:application``).
+
+It seeds bidders and auctions into the server's database, logs the bidders in,
+then for --duration seconds drives bids through the detail form and the auction
+WebSocket while watchers listen, and prints a JSON report (latency percentiles,
+throughput, outcomes, errors) tagged with the current git commit:
+
+    python -m loadtest --url http://127.0.0.1:8000 --http-bidders 10 --ws-bidders 10 \\
+        --watchers 100 --duration 30 --output run.json
+"""
@@ -0,0 +1,113 @@
+# loadtest/__main__.py
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+
+import django
+
+from . import __doc__ as usage
+
+PASSWORD = "loadtest-password"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def log_in(url, usernames, concurrency=20):
+    from .client import Session
+
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(username):
+        session = Session(url)
+        async with gate:
+            await session.login(username, PASSWORD)
+        return session
+
+    return await asyncio.gather(*(one(name) for name in usernames))
+
+
+async def main(options):
+    from django.contrib.auth import get_user_model
+
+    from .client import Session
+    from .runner import Run
+    from .seed import seed
+
+    bidders = options.http_bidders + options.ws_bidders
+    usernames, auction_ids = await asyncio.to_thread(
+        seed, bidders, options.auctions, PASSWORD, options.duration
+    )
+    ids = dict(
+        await asyncio.to_thread(
+            lambda: list(get_user_model().objects.filter(username__in=usernames).values_list("username", "pk"))
+        )
+    )
+    sessions = await log_in(options.url, usernames)
+
+    run = Run(options.url, auction_ids, options.duration, options.think_time, options.timeout)
+    http_bidders = sessions[:options.http_bidders]
+    ws_bidders = [
+        (session, name, ids[name])
+        for session, name in zip(sessions[options.http_bidders:], usernames[options.http_bidders:])
+    ]
+    watchers = [(Session(options.url), random.choice(auction_ids)) for _ in range(options.watchers)]
+    elapsed = await run.execute(http_bidders, ws_bidders, watchers)
+
+    return run.recorder.report(
+        elapsed,
+        commit=git_commit(),
+        config={
+            "url": options.url,
+            "auctions": options.auctions,
+            "http_bidders": options.http_bidders,
+            "ws_bidders": options.ws_bidders,
+            "watchers": options.watchers,
+            "duration_s": options.duration,
+            "think_time_s": options.think_time,
+        },
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m loadtest", description=usage, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server under test.")
+    parser.add_argument("--auctions", type=int, default=5, help="Auctions to create and bid on.")
+    parser.add_argument("--http-bidders", type=int, default=10, help="Bidders using the detail form.")
+    parser.add_argument("--ws-bidders", type=int, default=10, help="Bidders using the auction WebSocket.")
+    parser.add_argument("--watchers", type=int, default=50, help="Sockets that only listen.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of bidding.")
+    parser.add_argument(
+        "--think-time", type=float, default=0.6,
+        help="Mean pause between a bidder's bids. The default stays under the server's default "
+             "BID_RATE_PER_USER of 2 bids a second; below 0.5 most bids are shed unless it is raised.",
+    )
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a bid counts as timed out.")
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = parse_args()
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auctio.settings")
+    django.setup()
+
+    report = asyncio.run(main(options))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if options.output:
+        with open(options.output, "w") as fh:
+            fh.write(text + "\n")
+    sys.exit(1 if report["errors"] else 0)
@@ -0,0 +1,194 @@
+# loadtest/client.py
+"""
+Just enough HTTP/1.1 and WebSocket client on asyncio streams to drive the site,
+so the harness needs nothing beyond the standard library. One TCP connection per
+HTTP request (Connection: close); cookies are kept per Session.
+"""
+import asyncio
+import base64
+import os
+import struct
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8", "replace")
+
+
+class Session:
+    """A logged-in (or anonymous) browser: a base URL plus a cookie jar."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.cookies = {}
+
+    def _cookie_header(self):
+        return "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+
+    def _store_cookies(self, headers):
+        for name, value in headers:
+            if name == "set-cookie":
+                for morsel in SimpleCookie(value).values():
+                    self.cookies[morsel.key] = morsel.value
+
+    async def request(self, method, path, data=None):
+        body = urlencode(data).encode() if data is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.netloc}", "Connection: close"]
+        if self.cookies:
+            lines.append(f"Cookie: {self._cookie_header()}")
+        if data is not None:
+            lines += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            writer.write(head + body)
+            await writer.drain()
+            raw = await asyncio.wait_for(reader.read(), self.timeout)
+        finally:
+            writer.close()
+
+        head, _, payload = raw.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HTTPError(f"bad status line {status_line!r}")
+        headers = []
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers.append((name.strip().lower(), value.strip()))
+        if ("transfer-encoding", "chunked") in headers:
+            payload = _unchunk(payload)
+        self._store_cookies(headers)
+        return Response(status, headers, payload)
+
+    async def get(self, path):
+        return await self.request("GET", path)
+
+    async def post(self, path, data):
+        # Django's CSRF check wants the token from the cookie echoed in the form
+        return await self.request("POST", path, dict(data, csrfmiddlewaretoken=self.cookies.get("csrftoken", "")))
+
+    async def login(self, username, password):
+        await self.get("/login/")
+        response = await self.post("/login/", {"username": username, "password": password})
+        if response.status != 302 or "sessionid" not in self.cookies:
+            raise HTTPError(f"login failed for {username} (HTTP {response.status})")
+
+    async def websocket(self, path):
+        socket = WebSocket(self)
+        await socket.connect(path)
+        return socket
+
+
+def _unchunk(data):
+    out = bytearray()
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        out += data[:size]
+        data = data[size + 2:]
+    return bytes(out)
+
+
+class WebSocket:
+    """A client WebSocket carrying text frames, opened with the session's cookies."""
+
+    def __init__(self, session):
+        self.session = session
+        self.reader = self.writer = None
+
+    async def connect(self, path):
+        session = self.session
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {session.netloc}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+            f"Origin: http://{session.netloc}",
+        ]
+        if session.cookies:
+            lines.append(f"Cookie: {session._cookie_header()}")
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(session.host, session.port), session.timeout
+        )
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await self.writer.drain()
+        head = await asyncio.wait_for(self.reader.readuntil(b"\r\n\r\n"), session.timeout)
+        status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+        if " 101 " not in status_line + " ":
+            self.writer.close()
+            raise HTTPError(f"websocket upgrade refused: {status_line}")
+
+    async def _write_frame(self, opcode, payload):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        # Client frames are always masked
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 1 << 16:
+            header.append(0x80 | 126)
+            header += struct.pack("!H", length)
+        else:
+            header.append(0x80 | 127)
+            header += struct.pack("!Q", length)
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.writer.write(bytes(header) + mask + masked)
+        await self.writer.drain()
+
+    async def send(self, text):
+        await self._write_frame(0x1, text.encode())
+
+    async def recv(self):
+        """The next text message, or None once the server closes the socket."""
+        message = bytearray()
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                await self._write_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return message.decode()
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            await self._write_frame(0x8, struct.pack("!H", 1000))
+        except (ConnectionError, RuntimeError):
+            pass
+        self.writer.close()
@@ -0,0 +1,209 @@
+# loadtest/runner.py
+"""
+The load itself: HTTP bidders posting the detail form, WebSocket bidders using
+ws/auction/<id>/, and watchers that only listen on those sockets.
+
+Latencies recorded (see Recorder):
+
+- http_bid: POST /auction/<id>/ until the server's redirect, i.e. until the bid
+  has been accepted or refused.
+- ws_bid: sending place_bid until the bidder sees its own bid broadcast back, or
+  its rejection.
+- bid_to_broadcast: sending place_bid until a watcher receives the bid, one
+  sample per watcher per bid. Form bids are not broadcast, so only WebSocket
+  bids contribute here.
+
+Outcomes are counted per path: accepted, rejected by place_bid (outbid,
+closed, ...), and shed by the server's admission control (auctions/throttle.py)
+as rate_limited or duplicate. A shed bid never reached the database, so it
+says nothing about the bid path's capacity. With the default settings a
+bidder gets 2 bids a second and a burst of 5. The default --think-time keeps
+each bidder under that. To push harder, run the server with a higher
+BID_RATE_PER_USER, or with 0 to turn that limit off.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from decimal import Decimal
+
+from .stats import Recorder
+
+# The bid form's minimum is the auction's current price
+CURRENT_PRICE = re.compile(r'name="amount"[^>]*min="([\d.]+)"')
+ACCEPTED_TEXT = "Bid placed:"
+# The flash messages of bids shed before place_bid, and the reasons the socket sends for them
+SHED_TEXTS = {
+    "rate_limited": "You are bidding too fast.",
+    "duplicate": "This bid was already submitted.",
+}
+
+
+class Run:
+    def __init__(self, base_url, auction_ids, duration, think_time=0.0, timeout=10.0):
+        self.base_url = base_url
+        self.auction_ids = auction_ids
+        self.duration = duration
+        self.think_time = think_time
+        self.timeout = timeout
+        self.recorder = Recorder()
+        # Best known price per auction, shared by every bidder of the run
+        self.prices = {pk: Decimal("100.00") for pk in auction_ids}
+        # (auction id, amount) -> perf_counter() when a WebSocket bid was sent
+        self.sent = {}
+        self.deadline = None
+
+    def next_amount(self, auction_id):
+        step = Decimal(random.randint(100, 500)) / 100
+        return f"{self.prices[auction_id] + step:.2f}"
+
+    def saw_price(self, auction_id, amount):
+        if amount is not None:
+            self.prices[auction_id] = max(self.prices[auction_id], Decimal(amount))
+
+    def running(self):
+        return time.perf_counter() < self.deadline
+
+    async def pause(self):
+        await asyncio.sleep(self.think_time * random.uniform(0.5, 1.5) if self.think_time else 0)
+
+    # HTTP bidders
+
+    async def http_bidder(self, session):
+        rec = self.recorder
+        while self.running():
+            auction_id = random.choice(self.auction_ids)
+            amount = self.next_amount(auction_id)
+            path = f"/auction/{auction_id}/"
+            try:
+                start = time.perf_counter()
+                response = await session.post(path, {"amount": amount})
+                rec.latency("http_bid", time.perf_counter() - start)
+                if response.status != 302:
+                    rec.error(f"http_bid:status_{response.status}")
+                    continue
+                page = await session.get(path)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+                rec.error(f"http_bid:{type(exc).__name__}")
+                continue
+            shed = next((reason for reason, text in SHED_TEXTS.items() if text in page.text), None)
+            if ACCEPTED_TEXT in page.text:
+                rec.outcome("http_accepted")
+                self.saw_price(auction_id, amount)
+            elif shed:
+                rec.outcome(f"http_{shed}")
+            else:
+                rec.outcome("http_rejected")
+                match = CURRENT_PRICE.search(page.text)
+                self.saw_price(auction_id, match and match.group(1))
+            await self.pause()
+
+    # WebSocket bidders and watchers
+
+    def _bids_in(self, auction_id, frame):
+        """The bids carried by a broadcast frame, recording bid-to-broadcast samples."""
+        if frame.get("type") == "price_update":
+            bids = frame.get("bids", [])
+        elif frame.get("type") == "bid_message":
+            bids = [frame]
+        else:
+            return []
+        now = time.perf_counter()
+        for bid in bids:
+            self.saw_price(auction_id, bid["amount"])
+        return [
+            (bid, now - self.sent[auction_id, bid["amount"]])
+            for bid in bids
+            if (auction_id, bid["amount"]) in self.sent
+        ]
+
+    async def ws_bidder(self, session, username, user_id):
+        rec = self.recorder
+        auction_id = random.choice(self.auction_ids)
+        try:
+            socket = await session.websocket(f"/ws/auction/{auction_id}/")
+        except (OSError, asyncio.TimeoutError, ConnectionError) as exc:
+            rec.error(f"ws_connect:{type(exc).__name__}")
+            return
+        try:
+            while self.running():
+                amount = self.next_amount(auction_id)
+                start = time.perf_counter()
+                self.sent[auction_id, amount] = start
+                await socket.send(json.dumps({"action": "place_bid", "amount": amount, "user_id": user_id}))
+                outcome = await asyncio.wait_for(
+                    self._await_own_bid(socket, auction_id, username, amount), self.timeout
+                )
+                if outcome is None:
+                    rec.error("ws_bid:closed")
+                    return
+                rec.latency("ws_bid", time.perf_counter() - start)
+                rec.outcome(outcome)
+                await self.pause()
+        except asyncio.TimeoutError:
+            rec.error("ws_bid:timeout")
+        except (OSError, asyncio.IncompleteReadError, ConnectionError) as exc:
+            rec.error(f"ws_bid:{type(exc).__name__}")
+        finally:
+            await socket.close()
+
+    async def _await_own_bid(self, socket, auction_id, username, amount):
+        while True:
+            text = await socket.recv()
+            if text is None:
+                return None
+            frame = json.loads(text)
+            if frame.get("type") == "bid_rejected":
+                if frame.get("reason") in SHED_TEXTS:
+                    return f"ws_{frame['reason']}"
+                self.saw_price(auction_id, frame.get("current_price"))
+                return "ws_rejected"
+            for bid, _ in self._bids_in(auction_id, frame):
+                if bid["bidder"] == username and bid["amount"] == amount:
+                    return "ws_accepted"
+
+    async def watcher(self, session, auction_id):
+        rec = self.recorder
+        try:
+            socket = await session.websocket(f"/ws/auction/{auction_id}/")
+        except (OSError, asyncio.TimeoutError, ConnectionError) as exc:
+            rec.error(f"ws_connect:{type(exc).__name__}")
+            return
+        try:
+            while True:
+                text = await socket.recv()
+                if text is None:
+                    rec.error("watcher:closed")
+                    return
+                for _, latency in self._bids_in(auction_id, json.loads(text)):
+                    rec.latency("bid_to_broadcast", latency)
+        except (OSError, asyncio.IncompleteReadError, ConnectionError) as exc:
+            rec.error(f"watcher:{type(exc).__name__}")
+        finally:
+            await socket.close()
+
+    async def execute(self, http_bidders, ws_bidders, watchers):
+        """
+        Runs for `duration` seconds. `http_bidders` is a list of logged-in
+        Sessions, `ws_bidders` of (session, username, user_id) and `watchers` of
+        (session, auction_id). Returns the elapsed time.
+        """
+        watching = [asyncio.ensure_future(self.watcher(*w)) for w in watchers]
+        # Let the watchers join their groups before the first bid
+        await asyncio.sleep(0.5)
+
+        start = time.perf_counter()
+        self.deadline = start + self.duration
+        await asyncio.gather(
+            *(self.http_bidder(session) for session in http_bidders),
+            *(self.ws_bidder(*bidder) for bidder in ws_bidders),
+        )
+        elapsed = time.perf_counter() - start
+
+        # Broadcasts still in flight when the bidders stop
+        await asyncio.sleep(min(self.timeout, 1.0))
+        for task in watching:
+            task.cancel()
+        await asyncio.gather(*watching, return_exceptions=True)
+        return elapsed
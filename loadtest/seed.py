@@ -0,0 +1,45 @@
+# loadtest/seed.py
+"""
+Seeds the bidders and auctions a run needs, straight through the ORM (like
+create_test_user.py), into the database the server under test is using.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from auctions.models import Auction
+
+SELLER = "loadtest_seller"
+
+
+def seed(bidders, auctions, password, duration):
+    """
+    Makes sure `bidders` users named loadtest_bidder_<n> exist with `password`,
+    and creates `auctions` fresh auctions owned by loadtest_seller that stay open
+    well past a run of `duration` seconds. Returns (usernames, auction_ids).
+    """
+    User = get_user_model()
+    # Hash once and share it; hashing per user would dominate seeding time.
+    hashed = make_password(password)
+
+    seller, _ = User.objects.get_or_create(username=SELLER, defaults={"password": hashed})
+    usernames = [f"loadtest_bidder_{n}" for n in range(bidders)]
+    existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+    User.objects.bulk_create([User(username=name, password=hashed) for name in usernames if name not in existing])
+    User.objects.filter(username__in=usernames).update(password=hashed)
+
+    ends_at = timezone.now() + timedelta(seconds=duration + 600)
+    auction_ids = [
+        Auction.objects.create(
+            title=f"Load test lot {n}",
+            description="Created by the load-test harness.",
+            owner=seller,
+            base_price=Decimal("100.00"),
+            ends_at=ends_at,
+        ).pk
+        for n in range(auctions)
+    ]
+    return usernames, auction_ids
@@ -0,0 +1,56 @@
+# loadtest/stats.py
+import math
+from collections import Counter
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples):
+    """p50/p95/p99/max of latency samples in seconds, reported in milliseconds."""
+    values = sorted(samples)
+    summary = {"count": len(values)}
+    for pct in (50, 95, 99):
+        value = percentile(values, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 2) if value is not None else None
+    summary["max_ms"] = round(values[-1] * 1000, 2) if values else None
+    return summary
+
+
+class Recorder:
+    """Collects the samples of one run; `report()` turns them into the JSON summary."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.outcomes = Counter()
+        self.errors = Counter()
+
+    def latency(self, name, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    def outcome(self, name):
+        self.outcomes[name] += 1
+
+    def error(self, name):
+        self.errors[name] += 1
+
+    def report(self, elapsed, **extra):
+        accepted = self.outcomes["http_accepted"] + self.outcomes["ws_accepted"]
+        shed = sum(n for name, n in self.outcomes.items() if name.endswith(("_rate_limited", "_duplicate")))
+        return {
+            **extra,
+            "elapsed_s": round(elapsed, 3),
+            "throughput": {
+                "bids_per_s": round(sum(self.outcomes.values()) / elapsed, 2) if elapsed else None,
+                "accepted_bids_per_s": round(accepted / elapsed, 2) if elapsed else None,
+                "shed_bids_per_s": round(shed / elapsed, 2) if elapsed else None,
+            },
+            "outcomes": dict(self.outcomes),
+            "latency": {name: summarize(samples) for name, samples in sorted(self.latencies.items())},
+            "errors": dict(self.errors),
+        }